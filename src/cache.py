@@ -0,0 +1,291 @@
+"""Small caches shared across the app
+
+LRUCache is a bounded, thread safe in-memory cache with optional expiry.
+DiskCache and MongoCache store pickled values outside the process, so they
+survive restarts and are shared by every worker. TieredCache puts an
+LRUCache in front of one of them.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Hashable, Optional, Type, Union
+
+from mongoengine import Document
+
+MISSING = object()
+# Shared caches check their size limit once every this many sets
+PRUNE_EVERY = 100
+
+
+def hash_key(*parts: Any) -> str:
+    """Create a stable hex digest cache key from the parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode()
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread safe least-recently-used cache
+
+    Params:
+        maxsize: maximum number of entries kept
+        ttl: seconds an entry stays valid, or None to never expire
+    """
+
+    def __init__(self, maxsize: int = 1_024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                return default
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Set a value, evicting the least recently used entry if full"""
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a value if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every value"""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """Pickled values stored one file per key under a directory
+
+    Keys must be filesystem safe strings (such as `hash_key` digests). Writes
+    go to a temporary file first and are then renamed into place, so
+    concurrent workers never read a partial file.
+
+    Params:
+        directory: where to store the cache files (created if missing)
+        ttl: seconds an entry stays valid (by file age), or None
+        max_entries: oldest files beyond this many are pruned, or None
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sets = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value, or default if missing, expired or unreadable"""
+        path = self._path(key)
+        try:
+            if self.ttl is not None and os.path.getmtime(path) + self.ttl < time.time():
+                self.delete(key)
+                return default
+            with open(path, "rb") as in_file:
+                return pickle.load(in_file)
+        except (OSError, pickle.PickleError, EOFError):
+            return default
+
+    def set(self, key: str, value: Any) -> None:
+        """Set a value"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as out_file:
+                pickle.dump(value, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._sets += 1
+        if self.max_entries is not None and self._sets % PRUNE_EVERY == 0:
+            self.prune()
+
+    def delete(self, key: str) -> None:
+        """Remove a value if present"""
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        """Remove every value"""
+        for cache_file in self._scan():
+            os.remove(cache_file.path)
+
+    def prune(self) -> int:
+        """Remove the oldest files beyond max_entries, returning how many"""
+        if self.max_entries is None:
+            return 0
+        cache_files = list(self._scan())
+        excess = len(cache_files) - self.max_entries
+        if excess <= 0:
+            return 0
+        cache_files.sort(key=lambda cache_file: cache_file.stat().st_mtime)
+        for cache_file in cache_files[:excess]:
+            self.delete(cache_file.name)
+        return excess
+
+    def _scan(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                yield from os.scandir(entry.path)
+
+
+class MongoCache:
+    """Pickled values stored in a mongo collection
+
+    The document class needs `key` (unique string), `value` (binary) and
+    `created_timestamp` fields. Give it a TTL index on created_timestamp so
+    mongo removes expired entries too, expiry is also checked on read.
+
+    Params:
+        document: the cache entry document class
+        ttl: seconds an entry stays valid, or None
+        max_entries: oldest entries beyond this many are pruned, or None
+    """
+
+    def __init__(
+        self,
+        document: Type[Document],
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.document = document
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sets = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value, or default if missing, expired or unreadable"""
+        entries = self.document.objects(key=key).only("value", "created_timestamp")
+        entry = entries.first()
+        if entry is None:
+            return default
+        if self.ttl is not None and entry.created_timestamp < self._oldest_valid():
+            return default
+        try:
+            return pickle.loads(entry.value)
+        except (pickle.PickleError, EOFError):
+            return default
+
+    def set(self, key: str, value: Any) -> None:
+        """Set a value"""
+        self.document.objects(key=key).update_one(
+            set__value=pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+            set__created_timestamp=datetime.utcnow(),
+            upsert=True,
+        )
+        self._sets += 1
+        if self.max_entries is not None and self._sets % PRUNE_EVERY == 0:
+            self.prune()
+
+    def delete(self, key: str) -> None:
+        """Remove a value if present"""
+        self.document.objects(key=key).delete()
+
+    def clear(self) -> None:
+        """Remove every value"""
+        self.document.objects().delete()
+
+    def prune(self) -> int:
+        """Remove the oldest entries beyond max_entries, returning how many"""
+        if self.max_entries is None:
+            return 0
+        stale_ids = [
+            entry.id
+            for entry in self.document.objects()
+            .only("id")
+            .order_by("-created_timestamp")
+            .skip(self.max_entries)
+        ]
+        if stale_ids:
+            self.document.objects(id__in=stale_ids).delete()
+        return len(stale_ids)
+
+    def _oldest_valid(self) -> datetime:
+        assert self.ttl is not None, "only entries of caches with a ttl expire"
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
+
+
+class TieredCache:
+    """An in-memory LRU cache in front of an optional shared cache
+
+    Shared cache hits are copied into memory, and sets write to both tiers.
+    """
+
+    def __init__(
+        self,
+        memory: LRUCache,
+        shared: Optional[Union[DiskCache, MongoCache]] = None,
+    ):
+        self.memory = memory
+        self.shared = shared
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value from memory, then the shared cache, or default"""
+        value = self.memory.get(key, MISSING)
+        if value is MISSING and self.shared is not None:
+            value = self.shared.get(key, MISSING)
+            if value is not MISSING:
+                self.memory.set(key, value)
+        return default if value is MISSING else value
+
+    def set(self, key: str, value: Any) -> None:
+        """Set a value in every tier"""
+        self.memory.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def delete(self, key: str) -> None:
+        """Remove a value from every tier"""
+        self.memory.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self) -> None:
+        """Remove every value from every tier"""
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
@@ -0,0 +1,317 @@
+"""Database and uploaded image maintenance commands
+
+Run with the flask cli, for example:
+    FLASK_APP=src.factory:create_app flask db audit-indexes
+    FLASK_APP=src.factory:create_app flask images collect-orphans --dry-run
+"""
+import ntpath
+import os
+import re
+import time
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import click
+from bson.objectid import ObjectId
+from flask.cli import AppGroup
+from flask_mongoengine import BaseQuerySet
+from mongoengine import Document
+from pymongo.errors import OperationFailure
+
+from src import image_handler
+from src.routes.blog.models import BlogPost, Comment, TagStats
+from src.routes.users.models import User
+
+db_cli = AppGroup("db", help="Database maintenance commands.")
+images_cli = AppGroup("images", help="Uploaded image maintenance commands.")
+
+AUDITED_DOCUMENTS = (BlogPost, Comment, TagStats, User)
+NEWEST_FIRST = ("-created_timestamp", "-id")
+# The app's main query shapes, with placeholder values, to explain
+MAIN_QUERIES: Tuple[Tuple[str, Callable[[], BaseQuerySet]], ...] = (
+    (
+        "blog list",
+        lambda: BlogPost.objects(published=True).order_by(*NEWEST_FIRST).limit(21),
+    ),
+    (
+        "blog list by tag",
+        lambda: BlogPost.objects(published=True, tags="tag")
+        .order_by(*NEWEST_FIRST)
+        .limit(21),
+    ),
+    (
+        "blog list (admin)",
+        lambda: BlogPost.objects().order_by(*NEWEST_FIRST).limit(21),
+    ),
+    ("blog post by slug", lambda: BlogPost.objects(slug="slug")),
+    (
+        "search index sync",
+        lambda: BlogPost.objects(updated_timestamp__gte=datetime.now()),
+    ),
+    (
+        "comment page",
+        lambda: Comment.objects(post_id=ObjectId()).order_by(*NEWEST_FIRST).limit(11),
+    ),
+    (
+        "tags page",
+        lambda: TagStats.objects(published_count__gt=0).order_by(
+            "-published_count", "tag"
+        ),
+    ),
+    ("user by username", lambda: User.objects(username="username")),
+    ("user by email", lambda: User.objects(email="user@example.com")),
+    ("user by oauth id", lambda: User.objects(github_id=1)),
+)
+# Files younger than this may belong to uploads still being saved
+ORPHAN_MIN_AGE = 60 * 60
+# Suffix of the smaller copies of an image (see src.image_jobs.plan_variants)
+VARIANT_SUFFIX = re.compile(r"-\d+w$")
+
+
+class IndexReport(NamedTuple):
+    """How one index of a collection is declared and used"""
+
+    collection: str
+    name: str
+    keys: List[Tuple[str, Any]]
+    declared: bool
+    # Operations using the index since `since`, or None if unknown
+    ops: Optional[int]
+    since: Optional[datetime]
+
+    @property
+    def unused(self) -> bool:
+        return self.ops == 0 and self.name != "_id_"
+
+
+class OrphanedFile(NamedTuple):
+    """An uploaded image file that no blog post or user references"""
+
+    path: str
+    size: int
+
+
+@db_cli.command("audit-indexes")
+@click.option("--explain/--no-explain", default=True, help="Explain main queries.")
+@click.option(
+    "--drop-undeclared",
+    is_flag=True,
+    help="Drop indexes that no model declares any more.",
+)
+def audit_indexes_command(explain: bool, drop_undeclared: bool) -> None:
+    """Report unused and undeclared indexes and how main queries use them"""
+    for report in audit_indexes():
+        usage = "usage unknown" if report.ops is None else f"{report.ops} ops"
+        if report.since is not None:
+            usage += f" since {report.since:%Y-%m-%d %H:%M}"
+        flags = [] if report.declared else ["UNDECLARED"]
+        if report.unused:
+            flags.append("UNUSED")
+        click.echo(
+            f"{report.collection:<12} {report.name:<45} {usage:<32} {' '.join(flags)}"
+        )
+    if explain:
+        click.echo()
+        for query_name, plan, problems in explain_main_queries():
+            warning = f"  <- {', '.join(problems)}" if problems else ""
+            click.echo(f"{query_name:<20} {plan}{warning}")
+    if drop_undeclared:
+        dropped = drop_undeclared_indexes()
+        click.echo(f"\nDropped {len(dropped)} undeclared index(es): {dropped}")
+
+
+@images_cli.command("collect-orphans")
+@click.option("--dry-run", is_flag=True, help="Only report what would be removed.")
+@click.option(
+    "--rate",
+    default=50.0,
+    show_default=True,
+    help="Files removed per second at most, to spare the disk.",
+)
+@click.option(
+    "--min-age",
+    default=ORPHAN_MIN_AGE,
+    show_default=True,
+    help="Leave files younger than this many seconds alone.",
+)
+def collect_orphans_command(dry_run: bool, rate: float, min_age: int) -> None:
+    """Remove uploaded images that no blog post or user references"""
+    orphans = list(find_orphaned_images(min_age=min_age))
+    size = sum(orphan.size for orphan in orphans)
+    click.echo(f"Found {len(orphans)} orphaned file(s), {size / 1024 ** 2:.1f} MB.")
+    if dry_run:
+        for orphan in orphans:
+            click.echo(f"  {orphan.path}")
+        return
+    removed = remove_orphaned_images(orphans, rate=rate)
+    click.echo(f"Removed {removed} file(s).")
+
+
+# ---- HELPER METHODS ----
+
+
+def audit_indexes() -> Iterator[IndexReport]:
+    """Report every index of the audited collections"""
+    for document in AUDITED_DOCUMENTS:
+        collection = document._get_collection()
+        declared = {tuple(keys) for keys in document.list_indexes()}
+        usage = get_index_usage(document)
+        for name, info in collection.index_information().items():
+            keys = [(field, normalize_direction(d)) for field, d in info["key"]]
+            ops, since = usage.get(name, (None, None))
+            yield IndexReport(
+                collection.name, name, keys, tuple(keys) in declared, ops, since
+            )
+
+
+def normalize_direction(direction: Any) -> Any:
+    """Index key direction as mongoengine declares it (1.0 from the shell is 1)"""
+    return int(direction) if isinstance(direction, (int, float)) else direction
+
+
+def get_index_usage(document: Document) -> Dict[str, Tuple[int, datetime]]:
+    """Operations using each index of a collection, from $indexStats
+
+    Counts reset when mongo restarts, so check `since` before dropping an
+    index for being unused. Returns no usage if the user may not run
+    $indexStats.
+    """
+    try:
+        stats = document._get_collection().aggregate([{"$indexStats": {}}])
+        return {
+            stat["name"]: (stat["accesses"]["ops"], stat["accesses"]["since"])
+            for stat in stats
+        }
+    except OperationFailure:
+        return {}
+
+
+def explain_main_queries() -> Iterator[Tuple[str, str, List[str]]]:
+    """Explain each of MAIN_QUERIES
+
+    Returns:
+        query name, summary of its winning plan and its problems
+            (collection scans and in-memory sorts)
+    """
+    for query_name, query in MAIN_QUERIES:
+        plan = query().explain()["queryPlanner"]["winningPlan"]
+        # Slot based execution (mongo 5+) nests the plan one level down
+        stages = plan_stages(plan.get("queryPlan", plan))
+        stage_names = {stage.split("(")[0] for stage in stages}
+        problems = []
+        if "COLLSCAN" in stage_names:
+            problems.append("collection scan")
+        if "SORT" in stage_names:
+            problems.append("in-memory sort")
+        yield query_name, " <- ".join(stages), problems
+
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Stages of an explained query plan, outermost first"""
+    stage = plan["stage"]
+    if "indexName" in plan:
+        stage += f"({plan['indexName']})"
+    stages = [stage]
+    if "inputStage" in plan:
+        stages += plan_stages(plan["inputStage"])
+    for input_stage in plan.get("inputStages", []):
+        stages += plan_stages(input_stage)
+    return stages
+
+
+def drop_undeclared_indexes() -> List[str]:
+    """Drop indexes of the audited collections that no model declares"""
+    documents = {
+        document._get_collection_name(): document for document in AUDITED_DOCUMENTS
+    }
+    undeclared = [
+        report
+        for report in audit_indexes()
+        if not report.declared and report.name != "_id_"
+    ]
+    for report in undeclared:
+        documents[report.collection]._get_collection().drop_index(report.name)
+    return [f"{report.collection}.{report.name}" for report in undeclared]
+
+
+def image_stem(filename: str) -> str:
+    """The name an image and all its variants and original share"""
+    return VARIANT_SUFFIX.sub("", os.path.splitext(ntpath.basename(filename))[0])
+
+
+def referenced_image_stems() -> Set[str]:
+    """Stems of every uploaded image a blog post or user references
+
+    Only the image locations are loaded, in one query per collection.
+    """
+    stems: Set[str] = set()
+    posts = BlogPost._get_collection().find(
+        {"images": {"$ne": []}}, {"images.location": 1, "_id": 0}
+    )
+    for post in posts:
+        stems.update(image_stem(image["location"]) for image in post["images"])
+    users = User._get_collection().find(
+        {"avatar_location": {"$regex": "avatars_uploaded"}},
+        {"avatar_location": 1, "_id": 0},
+    )
+    stems.update(image_stem(user["avatar_location"]) for user in users)
+    return stems
+
+
+def find_orphaned_images(min_age: float = ORPHAN_MIN_AGE) -> Iterator[OrphanedFile]:
+    """Files in the upload folders no blog post or user references
+
+    Originals, variants and temp files left by failed saves count too.
+    Files modified less than min_age seconds ago are skipped.
+    """
+    referenced = referenced_image_stems()
+    newest = time.time() - min_age
+    for folder in (
+        image_handler.AVATAR_UPLOAD_FOLDER,
+        image_handler.BLOG_UPLOAD_FOLDER,
+    ):
+        originals = os.path.join(folder, image_handler.ORIGINALS_FOLDER)
+        for directory in (folder, originals):
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file() or image_stem(entry.name) in referenced:
+                        continue
+                    stat = entry.stat()
+                    if stat.st_mtime < newest:
+                        yield OrphanedFile(entry.path, stat.st_size)
+
+
+def remove_orphaned_images(orphans: Iterable[OrphanedFile], rate: float = 50) -> int:
+    """Remove orphaned files, at most rate per second
+
+    Also drops the reference counts of the removed images.
+
+    Returns:
+        how many files were removed
+    """
+    removed = 0
+    names = []
+    for orphan in orphans:
+        if removed and rate > 0:
+            time.sleep(1 / rate)
+        try:
+            os.remove(orphan.path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+        names.append(os.path.basename(orphan.path))
+    image_handler.StoredImage.objects(filename__in=names).delete()
+    return removed
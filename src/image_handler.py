@@ -1,14 +1,36 @@
+"""Image uploads
+
+Uploads are stored under a hash of their content and how they are processed,
+so identical uploads are stored (and processed) once. Each upload adds a
+reference to its stored image in mongo, and deleting an image only removes
+its files once nothing references it any more. Files never change once
+processed, so they are served with far-future cache headers.
+"""
+import hashlib
 import ntpath
 import os
+import re
+import shutil
+import tempfile
 from datetime import datetime
-from typing import Iterable, Optional, Tuple
+from typing import Iterable, List, Optional, Set, Tuple
 
 from flask_login import current_user
 from PIL import Image
 from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 
-from src.globals import STATIC_PATH
+from src.globals import STATIC_PATH, db
+from src.image_jobs import (
+    MAX_IMAGE_PIXELS,
+    PROCESSING_VERSION,
+    Variant,
+    check_pixels,
+    fitted_size,
+    image_files,
+    image_pipeline,
+    plan_variants,
+)
 
 AVATAR_UPLOAD_FOLDER = os.path.join(STATIC_PATH, "images", "avatars_uploaded")
 BLOG_UPLOAD_FOLDER = os.path.join(STATIC_PATH, "images", "blog_uploaded")
@@ -17,6 +39,27 @@ for path in (AVATAR_UPLOAD_FOLDER, BLOG_UPLOAD_FOLDER):
         os.mkdir(path)
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
+# Uploads are kept as they are in this subfolder of their upload folder
+ORIGINALS_FOLDER = "originals"
+HASH_CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# Uploaded images and their variants, by static filename
+STORED_IMAGE = re.compile(
+    r"^images/(?:avatars|blog)_uploaded/(?P<digest>[0-9a-f]{32})(?:-\d+w)?\.\w+$"
+)
+
+
+class UploadError(ValueError):
+    """An upload that isn't an image, or is too large to store or decode"""
+
+
+class StoredImage(db.Document):
+    """How many posts and users reference a stored image"""
+
+    filename = db.StringField(primary_key=True)
+    refcount = db.IntField(default=0)
+
+    meta = {"collection": "stored_images"}
 
 
 def prep_image(
@@ -38,25 +81,107 @@ def upload_image(
     max_pixels: int = 1_000,
     allowed_extensions: Iterable[str] = ALLOWED_EXTENSIONS,
 ) -> Optional[str]:
-    """Uploads a general image"""
-    ext_type, mod_timestamp = prep_image(pic, allowed_extensions)
+    """Uploads a general image
+
+    The upload is stored as it is and served until a background job has
+    replaced it with a copy resized to fit in a max_pixels square. An
+    upload identical to a stored image just references it.
+    """
+    ext_type, _ = prep_image(pic, allowed_extensions)
     if ext_type is None:
         return None
-    storage_filename = secure_filename(f"{prefix}{mod_timestamp}.{ext_type}")
+    originals_path = os.path.join(path, ORIGINALS_FOLDER)
+    os.makedirs(originals_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=originals_path, suffix=f".{ext_type}")
+    try:
+        # Hash the upload while streaming it to disk, a chunk at a time
+        digest = hashlib.sha256(f"{PROCESSING_VERSION}:{max_pixels}:".encode())
+        size = 0
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: pic.stream.read(HASH_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadError(
+                        f"Image is too large, the limit is "
+                        f"{MAX_UPLOAD_BYTES // (1024 * 1024)} MB!"
+                    )
+                digest.update(chunk)
+                f.write(chunk)
+        pic.close()
+        check_image_header(tmp_path)
+        name = f"{prefix}{digest.hexdigest()[:32]}.{ext_type}"
+        storage_filename = secure_filename(name)
+        StoredImage.objects(filename=storage_filename).update_one(
+            inc__refcount=1, upsert=True
+        )
+        original_filepath = os.path.join(originals_path, storage_filename)
+        if os.path.exists(original_filepath):
+            return storage_filename
+        os.replace(tmp_path, original_filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     filepath = os.path.join(path, storage_filename)
+    link_or_copy(original_filepath, filepath)
 
     # Some bug with gifs in pillow causes messed up colors
     # So don't use pillow to resize
     if ext_type != "gif":
-        pic = Image.open(pic)
-        output_size = (max_pixels, max_pixels)
-        pic.thumbnail(output_size)
-    pic.save(filepath)
-    pic.close()
+        image_pipeline.submit(storage_filename, original_filepath, filepath, max_pixels)
 
     return storage_filename
 
 
+def check_image_header(filepath: str) -> None:
+    """Raise UploadError unless a file is an image small enough to decode
+
+    Only the image's header is read.
+    """
+    try:
+        with Image.open(filepath) as image:
+            check_pixels(image.size)
+    except (ValueError, Image.DecompressionBombError):
+        raise UploadError(
+            f"Image is too large, the limit is {MAX_IMAGE_PIXELS // 1_000_000} "
+            "megapixels!"
+        )
+    except OSError:
+        raise UploadError("Invalid image file!")
+
+
+def link_or_copy(source: str, target: str) -> None:
+    """Hard link source to target, copying it where links aren't supported"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def get_pending_images(locations: Iterable[str]) -> Set[str]:
+    """The image locations whose resized images aren't ready yet"""
+    by_name = {ntpath.basename(location): location for location in locations}
+    return {by_name[name] for name in image_pipeline.pending(by_name)}
+
+
+def get_image_variants(
+    storage_filename: str, path: str, max_pixels: int = 1_000
+) -> List[Variant]:
+    """The variants the image pipeline makes of an uploaded image
+
+    Only the header of the stored original is read, for its size.
+    """
+    if storage_filename.endswith(".gif"):
+        return []
+    original_filepath = os.path.join(path, ORIGINALS_FOLDER, storage_filename)
+    try:
+        with Image.open(original_filepath) as image:
+            size = image.size
+    except OSError:
+        # Not an image, its job will fail
+        return []
+    return plan_variants(storage_filename, fitted_size(size, max_pixels))
+
+
 def upload_blog_image(pic: FileStorage) -> Optional[str]:
     """Upload a blog image"""
     allowed_extensions = ALLOWED_EXTENSIONS.copy()
@@ -64,11 +189,14 @@ def upload_blog_image(pic: FileStorage) -> Optional[str]:
     return upload_image(pic, BLOG_UPLOAD_FOLDER, allowed_extensions=allowed_extensions)
 
 
+def get_blog_image_variants(storage_filename: str) -> List[Variant]:
+    """The variants the image pipeline makes of an uploaded blog image"""
+    return get_image_variants(storage_filename, BLOG_UPLOAD_FOLDER)
+
+
 def upload_avatar(pic: FileStorage) -> Optional[str]:
     """Uploads a user's avatar to static/images/avatars_uploaded"""
-    storage_filename = upload_image(
-        pic, AVATAR_UPLOAD_FOLDER, prefix=f"{current_user.id}_", max_pixels=400
-    )
+    storage_filename = upload_image(pic, AVATAR_UPLOAD_FOLDER, max_pixels=400)
     if storage_filename is not None:
         delete_current_avatar()
     return storage_filename
@@ -78,9 +206,46 @@ def delete_image(rel_path: str, abs_path_dir: str) -> None:
     """Delete image given a relative filepath and absolute directory"""
     # Want absolute file path
     filename = ntpath.basename(rel_path)
-    filepath = os.path.join(abs_path_dir, filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    if not release_image(filename):
+        return
+    image_pipeline.cancel(filename)
+    for filepath in image_files(os.path.join(abs_path_dir, filename)) + [
+        os.path.join(abs_path_dir, ORIGINALS_FOLDER, filename)
+    ]:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+def release_image(filename: str) -> bool:
+    """Drop a reference to a stored image
+
+    Returns:
+        whether nothing references the image any more, so its files can go
+    """
+    stored = StoredImage.objects(filename=filename).modify(dec__refcount=1, new=True)
+    if stored is None:
+        # Stored before images were reference counted
+        return True
+    if stored.refcount > 0:
+        return False
+    return StoredImage.objects(filename=filename, refcount__lte=0).delete() > 0
+
+
+def is_immutable_image(static_filename: str) -> bool:
+    """Whether a static file is a stored image that won't change any more
+
+    Stored images are named by their content, except while a job is
+    replacing the upload with its resized copy. Finished jobs are
+    remembered, so most requests skip the job table.
+    """
+    match = STORED_IMAGE.match(static_filename)
+    if not match:
+        return False
+    names = [f"{match['digest']}.{ext}" for ext in ALLOWED_EXTENSIONS | {"gif"}]
+    if image_pipeline.finished.intersection(names):
+        # Content is stored under one of the names, and its job is done
+        return True
+    return not image_pipeline.unfinished(names)
 
 
 def delete_blog_image(rel_path: str) -> None:
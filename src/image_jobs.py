@@ -0,0 +1,397 @@
+"""Background image processing
+
+Uploads are stored as they are, and resizing happens in a thread pool off
+the request path (Pillow releases the GIL while it decodes and resizes).
+Jobs are kept in a small sqlite table, so any worker process can answer
+whether an image is ready, and jobs interrupted by a restart are picked up
+again.
+
+Besides the resized image, each job writes smaller copies and WebP (and
+AVIF, when Pillow can encode it) versions next to it, for responsive
+`srcset`s. Their names and widths follow from the image's size alone (see
+plan_variants), so the request can record them before the job has run.
+
+Set IMAGE_JOBS_DB to choose where the job table lives and IMAGE_WORKERS to
+set the number of processing threads per process.
+"""
+import glob
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from PIL import Image
+
+from src.globals import PROJECT_ROOT_PATH
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+UNFINISHED = (PENDING, PROCESSING)
+DEFAULT_JOBS_DB = os.path.join(PROJECT_ROOT_PATH, "instance", "image_jobs.sqlite3")
+DEFAULT_WORKERS = 2
+# Processing jobs not updated for this many seconds were interrupted
+STALE_AFTER = 600
+# Finished jobs are removed from the table after this many seconds
+KEEP_FINISHED = 7 * 24 * 60 * 60
+# Images with more pixels than this are never decoded
+MAX_IMAGE_PIXELS = 40_000_000
+# Bump when changing how images are processed, so new uploads are stored anew
+PROCESSING_VERSION = 1
+# Widths of the smaller copies made of each image, besides its full size
+RESPONSIVE_WIDTHS = (320, 640)
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+# Encoder settings by file extension
+SAVE_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "jpg": {"quality": JPEG_QUALITY, "optimize": True, "progressive": True},
+    "jpeg": {"quality": JPEG_QUALITY, "optimize": True, "progressive": True},
+    "png": {"optimize": True},
+    "webp": {"quality": WEBP_QUALITY, "method": 4},
+    "avif": {"quality": AVIF_QUALITY},
+}
+MIMETYPES = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+
+class Job(NamedTuple):
+    """Resize `source` to fit in max_pixels square, writing it to `target`"""
+
+    filename: str
+    source: str
+    target: str
+    max_pixels: int
+    status: str
+    error: Optional[str]
+
+
+class Variant(NamedTuple):
+    """A resized or re-encoded copy of an image, stored next to it"""
+
+    filename: str
+    width: int
+    mimetype: str
+
+
+class JobTable:
+    """Image jobs in a sqlite table, keyed by the image's storage filename
+
+    Params:
+        path: the sqlite database file (created if missing)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS image_jobs ("
+                "filename TEXT PRIMARY KEY, source TEXT, target TEXT, "
+                "max_pixels INTEGER, status TEXT, error TEXT, "
+                "created REAL, updated REAL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection for one transaction
+
+        A connection is opened per use, as threads can't share them.
+        """
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add(self, filename: str, source: str, target: str, max_pixels: int) -> None:
+        """Add a pending job, replacing any older job for the filename"""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO image_jobs VALUES (?, ?, ?, ?, ?, NULL, ?, ?)",
+                (filename, source, target, max_pixels, PENDING, now, now),
+            )
+
+    def get(self, filename: str) -> Optional[Job]:
+        """Get a job, or None if there is none for the filename"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT filename, source, target, max_pixels, status, error "
+                "FROM image_jobs WHERE filename = ?",
+                (filename,),
+            ).fetchone()
+        return Job(*row) if row else None
+
+    def claim(self, filename: str) -> Optional[Job]:
+        """Mark a pending job as processing, or None if another worker has it"""
+        with self._connect() as connection:
+            claimed = connection.execute(
+                "UPDATE image_jobs SET status = ?, updated = ? "
+                "WHERE filename = ? AND status = ?",
+                (PROCESSING, time.time(), filename, PENDING),
+            ).rowcount
+        return self.get(filename) if claimed else None
+
+    def finish(self, filename: str, status: str, error: Optional[str] = None) -> None:
+        """Set the final status of a job, unless it was cancelled"""
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE image_jobs SET status = ?, error = ?, updated = ? "
+                "WHERE filename = ? AND status != ?",
+                (status, error, time.time(), filename, CANCELLED),
+            )
+
+    def statuses(self, filenames: Iterable[str]) -> Dict[str, str]:
+        """Status of the jobs of each filename that has one"""
+        filenames = list(filenames)
+        if not filenames:
+            return {}
+        placeholders = ", ".join("?" * len(filenames))
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT filename, status FROM image_jobs "
+                f"WHERE filename IN ({placeholders})",
+                filenames,
+            ).fetchall()
+        return dict(rows)
+
+    def requeue_interrupted(self) -> List[str]:
+        """Reset stale processing jobs to pending, returning every pending job"""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE image_jobs SET status = ?, updated = ? "
+                "WHERE status = ? AND updated < ?",
+                (PENDING, now, PROCESSING, now - STALE_AFTER),
+            )
+            connection.execute(
+                "DELETE FROM image_jobs WHERE status NOT IN (?, ?) AND updated < ?",
+                (*UNFINISHED, now - KEEP_FINISHED),
+            )
+            rows = connection.execute(
+                "SELECT filename FROM image_jobs WHERE status = ?", (PENDING,)
+            ).fetchall()
+        return [filename for filename, in rows]
+
+
+class ImagePipeline:
+    """Thread pool processing the jobs of a job table
+
+    The table and pool are created on first use, which also queues the
+    jobs a previous run left unfinished.
+
+    Params:
+        jobs_db: job table file, defaults to IMAGE_JOBS_DB
+        workers: processing threads, defaults to IMAGE_WORKERS
+    """
+
+    def __init__(self, jobs_db: Optional[str] = None, workers: Optional[int] = None):
+        self.jobs_db = jobs_db
+        self.workers = workers
+        # Filenames whose jobs are known to be finished, they never run again
+        self.finished: Set[str] = set()
+        self._table: Optional[JobTable] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.RLock()
+
+    @property
+    def table(self) -> JobTable:
+        self.start()
+        assert self._table is not None
+        return self._table
+
+    def start(self) -> None:
+        """Create the job table and thread pool, and queue unfinished jobs"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            table = self._open_table()
+            workers = self.workers or int(os.getenv("IMAGE_WORKERS", DEFAULT_WORKERS))
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="image-jobs"
+            )
+        for filename in table.requeue_interrupted():
+            self._executor.submit(self._run, filename)
+
+    def _open_table(self) -> JobTable:
+        """The job table, created on first use without starting the pool"""
+        with self._lock:
+            if self._table is None:
+                jobs_db = self.jobs_db or os.getenv("IMAGE_JOBS_DB") or DEFAULT_JOBS_DB
+                self._table = JobTable(jobs_db)
+            return self._table
+
+    def submit(self, filename: str, source: str, target: str, max_pixels: int) -> None:
+        """Queue resizing the stored original `source` into `target`"""
+        self.table.add(filename, source, target, max_pixels)
+        self.finished.discard(filename)
+        assert self._executor is not None
+        self._executor.submit(self._run, filename)
+
+    def status(self, filename: str) -> Optional[str]:
+        """Status of an image's job, or None if it never had one"""
+        job = self.table.get(filename)
+        return job.status if job else None
+
+    def pending(self, filenames: Iterable[str]) -> List[str]:
+        """The filenames whose images are still being processed"""
+        self.start()
+        return self.unfinished(filenames)
+
+    def unfinished(self, filenames: Iterable[str]) -> List[str]:
+        """The filenames whose jobs are unfinished, without starting the pool
+
+        Only filenames not already known to be finished are looked up.
+        """
+        unknown = [name for name in filenames if name not in self.finished]
+        statuses = self._open_table().statuses(unknown)
+        self.finished.update(
+            name for name, status in statuses.items() if status not in UNFINISHED
+        )
+        return [name for name, status in statuses.items() if status in UNFINISHED]
+
+    def cancel(self, filename: str) -> None:
+        """Stop an image's job from writing its target, if not done yet"""
+        self.table.finish(filename, CANCELLED)
+
+    def wait(self, filename: str, timeout: float = 30) -> Optional[str]:
+        """Wait for an image's job to finish, returning its status"""
+        deadline = time.monotonic() + timeout
+        status = self.status(filename)
+        while status in UNFINISHED and time.monotonic() < deadline:
+            time.sleep(0.02)
+            status = self.status(filename)
+        return status
+
+    def _run(self, filename: str) -> None:
+        job = self.table.claim(filename)
+        if job is None:
+            return
+        try:
+            resize_image(job.source, job.target, job.max_pixels)
+        except Exception as e:
+            self.table.finish(filename, FAILED, f"{type(e).__name__}: {e}")
+            return
+        self.table.finish(filename, DONE)
+        if self.status(filename) == CANCELLED:
+            # The image was deleted while it was being resized
+            for path in image_files(job.target):
+                os.remove(path)
+
+
+def fitted_size(size: Tuple[int, int], max_pixels: int) -> Tuple[int, int]:
+    """Size of an image scaled down to fit in a max_pixels square"""
+    width, height = size
+    scale = max_pixels / max(width, height)
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def modern_formats() -> List[str]:
+    """Extensions of the modern formats Pillow can encode, best first"""
+    Image.init()
+    return [ext for ext in ("avif", "webp") if ext.upper() in Image.SAVE]
+
+
+def plan_variants(filename: str, size: Tuple[int, int]) -> List[Variant]:
+    """The copies made of an image stored as filename, resized to size
+
+    Every width in RESPONSIVE_WIDTHS narrower than the image is made in the
+    image's own format, and those widths and the full width in each modern
+    format. Full width copies are named like the image, other copies get a
+    "-<width>w" suffix.
+    """
+    stem, ext = os.path.splitext(filename)
+    ext = ext[1:].lower()
+    full_width = size[0]
+    widths = [width for width in RESPONSIVE_WIDTHS if width < full_width]
+    variants = []
+    for variant_ext in modern_formats() + [ext]:
+        for width in widths + [full_width]:
+            if variant_ext == ext and width == full_width:
+                continue  # That's the image itself
+            suffix = "" if width == full_width else f"-{width}w"
+            variants.append(
+                Variant(f"{stem}{suffix}.{variant_ext}", width, MIMETYPES[variant_ext])
+            )
+    return variants
+
+
+def image_files(path: str) -> List[str]:
+    """An image's file and the files of all its variants"""
+    stem = glob.escape(os.path.splitext(path)[0])
+    return glob.glob(f"{stem}.*") + glob.glob(f"{stem}-*w.*")
+
+
+def check_pixels(size: Tuple[int, int]) -> None:
+    """Raise ValueError if an image of size is over MAX_IMAGE_PIXELS"""
+    width, height = size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"{width}x{height} image is over {MAX_IMAGE_PIXELS:,} pixels")
+
+
+def resize_image(source: str, target: str, max_pixels: int) -> List[Variant]:
+    """Write source, scaled down to fit a max_pixels square, over target
+
+    Also writes the variants of the resized image (see plan_variants) in
+    target's folder.
+
+    Returns:
+        the variants written
+    """
+    directory, filename = os.path.split(target)
+    with Image.open(source) as image:
+        # Opening only parsed the header, check the size before decoding
+        check_pixels(image.size)
+        size = fitted_size(image.size, max_pixels)
+        # JPEGs decode straight to the nearest larger 1/2, 1/4 or 1/8 scale
+        image.draft(None, size)
+        image.load()
+        resized = image.resize(size, Image.LANCZOS) if size != image.size else image
+        variants = plan_variants(filename, size)
+        for variant in variants:
+            copy = resized
+            if variant.width != size[0]:
+                height = max(1, round(size[1] * variant.width / size[0]))
+                copy = resized.resize((variant.width, height), Image.LANCZOS)
+            save_image(copy, os.path.join(directory, variant.filename))
+        save_image(resized, target)
+    return variants
+
+
+def save_image(image: Image.Image, path: str) -> None:
+    """Save an image with its format's SAVE_OPTIONS
+
+    The image is written next to path first and then renamed over it, so
+    path is always a complete image.
+    """
+    directory, filename = os.path.split(path)
+    ext = os.path.splitext(filename)[1]
+    if ext in (".webp", ".avif") and image.mode not in ("RGB", "RGBA"):
+        transparent = image.mode == "LA" or "transparency" in image.info
+        image = image.convert("RGBA" if transparent else "RGB")
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=ext)
+    os.close(fd)
+    try:
+        image.save(tmp_path, **SAVE_OPTIONS.get(ext[1:].lower(), {}))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+image_pipeline = ImagePipeline()
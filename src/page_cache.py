@@ -0,0 +1,148 @@
+"""Whole page response cache
+
+Public pages only change when posts or comments change, so their rendered
+responses are cached by endpoint, url arguments and auth class. Writes call
+`page_cache.invalidate()`, which bumps a generation number that is part of
+every key, so stale pages are never served again (and age out of the LRU).
+
+With PAGE_CACHE_DIR set, pages and the generation number are also kept on
+disk, shared by every worker, otherwise each process has its own cache. The
+cache is off unless PAGE_CACHE is set, as separate caches per worker would
+serve stale pages after another worker's edit.
+"""
+from functools import wraps
+from typing import Any, Callable, Iterable, Optional
+
+from flask import current_app, get_flashed_messages, make_response, request, session
+from flask_login import current_user
+
+from src.cache import DiskCache, LRUCache, TieredCache, hash_key
+from src.globals import FlaskResponse
+
+ANONYMOUS = "anonymous"
+USER = "user"
+ADMIN = "admin"
+GENERATION_KEY = hash_key("page-cache-generation")
+# Response headers kept with cached pages, so conditional GETs still work
+CACHED_HEADERS = ("ETag", "Last-Modified")
+
+
+def get_auth_class() -> str:
+    """Get the auth class (anonymous, user or admin) of the current user"""
+    if not current_user.is_authenticated:
+        return ANONYMOUS
+    if current_user.access_level == 1:
+        return ADMIN
+    return USER
+
+
+class PageCache:
+    """Cache of rendered responses for GET requests
+
+    Params:
+        maxsize: pages kept in memory per process
+        ttl: seconds a cached page is served for
+        auth_classes: auth classes whose pages are cached. Only anonymous by
+            default, as pages for logged in users show their username.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 512,
+        ttl: float = 300,
+        auth_classes: Iterable[str] = (ANONYMOUS,),
+    ):
+        self.ttl = ttl
+        self.auth_classes = set(auth_classes)
+        self.cache = TieredCache(LRUCache(maxsize=maxsize, ttl=ttl))
+        self._generation = 0
+        # The generation outlives cached pages, so it never drops back to a
+        # number stale pages were cached under
+        self.generations: Optional[DiskCache] = None
+        self._configured = False
+
+    def configure(self) -> None:
+        """Add the shared disk tier from the app config, once"""
+        if self._configured:
+            return
+        cache_dir = current_app.config.get("PAGE_CACHE_DIR")
+        if cache_dir:
+            self.cache.shared = DiskCache(cache_dir, ttl=self.ttl)
+            self.generations = DiskCache(cache_dir)
+        self._configured = True
+
+    @property
+    def enabled(self) -> bool:
+        return bool(current_app.config.get("PAGE_CACHE", False))
+
+    def generation(self) -> int:
+        """Get the current generation, shared between workers if possible"""
+        if self.generations is not None:
+            return self.generations.get(GENERATION_KEY, 0)
+        return self._generation
+
+    def invalidate(self) -> None:
+        """Stop serving every page cached so far"""
+        self.configure()
+        generation = self.generation() + 1
+        self._generation = generation
+        if self.generations is not None:
+            self.generations.set(GENERATION_KEY, generation)
+        self.cache.memory.clear()
+
+    def clear(self) -> None:
+        """Remove every cached page"""
+        self._generation = 0
+        self.cache.clear()
+
+    def make_key(self, auth_class: str) -> str:
+        """Cache key of the current request for an auth class"""
+        return hash_key(
+            self.generation(),
+            request.endpoint,
+            sorted((request.view_args or {}).items()),
+            sorted(request.args.items(multi=True)),
+            auth_class,
+        )
+
+    def cached(self, view: Callable[..., FlaskResponse]) -> Callable:
+        """Decorator serving a view's successful GET responses from the cache
+
+        Pages showing flash messages are never cached, and requests with
+        pending flash messages are never served from the cache.
+        """
+
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> FlaskResponse:
+            if not self.enabled or request.method != "GET" or "_flashes" in session:
+                return view(*args, **kwargs)
+            auth_class = get_auth_class()
+            if auth_class not in self.auth_classes:
+                return view(*args, **kwargs)
+            self.configure()
+            key = self.make_key(auth_class)
+            cached_page: Optional[tuple] = self.cache.get(key)
+            if cached_page is not None:
+                body, mimetype, headers = cached_page
+                response = current_app.response_class(
+                    body, mimetype=mimetype, headers=headers
+                )
+                return response.make_conditional(request)
+            response = make_response(view(*args, **kwargs))
+            if (
+                response.status_code == 200
+                and not response.direct_passthrough
+                and not get_flashed_messages()
+            ):
+                headers = [
+                    (name, response.headers[name])
+                    for name in CACHED_HEADERS
+                    if name in response.headers
+                ]
+                self.cache.set(key, (response.get_data(), response.mimetype, headers))
+            return response
+
+        return wrapper
+
+
+page_cache = PageCache()
@@ -0,0 +1,246 @@
+"""Blog maintenance commands
+
+Run with the flask cli, for example:
+    FLASK_APP=src.factory:create_app flask blog backfill-comment-counts
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import click
+import mongoengine
+from bson.objectid import ObjectId
+from flask import current_app
+from flask.cli import AppGroup
+from pymongo import UpdateOne
+
+from src.routes.blog import rendering
+from src.routes.blog.models import BlogPost, Comment
+from src.routes.blog.search import search_index
+from src.routes.blog.views import rebuild_tag_stats
+
+blog_cli = AppGroup("blog", help="Blog maintenance commands.")
+
+BATCH_SIZE = 500
+RENDER_BATCH_SIZE = 50
+RENDER_FIELDS = {"markdown_content": 1, "markdown_description": 1, "render_hash": 1}
+
+
+@blog_cli.command("backfill-comment-counts")
+def backfill_comment_counts_command() -> None:
+    """Set comment_count on every blog post from its comments"""
+    updated = backfill_comment_counts()
+    click.echo(f"Updated comment_count on {updated} post(s).")
+
+
+@blog_cli.command("migrate-comments")
+def migrate_comments_command() -> None:
+    """Move comments embedded in blog posts to the comments collection"""
+    migrated = migrate_embedded_comments()
+    click.echo(f"Migrated comments of {migrated} post(s).")
+
+
+@blog_cli.command("rebuild-tag-stats")
+def rebuild_tag_stats_command() -> None:
+    """Rebuild the tag stats collection from every blog post"""
+    tag_count = rebuild_tag_stats()
+    click.echo(f"Rebuilt tag stats for {tag_count} tag(s).")
+
+
+@blog_cli.command("rebuild-search-index")
+def rebuild_search_index_command() -> None:
+    """Rebuild the blog search index from every blog post"""
+    search_index.configure()
+    post_count = search_index.rebuild()
+    click.echo(f"Indexed {post_count} post(s) for search.")
+
+
+@blog_cli.command("rerender")
+@click.option(
+    "--dry-run", is_flag=True, help="Only report how many posts would be rendered."
+)
+@click.option(
+    "--force", is_flag=True, help="Also render posts whose content is unchanged."
+)
+@click.option(
+    "--workers",
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="Render processes to use (1 renders in this process).",
+)
+@click.option(
+    "--batch-size",
+    default=RENDER_BATCH_SIZE,
+    show_default=True,
+    help="Posts rendered and written per bulk write.",
+)
+def rerender_command(dry_run: bool, force: bool, workers: int, batch_size: int) -> None:
+    """Re-render the HTML of blog posts whose markdown or renderer changed"""
+    total = BlogPost._get_collection().estimated_document_count()
+    with click.progressbar(length=total, label="Rendering posts") as progress:
+        rendered, skipped = rerender_posts(
+            dry_run=dry_run,
+            force=force,
+            workers=workers,
+            batch_size=batch_size,
+            progress=progress.update,
+        )
+    verb = "Would render" if dry_run else "Rendered"
+    click.echo(f"{verb} {rendered} post(s), skipped {skipped} unchanged post(s).")
+
+
+# ----------------------------------------------------------------------------
+# HELPER METHODS
+# ----------------------------------------------------------------------------
+def backfill_comment_counts(batch_size: int = BATCH_SIZE) -> int:
+    """Recompute comment_count for all posts, returning how many changed
+
+    The counts are grouped server side, so the comments themselves are
+    never sent over the wire.
+    """
+    pipeline = [{"$group": {"_id": "$post_id", "count": {"$sum": 1}}}]
+    counts = {doc["_id"]: doc["count"] for doc in Comment.objects.aggregate(pipeline)}
+    collection = BlogPost._get_collection()
+    updated = 0
+    operations = []
+    for doc in collection.find({}, {"comment_count": 1}):
+        actual = counts.get(doc["_id"], 0)
+        if doc.get("comment_count") == actual:
+            continue
+        operations.append(
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"comment_count": actual}})
+        )
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+def migrate_embedded_comments() -> int:
+    """Move comments embedded in blog posts into the comments collection
+
+    Comment ids are kept and inserts are upserts, so an interrupted
+    migration can simply be run again. Returns the number of posts migrated.
+    """
+    blog_collection = BlogPost._get_collection()
+    comment_collection = Comment._get_collection()
+    migrated = 0
+    for post in blog_collection.find({"comments": {"$exists": True}}, {"comments": 1}):
+        operations = []
+        for comment in post["comments"] or []:
+            comment_id = comment.pop("id", None) or ObjectId()
+            comment["post_id"] = post["_id"]
+            operations.append(
+                UpdateOne({"_id": comment_id}, {"$setOnInsert": comment}, upsert=True)
+            )
+        if operations:
+            comment_collection.bulk_write(operations, ordered=False)
+        comment_count = comment_collection.count_documents({"post_id": post["_id"]})
+        blog_collection.update_one(
+            {"_id": post["_id"]},
+            {"$set": {"comment_count": comment_count}, "$unset": {"comments": ""}},
+        )
+        migrated += 1
+    return migrated
+
+
+def rerender_posts(
+    dry_run: bool = False,
+    force: bool = False,
+    workers: int = 1,
+    batch_size: int = RENDER_BATCH_SIZE,
+    progress=None,
+) -> Tuple[int, int]:
+    """Re-render the html fields of posts whose render hash is out of date
+
+    Posts are streamed from a cursor with only their markdown fields, rendered
+    a batch at a time (in a process pool if workers > 1) and written back with
+    one bulk write per batch.
+
+    Params:
+        dry_run: count the posts that would be rendered, changing nothing
+        force: render every post, even if its render hash is current
+        workers: number of render processes
+        batch_size: posts per render batch and bulk write
+        progress: called with the number of posts scanned after each one
+    Returns:
+        (posts rendered, posts skipped as unchanged)
+    """
+    collection = BlogPost._get_collection()
+    rendered = skipped = 0
+    executor = None
+    if workers > 1 and not dry_run:
+        executor = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_render_worker,
+            initargs=(current_app.config["MONGODB_SETTINGS"],),
+        )
+    else:
+        rendering.configure_caches()
+    cursor = collection.find({}, RENDER_FIELDS, no_cursor_timeout=True)
+    try:
+        for batch in batches(cursor.batch_size(batch_size), batch_size):
+            stale = [doc for doc in batch if force or not render_hash_current(doc)]
+            skipped += len(batch) - len(stale)
+            rendered += len(stale)
+            if stale and not dry_run:
+                if executor is not None:
+                    updates = list(executor.map(render_post_update, stale))
+                else:
+                    updates = [render_post_update(doc) for doc in stale]
+                collection.bulk_write(updates, ordered=False)
+            if progress is not None:
+                progress(len(batch))
+    finally:
+        cursor.close()
+        if executor is not None:
+            executor.shutdown()
+    return rendered, skipped
+
+
+def batches(docs: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict]]:
+    """Group documents into lists of at most size"""
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_hash_current(doc: Dict[str, Any]) -> bool:
+    """Whether a raw post document's html was rendered from its markdown"""
+    render_hash = rendering.post_render_hash(
+        doc.get("markdown_content", ""), doc.get("markdown_description", "")
+    )
+    return doc.get("render_hash") == render_hash
+
+
+def render_post_update(doc: Dict[str, Any]) -> UpdateOne:
+    """Render a raw post document, returning the update that stores it"""
+    markdown_content = doc.get("markdown_content", "")
+    markdown_description = doc.get("markdown_description", "")
+    return UpdateOne(
+        {"_id": doc["_id"]},
+        {
+            "$set": {
+                "html_content": rendering.render_markdown(markdown_content, table=True),
+                "html_description": rendering.render_markdown(markdown_description),
+                "render_hash": rendering.post_render_hash(
+                    markdown_content, markdown_description
+                ),
+            }
+        },
+    )
+
+
+def init_render_worker(mongodb_settings: Dict[str, Any]) -> None:
+    """Connect a render worker process to mongo, for the shared oEmbed cache"""
+    mongoengine.connect(**mongodb_settings)
+    rendering.configure_caches()
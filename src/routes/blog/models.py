@@ -4,10 +4,15 @@ Initial blog inspired by:
 https://charlesleifer.com/blog/how-to-make-a-flask-blog-in-one-hour-or-less/
 """
 
+from datetime import timedelta
+
 from bson.objectid import ObjectId
 
 from src.globals import db
 
+# How long fetched oEmbed responses are kept
+OEMBED_CACHE_TTL = timedelta(days=30)
+
 
 class Reply(db.EmbeddedDocument):
     """Reply to comment embedded document"""
@@ -20,10 +25,15 @@ class Reply(db.EmbeddedDocument):
     likes = db.IntField(default=0)
 
 
-class Comment(db.EmbeddedDocument):
-    """Comment embedded document"""
+class Comment(db.Document):
+    """Blog post comment model
 
-    id = db.ObjectIdField(default=lambda: ObjectId())
+    Comments live in their own collection (rather than embedded in the post)
+    so comment writes touch only the changed comment and reading a thread
+    never loads the post's content.
+    """
+
+    post_id = db.ObjectIdField(required=True)
     author = db.ObjectIdField(required=True)
     content = db.StringField(required=True, max_length=500)
     created_timestamp = db.DateTimeField(required=True)
@@ -31,12 +41,32 @@ class Comment(db.EmbeddedDocument):
     likes = db.IntField(default=0)
     replies = db.EmbeddedDocumentListField(Reply, required=False)
 
+    meta = {
+        "collection": "comments",
+        "indexes": [
+            {"fields": ["post_id", "-created_timestamp", "-id"]},
+        ],
+    }
+
+    def __str__(self):
+        return f"Comment(post_id: {self.post_id}, author: {self.author})"
+
+
+class ImageVariant(db.EmbeddedDocument):
+    """A resized or re-encoded copy of an uploaded image"""
+
+    location = db.StringField(required=True)
+    width = db.IntField(required=True)
+    mimetype = db.StringField(required=True)
+
 
 class Image(db.EmbeddedDocument):
     """Image embedded document"""
 
     name = db.StringField(required=False, default="image name")
     location = db.StringField(required=True)
+    # Copies for responsive srcsets, made by the image pipeline
+    variants = db.ListField(db.EmbeddedDocumentField(ImageVariant))
 
 
 class BlogPost(db.Document):
@@ -57,41 +87,27 @@ class BlogPost(db.Document):
     likes = db.IntField(default=0)
     views = db.IntField(default=0)
     can_comment = db.BooleanField(default=True)
-    comments = db.EmbeddedDocumentListField(Comment, required=False)
+    # Denormalized count of the post's comments (in the Comment collection)
+    comment_count = db.IntField(default=0)
+    # Last time a comment or reply of the post was written
+    comments_updated_timestamp = db.DateTimeField(required=False)
+    # Hash of the markdown (and render settings) the html fields came from
+    render_hash = db.StringField(required=False)
 
     meta = {
         "collection": "blog",
+        # Tolerate the legacy embedded "comments" field on posts that
+        # `flask blog migrate-comments` has not migrated yet
+        "strict": False,
+        # title and slug get unique indexes from their fields. The rest
+        # match the queries in blog.views (see `flask db audit-indexes`):
+        # newest first lists (published only, by tag, or everything for
+        # admins) and the search index's sync of recently updated posts.
         "indexes": [
-            {
-                "fields": ["$title", "$author", "$tags", "$markdown_content"],
-                "default_language": "english",
-                "weights": {
-                    "author": 20,
-                    "tags": 15,
-                    "title": 10,
-                    "markdown_content": 2,
-                },
-            },
-            "title",
-            "slug",
-            "author",
-            "published",
-            "tags",
-            "created_timestamp",
+            {"fields": ["published", "-created_timestamp", "-id"]},
+            {"fields": ["tags", "-created_timestamp", "-id"]},
+            {"fields": ["-created_timestamp", "-id"]},
             "updated_timestamp",
-            "likes",
-            "views",
-            "can_comment",
-            "comments.id",
-            "comments.author",
-            "comments.created_timestamp",
-            "comments.updated_timestamp",
-            "comments.likes",
-            "comments.replies.id",
-            "comments.replies.author",
-            "comments.replies.created_timestamp",
-            "comments.replies.updated_timestamp",
-            "comments.replies.likes",
         ],
     }
 
@@ -100,3 +116,50 @@ class BlogPost(db.Document):
             f"Post(title: {self.title}, author: {self.author}, "
             f"published: {self.published})"
         )
+
+
+class TagStats(db.Document):
+    """Blog post counts per tag
+
+    Maintained incrementally as posts are created, edited and deleted so the
+    tags page is a single indexed read instead of a scan of every post.
+    """
+
+    tag = db.StringField(required=True, unique=True)
+    published_count = db.IntField(default=0)
+    total_count = db.IntField(default=0)
+
+    meta = {
+        "collection": "tag_stats",
+        "indexes": [
+            {"fields": ["-published_count", "tag"]},
+            {"fields": ["-total_count", "tag"]},
+        ],
+    }
+
+    def __str__(self):
+        return (
+            f"TagStats(tag: {self.tag}, published: {self.published_count}, "
+            f"total: {self.total_count})"
+        )
+
+
+class OEmbedCacheEntry(db.Document):
+    """Cached oEmbed response, shared by every worker (see src.cache.MongoCache)"""
+
+    key = db.StringField(required=True, unique=True)
+    value = db.BinaryField(required=True)
+    created_timestamp = db.DateTimeField(required=True)
+
+    meta = {
+        "collection": "oembed_cache",
+        "indexes": [
+            {
+                "fields": ["created_timestamp"],
+                "expireAfterSeconds": int(OEMBED_CACHE_TTL.total_seconds()),
+            },
+        ],
+    }
+
+    def __str__(self):
+        return f"OEmbedCacheEntry(key: {self.key})"
@@ -0,0 +1,141 @@
+"""Blog post markdown rendering
+
+Rendering runs Pygments highlighting and oEmbed lookups, so rendered HTML is
+cached by a hash of everything that affects it. Markdown instances are
+pooled so each render skips extension setup.
+"""
+import os
+import queue
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Iterator
+
+from flask import Markup
+from markdown import Markdown
+from markdown.extensions.codehilite import CodeHiliteExtension
+from markdown.extensions.extra import ExtraExtension
+from markdown.extensions.toc import TocExtension
+from micawber import bootstrap_basic, parse_html
+
+from src.cache import DiskCache, LRUCache, MongoCache, TieredCache, hash_key
+from src.globals import SITE_WIDTH
+from src.routes.blog.models import OEMBED_CACHE_TTL, OEmbedCacheEntry
+
+# Bump to invalidate cached HTML when the rendering pipeline changes
+RENDER_VERSION = 1
+MARKDOWN_POOL_SIZE = 8
+# Rendered HTML on disk goes once this old, or the oldest beyond this many
+MARKDOWN_CACHE_TTL = timedelta(days=30)
+MARKDOWN_CACHE_MAX_ENTRIES = 10_000
+OEMBED_CACHE_MAX_ENTRIES = 10_000
+
+# Rendered HTML by content hash, and fetched oEmbed responses by url. Their
+# shared tiers are added on first use (once .env is loaded), see
+# configure_caches.
+html_cache = TieredCache(LRUCache(maxsize=256))
+oembed_cache = TieredCache(LRUCache(maxsize=512, ttl=OEMBED_CACHE_TTL.total_seconds()))
+_caches_configured = False
+
+# Configure micawber with the default OEmbed providers (YouTube, Flickr, etc).
+# Responses are cached in memory and in mongo (or on disk) so the same video
+# is never fetched twice, even by different workers or after a restart.
+oembed_providers = bootstrap_basic(oembed_cache)
+
+_markdown_pool: "queue.LifoQueue[Markdown]" = queue.LifoQueue(
+    maxsize=MARKDOWN_POOL_SIZE
+)
+
+
+def new_markdown() -> Markdown:
+    """Create a Markdown instance configured for blog posts"""
+    return Markdown(
+        extensions=[
+            CodeHiliteExtension(linenums=False, css_class="highlight"),
+            ExtraExtension(),
+            TocExtension(toc_depth=3),
+        ]
+    )
+
+
+@contextmanager
+def pooled_markdown() -> Iterator[Markdown]:
+    """Borrow a configured Markdown instance from the pool
+
+    Instances keep state between conversions, so they are reset before
+    being handed out and only one thread uses an instance at a time.
+    """
+    try:
+        md = _markdown_pool.get_nowait()
+    except queue.Empty:
+        md = new_markdown()
+    try:
+        yield md.reset()
+    finally:
+        try:
+            _markdown_pool.put_nowait(md)
+        except queue.Full:
+            pass
+
+
+def configure_caches() -> None:
+    """Add the shared tiers of the rendering caches
+
+    Set MARKDOWN_CACHE_DIR to keep rendered HTML on disk, shared between
+    workers and across restarts. oEmbed responses are kept in mongo, or on
+    disk if OEMBED_CACHE_DIR is set.
+    """
+    global _caches_configured
+    if _caches_configured:
+        return
+    markdown_cache_dir = os.getenv("MARKDOWN_CACHE_DIR")
+    if markdown_cache_dir:
+        html_cache.shared = DiskCache(
+            markdown_cache_dir,
+            ttl=MARKDOWN_CACHE_TTL.total_seconds(),
+            max_entries=MARKDOWN_CACHE_MAX_ENTRIES,
+        )
+    oembed_cache_dir = os.getenv("OEMBED_CACHE_DIR")
+    oembed_ttl = OEMBED_CACHE_TTL.total_seconds()
+    if oembed_cache_dir:
+        oembed_cache.shared = DiskCache(
+            oembed_cache_dir, ttl=oembed_ttl, max_entries=OEMBED_CACHE_MAX_ENTRIES
+        )
+    else:
+        oembed_cache.shared = MongoCache(
+            OEmbedCacheEntry, ttl=oembed_ttl, max_entries=OEMBED_CACHE_MAX_ENTRIES
+        )
+    _caches_configured = True
+
+
+def markdown_to_html(markdown_content: str, table: bool = False) -> str:
+    """Generate HTML representation of the markdown-formatted blog entry
+
+    Also convert any media URLs into rich media objects such as video
+    players or images.
+    """
+    configure_caches()
+    key = hash_key(RENDER_VERSION, table, SITE_WIDTH, markdown_content)
+    html = html_cache.get(key)
+    if html is None:
+        html = render_markdown(markdown_content, table=table)
+        html_cache.set(key, html)
+    return Markup(html)
+
+
+def post_render_hash(markdown_content: str, markdown_description: str) -> str:
+    """Hash of everything a post's rendered HTML depends on"""
+    return hash_key(RENDER_VERSION, SITE_WIDTH, markdown_content, markdown_description)
+
+
+def render_markdown(markdown_content: str, table: bool = False) -> str:
+    """Render markdown to HTML, without the cache"""
+    if table:
+        markdown_content = "[TOC]\n\n" + markdown_content
+    with pooled_markdown() as md:
+        html = md.convert(markdown_content)
+    return parse_html(
+        html,
+        oembed_providers,
+        urlize_all=True,
+        maxwidth=SITE_WIDTH,
+    )
@@ -0,0 +1,91 @@
+"""Responsive markup for uploaded blog images
+
+Uploaded images have smaller and WebP/AVIF copies (see src.image_jobs). These
+template filters turn an image into a <picture> offering them, so browsers
+download the smallest copy in the best format they support.
+"""
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from flask import Markup, escape
+
+from src.globals import SITE_WIDTH
+from src.image_handler import get_pending_images
+from src.routes.blog.models import Image, ImageVariant
+
+# Images fill the post column on small screens, and are at most SITE_WIDTH
+SIZES = f"(max-width: {SITE_WIDTH}px) 100vw, {SITE_WIDTH}px"
+IMG_TAG = re.compile(r'<img\b(?P<attrs>[^>]*?\bsrc="(?P<src>[^"]*)"[^>]*)>')
+
+
+def srcset(variants: Iterable[ImageVariant]) -> str:
+    """A srcset attribute value offering the variants"""
+    return ", ".join(f"{variant.location} {variant.width}w" for variant in variants)
+
+
+def picture_parts(image: Image) -> List[str]:
+    """<source> tags for an image's modern formats, then the <img> attributes
+
+    Returns:
+        the <source> tags, with srcset and sizes attributes for the <img>
+            last; or an empty list if the image has no variants
+    """
+    if not image.variants:
+        return []
+    by_mimetype: Dict[str, List[ImageVariant]] = defaultdict(list)
+    for variant in image.variants:
+        by_mimetype[variant.mimetype].append(variant)
+    # The image's own format is the one without a full width variant
+    full_width = max(variant.width for variant in image.variants)
+    fallback = [
+        mimetype
+        for mimetype, variants in by_mimetype.items()
+        if all(variant.width != full_width for variant in variants)
+    ]
+    parts = [
+        f'<source type="{mimetype}" srcset="{escape(srcset(variants))}" '
+        f'sizes="{SIZES}">'
+        for mimetype, variants in by_mimetype.items()
+        if mimetype not in fallback
+    ]
+    fallback_variants = by_mimetype[fallback[0]] if fallback else []
+    fallback_srcset = srcset(
+        fallback_variants + [ImageVariant(location=image.location, width=full_width)]
+    )
+    parts.append(f'srcset="{escape(fallback_srcset)}" sizes="{SIZES}"')
+    return parts
+
+
+def picture(image: Image) -> Markup:
+    """An uploaded image as a <picture> offering its variants"""
+    img = f'<img src="{escape(image.location)}" alt="{escape(image.name)}"'
+    parts = picture_parts(image)
+    if not parts:
+        return Markup(f"{img}>")
+    return Markup(f"<picture>{''.join(parts[:-1])}{img} {parts[-1]}></picture>")
+
+
+def responsive_images(html: str, images: Iterable[Image]) -> Markup:
+    """Rendered post HTML with its uploaded images made responsive
+
+    Images whose variants are still being made are left as they are.
+    """
+    by_location: Dict[str, Image] = {
+        image.location: image for image in images if image.variants
+    }
+    if not by_location:
+        return Markup(html)
+    for location in get_pending_images(by_location):
+        del by_location[location]
+
+    def replace(match: "re.Match[str]") -> str:
+        image = by_location.get(match["src"])
+        if image is None:
+            return match[0]
+        parts = picture_parts(image)
+        return (
+            f"<picture>{''.join(parts[:-1])}<img {parts[-1]}{match['attrs']}></picture>"
+        )
+
+    return Markup(IMG_TAG.sub(replace, html))
@@ -0,0 +1,483 @@
+"""Ranked full text search of blog posts
+
+Posts are kept in an in-memory inverted index, scored with BM25F using the
+field weights of the old mongo text index. Query terms also match terms
+they are a prefix of, and terms one or two typos away, so partial words
+and small misspellings still find posts.
+
+The index is updated as posts are created, edited and deleted. Writes made
+by other workers (or directly in mongo) are picked up by `sync`, which runs
+before every search and only reads posts updated since the last sync.
+Deleted posts, which that misses, are caught by `reconcile` comparing post
+counts, in a background thread at most every RECONCILE_SECONDS. Set
+SEARCH_INDEX_PATH to save the index to disk, so new workers load it instead
+of reading every post.
+"""
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson.objectid import ObjectId
+from flask import current_app
+
+from src.routes.blog.models import BlogPost
+from src.routes.users.models import User
+
+# Field weights, as on the old mongo text index
+FIELD_WEIGHTS = {"author": 20, "tags": 15, "title": 10, "markdown_content": 2}
+FIELDS = tuple(FIELD_WEIGHTS)
+INDEX_FIELDS = (
+    "id",
+    "author",
+    "title",
+    "tags",
+    "markdown_content",
+    "published",
+    "created_timestamp",
+    "updated_timestamp",
+)
+# BM25 term frequency saturation and document length normalization
+K1 = 1.2
+B = 0.75
+# Query terms at least this long also match longer terms they start
+PREFIX_MIN_LENGTH = 3
+PREFIX_MAX_EXPANSIONS = 50
+# Score multipliers for prefix and typo matches (exact matches are 1)
+PREFIX_FACTOR = 0.7
+TYPO_FACTOR = 0.5
+# Check the index against the post count at most this often
+RECONCILE_SECONDS = 60
+# Bump when the serialized format changes, older files are then ignored
+FORMAT_VERSION = 1
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Per document: published, tags, created and updated timestamps, and the
+# number of terms in each field
+DocInfo = Tuple[bool, Tuple[str, ...], datetime, datetime, Tuple[int, ...]]
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search terms, dropping stop words"""
+    return [term for term in TOKEN_RE.findall(text.lower()) if term not in STOP_WORDS]
+
+
+def max_typos(term: str) -> int:
+    """Number of typos tolerated in a query term"""
+    if len(term) >= 8:
+        return 2
+    if len(term) >= 4:
+        return 1
+    return 0
+
+
+def within_distance(first: str, second: str, max_distance: int) -> bool:
+    """Whether two terms are at most max_distance typos apart
+
+    Typos are inserted, deleted or replaced letters and swapped neighbouring
+    letters (optimal string alignment distance).
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return False
+    before_previous: List[int] = []
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            distance = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (first_char != second_char),
+            )
+            if (
+                i > 1
+                and j > 1
+                and first_char == second[j - 2]
+                and first[i - 2] == second_char
+            ):
+                distance = min(distance, before_previous[j - 2] + 1)
+            current.append(distance)
+        if min(current) > max_distance:
+            return False
+        before_previous, previous = previous, current
+    return previous[-1] <= max_distance
+
+
+class SearchIndex:
+    """Inverted index of blog posts with BM25F ranked search
+
+    Params:
+        path: file to save the index to and load it from, or None to keep it
+            in memory only. Defaults to the SEARCH_INDEX_PATH config value.
+        reconcile_seconds: check the index against the post count at most
+            this often
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, reconcile_seconds: float = RECONCILE_SECONDS
+    ):
+        self.path = path
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.RLock()
+        self._configured = False
+        self._reconciled: Optional[float] = None
+        self._reconcile_lock = threading.Lock()
+        self._reconciling = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self._docs: Dict[ObjectId, DocInfo] = {}
+        # term -> post id -> term count in each field
+        self._postings: Dict[str, Dict[ObjectId, Tuple[int, ...]]] = {}
+        self._doc_terms: Dict[ObjectId, Tuple[str, ...]] = {}
+        # Total terms in, and number of posts with, each field
+        self._field_totals = [0] * len(FIELDS)
+        self._field_posts = [0] * len(FIELDS)
+        self._vocabulary: Optional[List[str]] = None
+        self.synced_until: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, post_id: ObjectId) -> bool:
+        return post_id in self._docs
+
+    def configure(self) -> None:
+        """Load the saved index, once"""
+        if self._configured:
+            return
+        if self.path is None:
+            self.path = current_app.config.get("SEARCH_INDEX_PATH")
+        if self.path:
+            self.load()
+        self._configured = True
+
+    # ---- WRITES ----
+
+    def add_post(self, post: BlogPost, author_name: str = "") -> None:
+        """Add a post to the index, replacing any older version of it"""
+        self.configure()
+        with self._lock:
+            self._add(post, author_name)
+            self.save()
+
+    def remove_post(self, post_id: ObjectId) -> None:
+        """Remove a post from the index"""
+        self.configure()
+        with self._lock:
+            self._remove(post_id)
+            self.save()
+
+    def _add(self, post: BlogPost, author_name: str) -> None:
+        field_terms = [
+            tokenize(author_name),
+            tokenize(" ".join(post.tags or [])),
+            tokenize(post.title or ""),
+            tokenize(post.markdown_content or ""),
+        ]
+        counts = [Counter(terms) for terms in field_terms]
+        terms = set().union(*counts)
+        self._remove(post.id)
+        for term in terms:
+            self._postings.setdefault(term, {})[post.id] = tuple(
+                field_counts[term] for field_counts in counts
+            )
+        lengths = tuple(len(field) for field in field_terms)
+        # Mongo keeps milliseconds, match it so sync sees the same timestamp
+        updated_timestamp = post.updated_timestamp.replace(
+            microsecond=post.updated_timestamp.microsecond // 1000 * 1000
+        )
+        self._docs[post.id] = (
+            bool(post.published),
+            tuple(post.tags or ()),
+            post.created_timestamp,
+            updated_timestamp,
+            lengths,
+        )
+        self._doc_terms[post.id] = tuple(terms)
+        self._add_lengths(lengths, 1)
+        self._vocabulary = None
+        if self.synced_until is None or updated_timestamp > self.synced_until:
+            self.synced_until = updated_timestamp
+
+    def _remove(self, post_id: ObjectId) -> None:
+        doc = self._docs.pop(post_id, None)
+        if doc is None:
+            return
+        for term in self._doc_terms.pop(post_id):
+            postings = self._postings[term]
+            del postings[post_id]
+            if not postings:
+                del self._postings[term]
+        self._add_lengths(doc[4], -1)
+        self._vocabulary = None
+
+    def _add_lengths(self, lengths: Tuple[int, ...], sign: int) -> None:
+        for i, length in enumerate(lengths):
+            self._field_totals[i] += sign * length
+            self._field_posts[i] += sign * bool(length)
+
+    def rebuild(self) -> int:
+        """Rebuild the index from every blog post, returning the post count"""
+        posts = BlogPost.objects().only(*INDEX_FIELDS)
+        with self._lock:
+            self._reset()
+            self._add_posts(posts)
+            self.save()
+            return len(self._docs)
+
+    def sync(self) -> None:
+        """Catch up with posts written by other workers
+
+        Adds posts updated since the last sync, then reconciles the index in
+        the background if it has not been for RECONCILE_SECONDS. The very
+        first reconcile happens in the foreground, as the index may be empty.
+        """
+        self.configure()
+        with self._lock:
+            if self.synced_until is not None:
+                changed = BlogPost.objects(
+                    updated_timestamp__gte=self.synced_until
+                ).only(*INDEX_FIELDS)
+                changed = [
+                    post
+                    for post in changed
+                    if post.id not in self._docs
+                    or self._docs[post.id][3] != post.updated_timestamp
+                ]
+                if changed:
+                    self._add_posts(changed)
+                    self.save()
+        if self._reconciled is None:
+            self.reconcile()
+            return
+        if time.monotonic() - self._reconciled < self.reconcile_seconds:
+            return
+        with self._reconcile_lock:
+            if self._reconciling:
+                return
+            self._reconciling = True
+        threading.Thread(target=self.reconcile, daemon=True).start()
+
+    def reconcile(self) -> None:
+        """Rebuild the index if posts were deleted (or created with old
+        timestamps) behind its back
+        """
+        try:
+            newest = BlogPost.objects().order_by("-id").only("id").first()
+            newest_known = newest is None or newest.id in self._docs
+            if not newest_known or BlogPost.objects().count() != len(self._docs):
+                self.rebuild()
+        finally:
+            self._reconciled = time.monotonic()
+            with self._reconcile_lock:
+                self._reconciling = False
+
+    def _add_posts(self, posts: Iterable[BlogPost]) -> None:
+        """Add posts, looking up their authors' usernames in one query"""
+        posts = list(posts)
+        author_ids = {post.author for post in posts}
+        authors = {
+            user.id: user.username
+            for user in User.objects(id__in=author_ids).only("id", "username")
+        }
+        for post in posts:
+            self._add(post, authors.get(post.author, ""))
+
+    # ---- SEARCH ----
+
+    def search(
+        self,
+        text: str,
+        published_only: bool = True,
+        tag: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[ObjectId]:
+        """Ids of the posts matching any term of text, best match first
+
+        Params:
+            text: the search query
+            published_only: leave out unpublished posts
+            tag: only include posts with this tag
+            limit: return at most this many ids
+        Returns:
+            post ids, ordered by score then newest first
+        """
+        self.sync()
+        with self._lock:
+            scores: Dict[ObjectId, float] = {}
+            for query_term in set(tokenize(text)):
+                for post_id, score in self._score_term(query_term).items():
+                    scores[post_id] = scores.get(post_id, 0.0) + score
+            ranked = []
+            for post_id, score in scores.items():
+                published, tags, created_timestamp = self._docs[post_id][:3]
+                if published_only and not published:
+                    continue
+                if tag is not None and tag not in tags:
+                    continue
+                ranked.append((-score, -created_timestamp.timestamp(), post_id))
+        ranked.sort()
+        return [post_id for *_, post_id in ranked[:limit]]
+
+    def _score_term(self, query_term: str) -> Dict[ObjectId, float]:
+        """BM25F score of each post for the best match of one query term"""
+        scores: Dict[ObjectId, float] = {}
+        for term, factor in self._expand(query_term):
+            postings = self._postings[term]
+            idf = math.log(
+                1 + (len(self._docs) - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for post_id, counts in postings.items():
+                weighted_count = self._weighted_count(counts, self._docs[post_id][4])
+                score = factor * idf * weighted_count * (K1 + 1) / (weighted_count + K1)
+                if score > scores.get(post_id, 0.0):
+                    scores[post_id] = score
+        return scores
+
+    def _weighted_count(
+        self, counts: Tuple[int, ...], lengths: Tuple[int, ...]
+    ) -> float:
+        """Term count summed over fields, by field weight and length
+
+        Field lengths are compared to the average of the posts that have the
+        field, so a field few posts use (such as tags) is not penalized.
+        """
+        weighted_count = 0.0
+        for i, count in enumerate(counts):
+            if not count:
+                continue
+            average_length = self._field_totals[i] / self._field_posts[i]
+            normalization = 1 - B + B * lengths[i] / average_length
+            weighted_count += FIELD_WEIGHTS[FIELDS[i]] * count / normalization
+        return weighted_count
+
+    def _expand(self, query_term: str) -> List[Tuple[str, float]]:
+        """Index terms matching a query term, with their score factor
+
+        Exact and prefix matches are used if there are any, otherwise terms
+        within a few typos (sharing the first letter) are.
+        """
+        vocabulary = self._get_vocabulary()
+        matches = []
+        if query_term in self._postings:
+            matches.append((query_term, 1.0))
+        if len(query_term) >= PREFIX_MIN_LENGTH:
+            start = bisect_left(vocabulary, query_term)
+            for term in vocabulary[start : start + PREFIX_MAX_EXPANSIONS + 1]:
+                if not term.startswith(query_term):
+                    break
+                if term != query_term:
+                    matches.append((term, PREFIX_FACTOR))
+        typos = max_typos(query_term)
+        if matches or not typos:
+            return matches
+        start = bisect_left(vocabulary, query_term[0])
+        for term in vocabulary[start:]:
+            if term[0] != query_term[0]:
+                break
+            if within_distance(query_term, term, typos):
+                matches.append((term, TYPO_FACTOR))
+        return matches
+
+    def _get_vocabulary(self) -> List[str]:
+        """Every indexed term, sorted for prefix lookups"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        return self._vocabulary
+
+    # ---- SERIALIZATION ----
+
+    def dumps(self) -> bytes:
+        """Serialize the index to compressed bytes
+
+        Post ids are stored once, postings refer to them by position and
+        store their counts as flat integer arrays.
+        """
+        with self._lock:
+            post_ids = list(self._docs)
+            positions = {post_id: i for i, post_id in enumerate(post_ids)}
+            postings = {}
+            for term, term_postings in self._postings.items():
+                doc_positions = array("I", (positions[pid] for pid in term_postings))
+                counts = array("I", (c for cs in term_postings.values() for c in cs))
+                postings[term] = (doc_positions.tobytes(), counts.tobytes())
+            state = {
+                "version": FORMAT_VERSION,
+                "ids": b"".join(post_id.binary for post_id in post_ids),
+                "docs": [self._docs[post_id] for post_id in post_ids],
+                "postings": postings,
+                "synced_until": self.synced_until,
+            }
+        return zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def loads(self, data: bytes) -> None:
+        """Replace the index with one serialized by `dumps`"""
+        state = pickle.loads(zlib.decompress(data))
+        if state.get("version") != FORMAT_VERSION:
+            raise ValueError("Unsupported search index format")
+        raw_ids = state["ids"]
+        post_ids = [ObjectId(raw_ids[i : i + 12]) for i in range(0, len(raw_ids), 12)]
+        with self._lock:
+            self._reset()
+            self._docs = dict(zip(post_ids, state["docs"]))
+            doc_terms: Dict[ObjectId, List[str]] = {post_id: [] for post_id in post_ids}
+            for term, (raw_positions, raw_counts) in state["postings"].items():
+                doc_positions, counts = array("I"), array("I")
+                doc_positions.frombytes(raw_positions)
+                counts.frombytes(raw_counts)
+                term_postings = {}
+                for i, position in enumerate(doc_positions):
+                    post_id = post_ids[position]
+                    term_postings[post_id] = tuple(
+                        counts[i * len(FIELDS) : (i + 1) * len(FIELDS)]
+                    )
+                    doc_terms[post_id].append(term)
+                self._postings[term] = term_postings
+            self._doc_terms = {pid: tuple(terms) for pid, terms in doc_terms.items()}
+            for doc in self._docs.values():
+                self._add_lengths(doc[4], 1)
+            self.synced_until = state["synced_until"]
+
+    def save(self) -> None:
+        """Write the index to its file, if it has one"""
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as out_file:
+                out_file.write(self.dumps())
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self) -> bool:
+        """Load the index from its file, returning whether it was loaded"""
+        if not self.path:
+            return False
+        try:
+            with open(self.path, "rb") as in_file:
+                self.loads(in_file.read())
+        except (OSError, ValueError, KeyError, pickle.PickleError, zlib.error):
+            return False
+        return True
+
+
+search_index = SearchIndex()
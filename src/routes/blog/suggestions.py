@@ -0,0 +1,128 @@
+"""Search-as-you-type suggestions for the blog search box
+
+Published post titles, slugs and tags are kept in a sorted array of
+lowercase keys, so suggesting completions of a prefix is a binary search
+plus a short scan. Every word of a title is a key too, so "login" suggests
+"Flask Login Basics".
+
+Suggestions never query mongo while answering. The array is rebuilt in a
+background thread after posts change here, and at least every
+REFRESH_SECONDS to pick up changes made by other workers.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from src.routes.blog.models import BlogPost, TagStats
+
+POST = "post"
+TAG = "tag"
+REFRESH_SECONDS = 60
+SUGGESTION_LIMIT = 8
+
+
+class Suggestion(NamedTuple):
+    """A suggested post (value is its slug) or tag (value is the tag)"""
+
+    kind: str
+    label: str
+    value: str
+
+
+def normalize(text: str) -> str:
+    """Lowercase text with runs of whitespace collapsed to single spaces"""
+    return " ".join(text.lower().split())
+
+
+def build_keys(suggestions: List[Suggestion]) -> List[Tuple[str, int]]:
+    """Sorted (key, suggestion position) pairs to look prefixes up in"""
+    keys: List[Tuple[str, int]] = []
+    for i, suggestion in enumerate(suggestions):
+        if suggestion.kind == POST:
+            words = normalize(suggestion.label).split(" ")
+            keys.extend((" ".join(words[start:]), i) for start in range(len(words)))
+            keys.append((suggestion.value, i))
+        else:
+            keys.append((normalize(suggestion.label), i))
+    keys.sort()
+    return keys
+
+
+class Suggester:
+    """Prefix lookups of blog post titles, slugs and tags
+
+    Params:
+        refresh_seconds: rebuild the suggestions at least this often
+    """
+
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        # Suggestions and their sorted keys, replaced together on rebuild
+        self._data: Tuple[List[Suggestion], List[Tuple[str, int]]] = ([], [])
+        self._built: Optional[float] = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def suggest(self, prefix: str, limit: int = SUGGESTION_LIMIT) -> List[Suggestion]:
+        """Tags, then posts, with a key starting with prefix
+
+        Params:
+            prefix: what has been typed so far
+            limit: return at most this many suggestions
+        Returns:
+            suggestions, tags first, each group in alphabetical order
+        """
+        self.refresh()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        suggestions, keys = self._data
+        matches: Set[int] = set()
+        for key, position in keys[bisect_left(keys, (prefix,)) :]:
+            if not key.startswith(prefix) or len(matches) == limit * 4:
+                break
+            matches.add(position)
+        found = [suggestions[position] for position in matches]
+        found.sort(key=lambda suggestion: (suggestion.kind != TAG, suggestion.label))
+        return found[:limit]
+
+    def invalidate(self) -> None:
+        """Rebuild the suggestions, as posts changed"""
+        self._stale = True
+
+    def refresh(self) -> None:
+        """Rebuild the suggestions in the background if they are out of date
+
+        The very first build happens in the foreground, as there is nothing
+        to answer with yet.
+        """
+        if self._built is None:
+            self.rebuild()
+            return
+        expired = time.monotonic() - self._built > self.refresh_seconds
+        if not (self._stale or expired):
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self.rebuild, daemon=True).start()
+
+    def rebuild(self) -> None:
+        """Rebuild the suggestions from the published posts and their tags"""
+        self._stale = False
+        try:
+            posts = BlogPost.objects(published=True).only("title", "slug")
+            tags = TagStats.objects(published_count__gt=0).only("tag")
+            suggestions = [Suggestion(POST, post.title, post.slug) for post in posts]
+            suggestions += [Suggestion(TAG, stat.tag, stat.tag) for stat in tags]
+            self._data = (suggestions, build_keys(suggestions))
+            self._built = time.monotonic()
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+
+suggester = Suggester()
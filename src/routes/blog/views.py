@@ -1,49 +1,94 @@
 from collections import OrderedDict
-from datetime import datetime
-from typing import Any, Dict, Iterable, List, Optional, Union
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
 from bson.objectid import ObjectId
 from flask import (
     Blueprint,
-    Markup,
     abort,
     flash,
+    jsonify,
+    make_response,
     redirect,
     render_template,
     request,
+    session,
     url_for,
 )
 from flask_login import current_user, login_required
 from flask_mongoengine import BaseQuerySet
-from flask_mongoengine.pagination import Pagination
-from markdown import markdown
-from markdown.extensions.codehilite import CodeHiliteExtension
-from markdown.extensions.extra import ExtraExtension
-from markdown.extensions.toc import TocExtension
-from micawber import bootstrap_basic, parse_html
-from micawber.cache import Cache as OEmbedCache
-
-from src.globals import SITE_WIDTH, FlaskResponse
-from src.image_handler import delete_blog_image, upload_blog_image
+from werkzeug.http import is_resource_modified
+
+from src.cache import hash_key
+from src.globals import FlaskResponse
+from src.image_handler import (
+    UploadError,
+    delete_blog_image,
+    get_blog_image_variants,
+    get_pending_images,
+    upload_blog_image,
+)
+from src.page_cache import page_cache
 from src.routes.blog.forms import (
     CommentForm,
     CreateBlogPostForm,
     EditBlogPostForm,
     EditImagesForm,
 )
-from src.routes.blog.models import BlogPost, Comment, Image, Reply
-from src.routes.users.models import User
-from src.utils import get_slug, list_from_string, setup_pagination
+from src.routes.blog.models import (
+    BlogPost,
+    Comment,
+    Image,
+    ImageVariant,
+    Reply,
+    TagStats,
+)
+from src.routes.blog.rendering import markdown_to_html, post_render_hash
+from src.routes.blog.responsive import picture, responsive_images
+from src.routes.blog.search import search_index
+from src.routes.blog.suggestions import POST, suggester
+from src.routes.users.models import AuthorProfile, get_author_profiles
+from src.utils import (
+    KeysetPagination,
+    decode_cursor,
+    get_slug,
+    list_from_string,
+    setup_keyset_pagination,
+    setup_ranked_pagination,
+)
 
 blog = Blueprint("blog", __name__)
-
-# Configure micawber with the default OEmbed providers (YouTube, Flickr, etc).
-# We'll use a simple in-memory cache so that multiple requests for the same
-# video don't require multiple network requests.
-oembed_providers = bootstrap_basic(OEmbedCache())
+blog.add_app_template_filter(picture)
+blog.add_app_template_filter(responsive_images)
+
+# Post fields needed to handle comment requests and render the comments section
+COMMENT_POST_FIELDS = ("slug", "published", "can_comment", "comment_count")
+# Post fields the ETag and Last-Modified headers of a post's page derive from
+POST_VALIDATOR_FIELDS = (
+    "slug",
+    "published",
+    "updated_timestamp",
+    "comments_updated_timestamp",
+    "comment_count",
+    "render_hash",
+)
+# Comment fields loaded per page, replies are sliced separately
+COMMENT_FIELDS = (
+    "post_id",
+    "author",
+    "content",
+    "created_timestamp",
+    "updated_timestamp",
+    "likes",
+)
+# Top level comments rendered per page of the comments section
+COMMENTS_PER_PAGE = 10
+# Replies shown per comment, the rest are loaded on demand
+REPLIES_SHOWN = 3
 
 
 @blog.route("/", methods=["GET"])
+@page_cache.cached
 def blog_list() -> FlaskResponse:
     """Get a timestamp ordered list of blog posts to display with search"""
     search = request.args.get("search")
@@ -52,14 +97,15 @@ def blog_list() -> FlaskResponse:
     if tag:
         query["tags"] = tag
 
-    try:
-        page = int(request.args.get("page", 0))
-    except (ValueError, TypeError):
-        page = 0
     results_per_page = 20  # Maybe set with form in future
 
     paginator = query_and_paginate_blog(
-        query=query, search=search, page=page, results_per_page=results_per_page
+        query=query,
+        search=search,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        results_per_page=results_per_page,
+        count_limit=1_000,
     )
 
     return render_template(
@@ -68,6 +114,7 @@ def blog_list() -> FlaskResponse:
 
 
 @blog.route("/tags", methods=["GET"])
+@page_cache.cached
 def tags() -> FlaskResponse:
     """List tags and associated counts of blogs"""
 
@@ -76,6 +123,22 @@ def tags() -> FlaskResponse:
     return render_template("blog/tags.html", tag_counts=tag_counts)
 
 
+@blog.route("/suggest", methods=["GET"])
+def suggest() -> FlaskResponse:
+    """JSON post and tag suggestions for what is typed in the search box"""
+    suggestions = [
+        {
+            "type": suggestion.kind,
+            "label": suggestion.label,
+            "url": url_for("blog.view", slug=suggestion.value)
+            if suggestion.kind == POST
+            else url_for("blog.blog_list", tag=suggestion.value),
+        }
+        for suggestion in suggester.suggest(request.args.get("q", ""))
+    ]
+    return jsonify(suggestions=suggestions)
+
+
 @blog.route("/create", methods=["GET", "POST"])
 @login_required
 def create() -> FlaskResponse:
@@ -96,14 +159,37 @@ def create() -> FlaskResponse:
 
 
 @blog.route("/view/<slug>", methods=["GET", "POST"])
+@page_cache.cached
 def view(slug: str) -> FlaskResponse:
     """Display an individual blogpost"""
+    conditional = request.if_none_match or request.if_modified_since
+    if conditional and conditional_get_allowed():
+        # Check the validators with a slim query before loading the content
+        post = get_post_for_view(slug, fields=POST_VALIDATOR_FIELDS)
+        etag, last_modified = get_post_validators(post)
+        if not is_resource_modified(
+            request.environ, etag=etag, last_modified=last_modified
+        ):
+            response = make_response("", 304)
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            return response
+
     form = CommentForm()
     post = get_post_for_view(slug)
-    comment_authors = get_comment_authors(post)
-    return render_template(
-        "blog/view_post.html", post=post, comment_authors=comment_authors, form=form
+    response = make_response(
+        render_template(
+            "blog/view_post.html",
+            post=post,
+            form=form,
+            **get_comment_page_context(post),
+        )
     )
+    if conditional_get_allowed():
+        etag, last_modified = get_post_validators(post)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+    return response
 
 
 @blog.route("/edit/<slug>", methods=["GET", "POST"])
@@ -136,7 +222,11 @@ def edit_images(slug: str) -> FlaskResponse:
     post = get_post_for_update_delete(slug)
     form = EditImagesForm()
     if form.upload_image.data:
-        blog_image = upload_blog_image(form.upload_image.data)
+        try:
+            blog_image = upload_blog_image(form.upload_image.data)
+        except UploadError as e:
+            flash(str(e))
+            return redirect(url_for("blog.edit_images", slug=slug))
         if blog_image is None:
             flash("Invalid image extension type used!")
         else:
@@ -144,7 +234,17 @@ def edit_images(slug: str) -> FlaskResponse:
                 "static", filename=f"images/blog_uploaded/{blog_image}"
             )
             image_name = form.image_name.data or "image name"
-            image = Image(name=image_name, location=image_location)
+            variants = [
+                ImageVariant(
+                    location=url_for(
+                        "static", filename=f"images/blog_uploaded/{variant.filename}"
+                    ),
+                    width=variant.width,
+                    mimetype=variant.mimetype,
+                )
+                for variant in get_blog_image_variants(blog_image)
+            ]
+            image = Image(name=image_name, location=image_location, variants=variants)
             post.images.append(image)
             post.save()
             return redirect(url_for("blog.edit_images", slug=slug))
@@ -153,10 +253,18 @@ def edit_images(slug: str) -> FlaskResponse:
             if image.location == form.delete_image.data:
                 post.images.pop(i)
                 post.save()
-        delete_blog_image(form.delete_image.data)
+                # Drops this post's reference to the stored image
+                delete_blog_image(form.delete_image.data)
+                break
         return redirect(url_for("blog.edit_images", slug=slug))
 
-    return render_template("blog/edit_images.html", form=form, post=post)
+    pending_images = get_pending_images(image.location for image in post.images)
+    return render_template(
+        "blog/edit_images.html",
+        form=form,
+        post=post,
+        pending_images=pending_images,
+    )
 
 
 @blog.route("/delete/<slug>", methods=["GET"])
@@ -164,44 +272,71 @@ def edit_images(slug: str) -> FlaskResponse:
 def delete(slug: str) -> FlaskResponse:
     """Delete a blogpost"""
     post = get_post_for_update_delete(slug)
+    update_tag_stats(post.tags, post.published, [], False)
+    Comment.objects(post_id=post.id).delete()
     post.delete()
+    for image in post.images:
+        delete_blog_image(image.location)
+    search_index.remove_post(post.id)
+    suggester.invalidate()
+    page_cache.invalidate()
     flash(f"Deleted post '{slug}'!")
     return redirect(url_for("blog.blog_list"))
 
 
+@blog.route("/comment/<slug>/page", methods=["GET"])
+def comment_page(slug: str) -> FlaskResponse:
+    """Get a page of a post's comments, after the `after` cursor"""
+    form = CommentForm()
+    post = get_post_for_view(slug, fields=COMMENT_POST_FIELDS)
+    after = request.args.get("after")
+    # Without a valid cursor the first page would be appended a second time
+    if decode_cursor(after) is None:
+        abort(400, "Invalid comment page cursor!")
+    return render_comments(post, form, after=after)
+
+
+@blog.route("/comment/<slug>/replies/<comment_id>", methods=["GET"])
+def comment_replies(slug: str, comment_id: str) -> FlaskResponse:
+    """Get all replies to a comment"""
+    post = get_post_for_view(slug, fields=COMMENT_POST_FIELDS)
+    comment = get_comment_query(post, comment_id).first()
+    if not comment:
+        abort(404, "Comment not found!")
+    return render_template(
+        "blog/comments/replies.html",
+        post=post,
+        comment=comment,
+        replies=comment.replies,
+        comment_authors=get_comment_authors([comment]),
+    )
+
+
 @blog.route("/comment/<slug>", methods=["POST"])
 @login_required
 def create_comment(slug: str) -> FlaskResponse:
     """Comment on a blogpost"""
     form = CommentForm()
-    post = get_post_for_view(slug)
+    post = get_post_for_view(slug, fields=COMMENT_POST_FIELDS)
     failed_comment_id = None
     comment_error = None
     if post.can_comment:
         if form.validate_on_submit() and form.comment.data:
             comment = Comment(
+                post_id=post.id,
                 author=current_user.id,
                 content=str(form.comment.data).strip(),
                 created_timestamp=datetime.now(),
                 updated_timestamp=datetime.now(),
             )
-            post.comments.append(comment)
-            post.comments = sort_comments(post.comments)
-            post.save()
+            comment.save()
+            comments_changed(post, count_change=1)
         if not form.validate_on_submit() and form.comment.errors:
             failed_comment_id = "primary"
             comment_error = form.comment.errors[0]
     else:
         flash("Commenting is locked for this post.", category="error")
-    comment_authors = get_comment_authors(post)
-    return render_template(
-        "blog/comments/comments.html",
-        post=post,
-        comment_authors=comment_authors,
-        form=form,
-        failed_comment_id=failed_comment_id,
-        comment_error=comment_error,
-    )
+    return render_comments(post, form, failed_comment_id, comment_error)
 
 
 @blog.route("/comment/<slug>/edit/<comment_id>", methods=["POST"])
@@ -209,35 +344,27 @@ def create_comment(slug: str) -> FlaskResponse:
 def edit_comment(slug: str, comment_id: str) -> FlaskResponse:
     """Edit comment"""
     form = CommentForm()
-    post = get_post_for_view(slug)
+    post = get_post_for_view(slug, fields=COMMENT_POST_FIELDS)
     failed_comment_id = None
     comment_error = None
     if post.can_comment:
         if form.validate_on_submit() and form.comment.data:
-            for comment in post.comments:
-                if str(comment.id) == comment_id:
-                    if comment.author != current_user.id:
-                        failed_comment_id = comment_id
-                        comment_error = "Can only edit your own comment!"
-                        break
-                    comment.content = str(form.comment.data).strip()
-                    comment.updated_timestamp = datetime.now()
-                    post.save()
-                    break
+            comments = get_comment_query(post, comment_id)
+            updated = comments.filter(author=current_user.id).update_one(
+                set__content=str(form.comment.data).strip(),
+                set__updated_timestamp=datetime.now(),
+            )
+            if updated:
+                comments_changed(post)
+            elif comments.first():
+                failed_comment_id = comment_id
+                comment_error = "Can only edit your own comment!"
         if not form.validate_on_submit() and form.comment.errors:
             failed_comment_id = comment_id
             comment_error = form.comment.errors[0]
     else:
         flash("Commenting is locked for this post.", category="error")
-    comment_authors = get_comment_authors(post)
-    return render_template(
-        "blog/comments/comments.html",
-        post=post,
-        comment_authors=comment_authors,
-        form=form,
-        failed_comment_id=failed_comment_id,
-        comment_error=comment_error,
-    )
+    return render_comments(post, form, failed_comment_id, comment_error)
 
 
 @blog.route("/comment/<slug>/delete/<comment_id>", methods=["POST"])
@@ -245,33 +372,19 @@ def edit_comment(slug: str, comment_id: str) -> FlaskResponse:
 def delete_comment(slug: str, comment_id: str) -> FlaskResponse:
     """Delete comment"""
     form = CommentForm()
-    post = get_post_for_view(slug)
-    index = None
+    post = get_post_for_view(slug, fields=COMMENT_POST_FIELDS)
     failed_comment_id = None
     comment_error = None
     if post.can_comment:
-        for i, comment in enumerate(post.comments):
-            if str(comment.id) == comment_id:
-                if comment.author == current_user.id:
-                    index = i
-                else:
-                    failed_comment_id = comment_id
-                    comment_error = "Can only delete your own comment!"
-                break
-        if index is not None:
-            post.comments.pop(index)
-            post.save()
+        comments = get_comment_query(post, comment_id)
+        if comments.filter(author=current_user.id).delete():
+            comments_changed(post, count_change=-1)
+        elif comments.first():
+            failed_comment_id = comment_id
+            comment_error = "Can only delete your own comment!"
     else:
         flash("Commenting is locked for this post.", category="error")
-    comment_authors = get_comment_authors(post)
-    return render_template(
-        "blog/comments/comments.html",
-        post=post,
-        comment_authors=comment_authors,
-        form=form,
-        failed_comment_id=failed_comment_id,
-        comment_error=comment_error,
-    )
+    return render_comments(post, form, failed_comment_id, comment_error)
 
 
 @blog.route("/comment/<slug>/reply/<comment_id>", methods=["POST"])
@@ -279,36 +392,25 @@ def delete_comment(slug: str, comment_id: str) -> FlaskResponse:
 def create_reply(slug: str, comment_id: str) -> FlaskResponse:
     """Reply to comment"""
     form = CommentForm()
-    post = get_post_for_view(slug)
+    post = get_post_for_view(slug, fields=COMMENT_POST_FIELDS)
     failed_comment_id = None
     comment_error = None
     if post.can_comment:
         if form.validate_on_submit() and form.comment.data:
-            for comment in post.comments:
-                if str(comment.id) == comment_id:
-                    reply = Reply(
-                        author=current_user.id,
-                        content=str(form.comment.data).strip(),
-                        created_timestamp=datetime.now(),
-                        updated_timestamp=datetime.now(),
-                    )
-                    comment.replies.append(reply)
-                    post.save()
-                    break
+            reply = Reply(
+                author=current_user.id,
+                content=str(form.comment.data).strip(),
+                created_timestamp=datetime.now(),
+                updated_timestamp=datetime.now(),
+            )
+            if get_comment_query(post, comment_id).update_one(push__replies=reply):
+                comments_changed(post)
         if not form.validate_on_submit() and form.comment.errors:
             failed_comment_id = comment_id
             comment_error = form.comment.errors[0]
     else:
         flash("Commenting is locked for this post.", category="error")
-    comment_authors = get_comment_authors(post)
-    return render_template(
-        "blog/comments/comments.html",
-        post=post,
-        comment_authors=comment_authors,
-        form=form,
-        failed_comment_id=failed_comment_id,
-        comment_error=comment_error,
-    )
+    return render_comments(post, form, failed_comment_id, comment_error)
 
 
 @blog.route("/comment/<slug>/reply/<comment_id>/edit/<reply_id>", methods=["POST"])
@@ -316,38 +418,38 @@ def create_reply(slug: str, comment_id: str) -> FlaskResponse:
 def edit_reply(slug: str, comment_id: str, reply_id: str) -> FlaskResponse:
     """Edit reply to comment"""
     form = CommentForm()
-    post = get_post_for_view(slug)
+    post = get_post_for_view(slug, fields=COMMENT_POST_FIELDS)
     failed_comment_id = None
     comment_error = None
     if post.can_comment:
         if form.validate_on_submit() and form.comment.data:
-            for comment in post.comments:
-                if str(comment.id) == comment_id:
-                    for reply in comment.replies:
-                        if str(reply.id) == reply_id:
-                            if reply.author == current_user.id:
-                                reply.content = str(form.comment.data).strip()
-                                reply.updated_timestamp = datetime.now()
-                                post.save()
-                            else:
-                                failed_comment_id = reply_id
-                                comment_error = "Can only edit your own reply!"
-                            break
-                    break
+            reply_oid = to_object_id(reply_id)
+            comments = get_comment_query(post, comment_id)
+            updated = comments.filter(
+                __raw__={
+                    "replies": {
+                        "$elemMatch": {"id": reply_oid, "author": current_user.id}
+                    }
+                }
+            ).update_one(
+                __raw__={
+                    "$set": {
+                        "replies.$.content": str(form.comment.data).strip(),
+                        "replies.$.updated_timestamp": datetime.now(),
+                    }
+                }
+            )
+            if updated:
+                comments_changed(post)
+            elif comments.filter(__raw__={"replies.id": reply_oid}).first():
+                failed_comment_id = reply_id
+                comment_error = "Can only edit your own reply!"
         if not form.validate_on_submit() and form.comment.errors:
             failed_comment_id = reply_id
             comment_error = form.comment.errors[0]
     else:
         flash("Commenting is locked for this post.", category="error")
-    comment_authors = get_comment_authors(post)
-    return render_template(
-        "blog/comments/comments.html",
-        post=post,
-        comment_authors=comment_authors,
-        form=form,
-        failed_comment_id=failed_comment_id,
-        comment_error=comment_error,
-    )
+    return render_comments(post, form, failed_comment_id, comment_error)
 
 
 @blog.route("/comment/<slug>/reply/<comment_id>/delete/<reply_id>", methods=["POST"])
@@ -355,38 +457,24 @@ def edit_reply(slug: str, comment_id: str, reply_id: str) -> FlaskResponse:
 def delete_reply(slug: str, comment_id: str, reply_id: str) -> FlaskResponse:
     """Delete reply to comment"""
     form = CommentForm()
-    post = get_post_for_view(slug)
-    comment_index = None
-    reply_index = None
+    post = get_post_for_view(slug, fields=COMMENT_POST_FIELDS)
     failed_comment_id = None
     comment_error = None
     if post.can_comment:
-        for i, comment in enumerate(post.comments):
-            if str(comment.id) == comment_id:
-                for j, reply in enumerate(comment.replies):
-                    if str(reply.id) == reply_id:
-                        if reply.author == current_user.id:
-                            comment_index = i
-                            reply_index = j
-                        else:
-                            failed_comment_id = reply_id
-                            comment_error = "Can only delete your own reply!"
-                        break
-                break
-        if reply_index is not None:
-            post.comments[comment_index].replies.pop(reply_index)
-            post.save()
+        reply_oid = to_object_id(reply_id)
+        reply_match = {"id": reply_oid, "author": current_user.id}
+        comments = get_comment_query(post, comment_id)
+        deleted = comments.filter(
+            __raw__={"replies": {"$elemMatch": reply_match}}
+        ).update_one(__raw__={"$pull": {"replies": reply_match}})
+        if deleted:
+            comments_changed(post)
+        elif comments.filter(__raw__={"replies.id": reply_oid}).first():
+            failed_comment_id = reply_id
+            comment_error = "Can only delete your own reply!"
     else:
         flash("Commenting is locked for this post.", category="error")
-    comment_authors = get_comment_authors(post)
-    return render_template(
-        "blog/comments/comments.html",
-        post=post,
-        comment_authors=comment_authors,
-        form=form,
-        failed_comment_id=failed_comment_id,
-        comment_error=comment_error,
-    )
+    return render_comments(post, form, failed_comment_id, comment_error)
 
 
 # ----------------------------------------------------------------------------
@@ -395,18 +483,22 @@ def delete_reply(slug: str, comment_id: str, reply_id: str) -> FlaskResponse:
 def query_and_paginate_blog(
     query: Optional[Dict[str, Any]] = None,
     search: Optional[str] = None,
-    page: int = 1,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
     results_per_page: int = 3,
-) -> Pagination:
+    count_limit: Optional[int] = None,
+) -> Optional[KeysetPagination]:
     """Query database on params and return paginator object
 
     Params:
         query: dictionary of mongoengine query parameters
-        search: string used to search against database
-        page: starting page of paginator object
+        search: text to search posts for, results are then ranked by match
+        after: cursor token to page forward (older posts) from
+        before: cursor token to page back (newer posts) from
         results_per_page: how many results per page of paginator object
+        count_limit: count matching posts up to this many (no count if None)
     Returns:
-        mongoengine paginator object
+        keyset paginator object
     """
     if not query:
         query = {}
@@ -414,8 +506,6 @@ def query_and_paginate_blog(
     if current_user.is_authenticated and current_user.access_level == 1:
         query.pop("published")
     posts = BlogPost.objects(**query)
-    if search:
-        posts = posts.search_text(search)
     limit_fields = [
         "title",
         "slug",
@@ -424,10 +514,28 @@ def query_and_paginate_blog(
         "html_description",
         "created_timestamp",
         "published",
-        "comments",
+        "comment_count",
     ]
-    posts = posts.only(*limit_fields).order_by("-created_timestamp")
-    return setup_pagination(page, results_per_page, posts)
+    posts = posts.only(*limit_fields)
+    if search:
+        ranked_ids = search_index.search(
+            search, published_only="published" in query, tag=query.get("tags")
+        )
+        return setup_ranked_pagination(
+            posts,
+            ranked_ids,
+            results_per_page,
+            after=after,
+            before=before,
+            count_limit=count_limit,
+        )
+    return setup_keyset_pagination(
+        posts,
+        results_per_page,
+        after=after,
+        before=before,
+        count_limit=count_limit,
+    )
 
 
 def create_or_edit(
@@ -440,6 +548,8 @@ def create_or_edit(
     if not edit:
         post = BlogPost()
     assert post is not None
+    old_tags = list(post.tags) if edit else []
+    old_published = bool(post.published) if edit else False
 
     post.title = form.title.data
     post.slug = get_slug(post.title)
@@ -451,10 +561,17 @@ def create_or_edit(
     post.html_content = markdown_to_html(post.markdown_content, table=True)
     post.markdown_description = form.description.data.strip()
     post.html_description = markdown_to_html(post.markdown_description)
+    post.render_hash = post_render_hash(
+        post.markdown_content, post.markdown_description
+    )
     if not edit:
         post.created_timestamp = datetime.now()
     post.updated_timestamp = datetime.now()
     post.save()
+    update_tag_stats(old_tags, old_published, post.tags, post.published)
+    search_index.add_post(post, current_user.username)
+    suggester.invalidate()
+    page_cache.invalidate()
 
     if next_page:
         try:
@@ -464,47 +581,79 @@ def create_or_edit(
     return redirect(url_for("blog.view", slug=post.slug))
 
 
-def markdown_to_html(markdown_content: str, table: bool = False) -> str:
-    """Generate HTML representation of the markdown-formatted blog entry
+def get_current_tags() -> OrderedDict:
+    """Return an ordered dictionary of current tags and their post counts
 
-    Also convert any media URLs into rich media objects such as video
-    players or images.
+    Sorted by count (descending), then by tag name.
     """
-    hilite = CodeHiliteExtension(linenums=False, css_class="highlight")
-    extras = ExtraExtension()
-    toc = TocExtension(toc_depth=3)
-    if table:
-        markdown_content = "[TOC]\n\n" + markdown_content
-    markdown_content = markdown(markdown_content, extensions=[hilite, extras, toc])
-    oembed_content = parse_html(
-        markdown_content,
-        oembed_providers,
-        urlize_all=True,
-        maxwidth=SITE_WIDTH,
+    count_field = "published_count"
+    if current_user.is_authenticated and current_user.access_level == 1:
+        count_field = "total_count"
+    stats = (
+        TagStats.objects(**{f"{count_field}__gt": 0})
+        .only("tag", count_field)
+        .order_by(f"-{count_field}", "tag")
     )
-    return Markup(oembed_content)
+    return OrderedDict((stat.tag, stat[count_field]) for stat in stats)
 
 
-def get_current_tags() -> OrderedDict:
-    """Return an ordered dictionary of current tags"""
-    query = {"published": True}
-    if current_user.is_authenticated and current_user.access_level == 1:
-        query.pop("published")
-    limit_fields = [
-        "tags",
+def update_tag_stats(
+    old_tags: Iterable[str],
+    old_published: bool,
+    new_tags: Iterable[str],
+    new_published: bool,
+) -> None:
+    """Apply the tag count changes of a post going from old to new state
+
+    A created post has no old tags and a deleted post has no new tags.
+    """
+    old_tag_set = set(old_tags)
+    new_tag_set = set(new_tags)
+    for tag in old_tag_set | new_tag_set:
+        total_change = int(tag in new_tag_set) - int(tag in old_tag_set)
+        published_change = int(tag in new_tag_set and new_published) - int(
+            tag in old_tag_set and old_published
+        )
+        if total_change or published_change:
+            TagStats.objects(tag=tag).update_one(
+                inc__total_count=total_change,
+                inc__published_count=published_change,
+                upsert=True,
+            )
+    TagStats.objects(total_count__lte=0).delete()
+
+
+def rebuild_tag_stats() -> int:
+    """Rebuild the tag stats collection from all posts, returning tag count"""
+    pipeline = [
+        {"$unwind": "$tags"},
+        {
+            "$group": {
+                "_id": {"tag": "$tags", "post": "$_id"},
+                "pub": {"$first": "$published"},
+            }
+        },
+        {
+            "$group": {
+                "_id": "$_id.tag",
+                "total_count": {"$sum": 1},
+                "published_count": {"$sum": {"$cond": ["$pub", 1, 0]}},
+            }
+        },
+    ]
+    stats = [
+        TagStats(
+            tag=doc["_id"],
+            total_count=doc["total_count"],
+            published_count=doc["published_count"],
+        )
+        for doc in BlogPost.objects.aggregate(pipeline)
+        if doc["_id"] is not None
     ]
-    posts = BlogPost.objects(**query).only(*limit_fields)
-    all_tags_set = set(posts.distinct("tags"))
-    all_tags_set.discard(None)
-    all_tags_list = list(all_tags_set)
-    all_tags_list.sort()
-    tag_counts = {tag: 0 for tag in all_tags_list}
-    for post in posts:
-        for tag in post.tags:
-            tag_counts[tag] += 1
-    # Sort by count after already sorted by tag
-    tag_counts = OrderedDict(sorted(tag_counts.items(), key=lambda x: -x[1]))
-    return tag_counts
+    TagStats.objects.delete()
+    if stats:
+        TagStats.objects.insert(stats)
+    return len(stats)
 
 
 def get_post_for_update_delete(slug: str) -> BaseQuerySet:
@@ -518,9 +667,15 @@ def get_post_for_update_delete(slug: str) -> BaseQuerySet:
     return post
 
 
-def get_post_for_view(slug: str) -> BaseQuerySet:
-    """Gets a post for viewing and commenting"""
-    post = BlogPost.objects(slug=slug).first()
+def get_post_for_view(slug: str, fields: Iterable[str] = ()) -> BaseQuerySet:
+    """Gets a post for viewing and commenting
+
+    Pass fields to load only those fields of the post.
+    """
+    posts = BlogPost.objects(slug=slug)
+    if fields:
+        posts = posts.only(*fields)
+    post = posts.first()
     if not post:
         abort(404, "Blog post not found!")
     if post.published is False and (
@@ -534,27 +689,127 @@ def get_post_for_view(slug: str) -> BaseQuerySet:
     return post
 
 
-def get_comment_authors(post: BaseQuerySet) -> Dict[ObjectId, User]:
-    """Gets authors of comments
+def conditional_get_allowed() -> bool:
+    """Whether the request may be answered with a 304 Not Modified
+
+    Only anonymous visitors without pending flash messages are. Pages for
+    logged in users embed a time limited CSRF token, so must be re-rendered.
+    """
+    return (
+        request.method == "GET"
+        and not current_user.is_authenticated
+        and "_flashes" not in session
+    )
+
+
+def get_post_validators(post: BlogPost) -> Tuple[str, datetime]:
+    """Gets the ETag and (UTC) Last-Modified time of a post's page"""
+    timestamps = [post.updated_timestamp, post.comments_updated_timestamp]
+    last_modified = max(timestamp for timestamp in timestamps if timestamp)
+    etag = hash_key(
+        post.id,
+        post.updated_timestamp,
+        post.comments_updated_timestamp,
+        post.comment_count,
+        post.render_hash,
+    )
+    return etag, last_modified.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def comments_changed(post: BlogPost, count_change: int = 0) -> None:
+    """Record a change to a post's comments and invalidate cached pages"""
+    BlogPost.objects(id=post.id).update_one(
+        inc__comment_count=count_change,
+        set__comments_updated_timestamp=datetime.now(),
+    )
+    page_cache.invalidate()
+
+
+def get_comment_page(
+    post: BlogPost, after: Optional[str] = None
+) -> Optional[KeysetPagination]:
+    """Gets a newest first page of a post's comments
+
+    Only the first REPLIES_SHOWN + 1 replies of each comment are loaded,
+    enough to know whether the rest need to be collapsed.
+    """
+    comments = (
+        Comment.objects(post_id=post.id)
+        .only(*COMMENT_FIELDS)
+        .fields(slice__replies=REPLIES_SHOWN + 1)
+    )
+    return setup_keyset_pagination(
+        comments, COMMENTS_PER_PAGE, after=after, restart_on_stale=False
+    )
+
+
+def get_comment_page_context(
+    post: BlogPost, after: Optional[str] = None
+) -> Dict[str, Any]:
+    """Gets the template variables to render a page of comments"""
+    paginator = get_comment_page(post, after=after)
+    comments = paginator.items if paginator else []
+    return {
+        "paginator": paginator,
+        "comments": comments,
+        "comment_authors": get_comment_authors(comments),
+        "replies_shown": REPLIES_SHOWN,
+    }
+
+
+def get_comment_query(post: BlogPost, comment_id: str) -> BaseQuerySet:
+    """Gets a query matching a single comment of a post
+
+    An invalid comment_id gives a query matching nothing.
+    """
+    comment_oid = to_object_id(comment_id)
+    comment_ids = [comment_oid] if comment_oid else []
+    return Comment.objects(post_id=post.id, id__in=comment_ids)
+
+
+def to_object_id(value: str) -> Optional[ObjectId]:
+    """Convert a string to an ObjectId, or None if it isn't a valid id"""
+    return ObjectId(value) if ObjectId.is_valid(value) else None
+
+
+def render_comments(
+    post: BlogPost,
+    form: CommentForm,
+    failed_comment_id: Optional[str] = None,
+    comment_error: Optional[str] = None,
+    after: Optional[str] = None,
+) -> FlaskResponse:
+    """Render the comments section of a post
+
+    With an `after` cursor only that page of comments is rendered, to be
+    appended below the comments already on the page.
+    """
+    return render_template(
+        "blog/comments/comments.html",
+        post=post,
+        form=form,
+        failed_comment_id=failed_comment_id,
+        comment_error=comment_error,
+        page_only=decode_cursor(after) is not None,
+        **get_comment_page_context(post, after=after),
+    )
+
+
+def get_comment_authors(comments: Iterable[Comment]) -> Dict[ObjectId, AuthorProfile]:
+    """Gets authors of comments and their replies
+
+    Author profiles are cached across requests, so only authors missing from
+    the cache are queried.
 
     returns
         a dictionary like so:
             {
-                user_id: user_object # with username, id, and avatar fields
+                user_id: author_profile # with id, username and avatar_location
             }
     """
-    if not post.comments:
-        return {}
-    comment_author_ids = []
-    for comment in post.comments:
-        comment_author_ids.append(comment.author)
-        if comment.replies:
-            for reply in comment.replies:
-                comment_author_ids.append(reply.author)
-    users = User.objects(id__in=comment_author_ids).only("username", "avatar_location")
-    return {user.id: user for user in users}
-
-
-def sort_comments(comments: Iterable[Comment]) -> List[Comment]:
-    """Sort comments (or replies) from newest to oldest"""
-    return sorted(comments, key=lambda comment: comment.created_timestamp, reverse=True)
+    comment_author_ids = set()
+    for comment in comments:
+        comment_author_ids.add(comment.author)
+        for reply in comment.replies:
+            comment_author_ids.add(reply.author)
+    return get_author_profiles(comment_author_ids)
@@ -1,12 +1,58 @@
-from flask import Blueprint, render_template
+import os
 
+from flask import Blueprint, Response, abort, render_template, request, url_for
+
+from src.globals import STATIC_PATH
+from src.image_handler import is_immutable_image
+from src.image_jobs import UNFINISHED, image_pipeline
+from src.page_cache import page_cache
 from src.routes.blog.views import query_and_paginate_blog
 
 core = Blueprint("core", __name__)
 
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
 
 @core.route("/")
+@page_cache.cached
 def index() -> str:
     """This is the home page view"""
     blog_paginator = query_and_paginate_blog()
     return render_template("core/index.html", blog_paginator=blog_paginator)
+
+
+@core.route("/image_status/<filename>")
+def image_status(filename: str) -> str:
+    """An uploaded image, polling for its resized version until it's ready"""
+    job = image_pipeline.table.get(filename)
+    if job is None:
+        abort(404, "Image not found.")
+    location = url_for(
+        "static", filename=os.path.relpath(job.target, STATIC_PATH).replace(os.sep, "/")
+    )
+    pending = job.status in UNFINISHED
+    if not pending and os.path.exists(job.target):
+        # Bust the browser's cached copy of the image as it was uploaded
+        location += f"?v={int(os.path.getmtime(job.target))}"
+    return render_template(
+        "core/image_status.html",
+        filename=filename,
+        location=location,
+        pending=pending,
+        img_class=request.args.get("img_class", ""),
+        img_id=request.args.get("img_id", ""),
+        img_height=request.args.get("img_height", ""),
+    )
+
+
+@core.after_app_request
+def cache_stored_images(response: Response) -> Response:
+    """Let browsers keep stored images, which never change, for a year"""
+    if (
+        request.endpoint == "static"
+        and response.status_code in (200, 304)
+        and is_immutable_image((request.view_args or {}).get("filename", ""))
+    ):
+        cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        response.headers["Cache-Control"] = cache_control
+    return response
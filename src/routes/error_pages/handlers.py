@@ -40,3 +40,10 @@ def error_401(error: HTTPException) -> Tuple[str, int]:
 def error_403(error: HTTPException) -> Tuple[str, int]:
     """Error for trying to access something which is forbidden."""
     return render_template("error_pages/all_errors.html", error=error), 403
+
+
+@error_pages.app_errorhandler(413)
+def error_413(error: HTTPException) -> Tuple[str, int]:
+    """Error for uploads larger than the app accepts."""
+    error.description = "That upload is too large, sorry!"
+    return render_template("error_pages/all_errors.html", error=error), 413
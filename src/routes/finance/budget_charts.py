@@ -1,86 +1,198 @@
 """budget_graphs:  produce bokeh graphs for budget"""
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
 from flask import url_for
 
-from .budget_helpers import TIME_PERIOD_CONVERTER
+from .budget_helpers import TIME_PERIOD_CONVERTER, BudgetChanges
 from .charts_common import combine_charts, produce_bar_chart, produce_pie_chart
 from .models import Budget
 
+OTHER_ITEMS = "Other items (<2% of total)"
+# Titles and container element ids of the charts, by BudgetChartData field
+CHART_TITLES = {
+    "categories": "Budget Spent by Category",
+    "items": "Budget Spent by Item",
+    "income": "Income by Item",
+    "income_vs_expenses": "Income vs Expenses",
+}
+CHART_IDS = {
+    "categories": "budget-chart-categories",
+    "items": "budget-chart-items",
+    "income": "budget-chart-income",
+    "income_vs_expenses": "budget-chart-income-vs-expenses",
+}
+ADVICE_ID = "budget-advice"
+# Items worth less than this share of their chart are grouped as OTHER_ITEMS
+OTHER_ITEMS_SHARE = 0.02
 
-def prepare_budget_categories_data(budget: Budget) -> dict[str, int]:
-    """Prepare the categories data for graphing"""
-    view_period = budget.period
-    category_data = {}
-    for category in budget.budget:
-        category_data[category] = 0
-        for item in budget.budget[category]:
-            positive = budget.budget[category][item]["pos"]
-            if positive:
-                continue
-            value = budget.budget[category][item]["value"]
-            if not value:
-                continue
-            period = budget.budget[category][item]["period"]
-            category_data[category] += value * period // view_period
-    data_copy = category_data.copy()
-    for cat, val in data_copy.items():
-        if val == 0:
-            category_data.pop(cat)
-    return category_data
 
+class BudgetColumns(NamedTuple):
+    """A budget's valued items as columns, one row per item
 
-def prepare_budget_items_data(budget: Budget, income: bool = False) -> dict[str, int]:
-    """Prepare items data for graphing"""
-    view_period = budget.period
-    item_data: dict[str, int] = {}
-    total = 0
-    for category in budget.budget:
-        for item in budget.budget[category]:
-            positive = budget.budget[category][item]["pos"]
-            if positive and not income:
-                continue
-            if not positive and income:
-                continue
-            value = budget.budget[category][item]["value"]
-            if not value:
+    `category` holds positions in `categories`, and values are already
+    normalised to the budget's view period.
+    """
+
+    categories: List[str]
+    category: np.ndarray
+    item: List[str]
+    value: np.ndarray
+    period: np.ndarray
+    pos: np.ndarray
+
+
+class BudgetChartData(NamedTuple):
+    """The data of every budget chart"""
+
+    categories: Dict[str, int]
+    items: Dict[str, int]
+    income: Dict[str, int]
+    income_vs_expenses: Dict[str, int]
+
+
+def flatten_budget(budget: Budget) -> BudgetColumns:
+    """Flatten a budget's nested dict into columns, in one walk
+
+    Items without a value are left out, as no chart shows them.
+    """
+    categories = list(budget.budget)
+    category, item, value, period, pos = [], [], [], [], []
+    for position, category_items in enumerate(budget.budget.values()):
+        for name, fields in category_items.items():
+            if not fields["value"]:
                 continue
-            period = budget.budget[category][item]["period"]
-            relative_value = value * period // view_period
-            if item_data.get(item):
-                item_data[f"{item} ({category})"] = relative_value
-            else:
-                item_data[item] = relative_value
-            total += relative_value
+            category.append(position)
+            item.append(name)
+            value.append(fields["value"])
+            period.append(fields["period"])
+            pos.append(fields["pos"])
+    value_column = np.array(value) if value else np.zeros(0, dtype=np.int64)
+    period_column = np.array(period, dtype=np.int64)
+    return BudgetColumns(
+        categories,
+        np.array(category, dtype=np.intp),
+        item,
+        value_column * period_column // budget.period,
+        period_column,
+        np.array(pos, dtype=bool),
+    )
+
+
+def aggregate_budget(budget: Budget) -> BudgetChartData:
+    """Compute the data of every budget chart in a single pass"""
+    columns = flatten_budget(budget)
+    value, pos = columns.value, columns.pos
+    expenses = value[~pos]
+    category_totals = np.zeros(len(columns.categories), dtype=value.dtype)
+    np.add.at(category_totals, columns.category[~pos], expenses)
+    categories = {
+        category: total
+        for category, total in zip(columns.categories, category_totals.tolist())
+        if total != 0
+    }
+    income_total, expenses_total = value[pos].sum(), expenses.sum()
+    return BudgetChartData(
+        categories=categories,
+        items=item_chart_data(columns, ~pos, expenses_total),
+        income=item_chart_data(columns, pos, income_total),
+        income_vs_expenses={
+            "Income": income_total.item(),
+            "Expenses": expenses_total.item(),
+        },
+    )
+
+
+def item_chart_data(
+    columns: BudgetColumns, rows: np.ndarray, total: Any
+) -> Dict[str, int]:
+    """Chart data of some items of a budget, grouping the smallest ones"""
     if total == 0:
         return {}
-    data_copy = item_data.copy()
-    other = "Other items (<2% of total)"
-    item_data[other] = 0
-    for item, val in data_copy.items():
-        rel_freq = val / total
-        if rel_freq < 0.02:
-            item_data[other] += val
-            item_data.pop(item)
-    if not item_data.get(other):
-        item_data.pop(other)
-    return item_data
-
-
-def prepare_income_vs_expenses_data(budget: Budget) -> dict[str, int]:
-    """Prepare data for income vs expenses"""
-    view_period = budget.period
-    ive_data = {"Income": 0, "Expenses": 0}
-    for category in budget.budget:
-        for item in budget.budget[category]:
-            positive = budget.budget[category][item]["pos"]
-            value = budget.budget[category][item]["value"]
-            if not value:
+    data: Dict[str, int] = {}
+    for position in np.flatnonzero(rows).tolist():
+        item, value = columns.item[position], columns.value[position].item()
+        if data.get(item):
+            category = columns.categories[columns.category[position]]
+            item = f"{item} ({category})"
+        data[item] = value
+    values = np.array(list(data.values()))
+    small = values / total < OTHER_ITEMS_SHARE
+    if not small.any():
+        return data
+    data = {
+        item: value
+        for (item, value), is_small in zip(data.items(), small)
+        if not is_small
+    }
+    other = values[small].sum().item()
+    if other:
+        data[OTHER_ITEMS] = other
+    return data
+
+
+def patch_chart_data(
+    budget: Budget, chart_data: BudgetChartData, changes: BudgetChanges
+) -> BudgetChartData:
+    """Adjust a budget's chart data for some changed items
+
+    Category and income vs expenses totals are adjusted by each changed
+    item's difference. The item charts depend on their totals, so they are
+    recomputed, but only for the side (income or expenses) that changed.
+
+    Params:
+        budget: the budget with the changes applied
+        chart_data: the chart data of the budget before the changes
+        changes: the changed items' fields before and after
+    """
+    categories = dict(chart_data.categories)
+    totals = dict(chart_data.income_vs_expenses)
+    changed_sides = set()
+    for (category, _), (old_fields, new_fields) in changes.items():
+        for fields, sign in ((old_fields, -1), (new_fields, 1)):
+            if not fields["value"]:
                 continue
-            period = budget.budget[category][item]["period"]
-            if positive:
-                ive_data["Income"] += value * period // view_period
+            amount = sign * (fields["value"] * fields["period"] // budget.period)
+            changed_sides.add(bool(fields["pos"]))
+            if fields["pos"]:
+                totals["Income"] += amount
             else:
-                ive_data["Expenses"] += value * period // view_period
-    return ive_data
+                totals["Expenses"] += amount
+                categories[category] = categories.get(category, 0) + amount
+    if not changed_sides:
+        return chart_data
+    items, income = chart_data.items, chart_data.income
+    columns = flatten_budget(budget)
+    if False in changed_sides:
+        items = item_chart_data(columns, ~columns.pos, totals["Expenses"])
+    if True in changed_sides:
+        income = item_chart_data(columns, columns.pos, totals["Income"])
+    return BudgetChartData(
+        categories={
+            category: categories[category]
+            for category in budget.budget
+            if categories.get(category)
+        },
+        items=items,
+        income=income,
+        income_vs_expenses=totals,
+    )
+
+
+def prepare_budget_categories_data(budget: Budget) -> Dict[str, int]:
+    """Prepare the categories data for graphing"""
+    return aggregate_budget(budget).categories
+
+
+def prepare_budget_items_data(budget: Budget, income: bool = False) -> Dict[str, int]:
+    """Prepare items data for graphing"""
+    chart_data = aggregate_budget(budget)
+    return chart_data.income if income else chart_data.items
+
+
+def prepare_income_vs_expenses_data(budget: Budget) -> Dict[str, int]:
+    """Prepare data for income vs expenses"""
+    return aggregate_budget(budget).income_vs_expenses
 
 
 def inject_advice(positive: bool):
@@ -112,36 +224,57 @@ investing and growing your net worth, check out the
 
 def prepare_all_budget_charts(budget: Budget) -> str:
     """Prepare all budget graphs"""
-    view_period = budget.period
-    categories_data = prepare_budget_categories_data(budget)
-    items_data = prepare_budget_items_data(budget)
-    income_data = prepare_budget_items_data(budget, income=True)
-    income_v_expense_data = prepare_income_vs_expenses_data(budget)
-    if all((categories_data, items_data, income_data, income_v_expense_data)):
-        categories_chart = produce_pie_chart(
-            categories_data,
-            f"Budget Spent by Category ({TIME_PERIOD_CONVERTER[view_period]})",
-            sort=True,
-        )
-        items_chart = produce_pie_chart(
-            items_data,
-            f"Budget Spent by Item ({TIME_PERIOD_CONVERTER[view_period]})",
-            sort=True,
-        )
-        income_chart = produce_pie_chart(
-            income_data,
-            f"Income by Item ({TIME_PERIOD_CONVERTER[view_period]})",
-            sort=True,
-        )
-        ive_chart = produce_bar_chart(
-            income_v_expense_data,
-            f"Income vs Expenses ({TIME_PERIOD_CONVERTER[view_period]})",
-            colors=["#003300", "#7f1a22"],
-        )
-        positive = income_v_expense_data["Income"] > income_v_expense_data["Expenses"]
-        combined_charts = combine_charts(
-            categories_chart, items_chart, income_chart, ive_chart
-        )
-        return combined_charts + inject_advice(positive)
-    else:
+    return render_budget_charts(budget, aggregate_budget(budget))
+
+
+def render_budget_charts(budget: Budget, chart_data: BudgetChartData) -> str:
+    """Render every budget graph from its data, with the advice below them"""
+    if not all(chart_data):
         return "<h2>Graphs unavailable</h2>"
+    combined_charts = combine_charts(
+        *(
+            render_budget_chart(name, data, budget.period)
+            for name, data in zip(BudgetChartData._fields, chart_data)
+        ),
+        ids=[CHART_IDS[name] for name in BudgetChartData._fields],
+    )
+    advice = inject_advice(budget_is_positive(chart_data))
+    return f'{combined_charts}<div id="{ADVICE_ID}">{advice}</div>'
+
+
+def render_changed_budget_charts(
+    budget: Budget, old: BudgetChartData, new: BudgetChartData
+) -> Dict[str, Any]:
+    """Render only the budget graphs whose data changed
+
+    Returns:
+        {"charts": {element id: new content}}, with the advice too if
+            income vs expenses changed; or {"graphs": all graphs html} if
+            graphs became available or unavailable
+    """
+    if not (all(old) and all(new)):
+        return {"graphs": render_budget_charts(budget, new)}
+    charts = {
+        CHART_IDS[name]: "".join(render_budget_chart(name, data, budget.period))
+        for name, old_data, data in zip(BudgetChartData._fields, old, new)
+        if old_data != data
+    }
+    if old.income_vs_expenses != new.income_vs_expenses:
+        charts[ADVICE_ID] = inject_advice(budget_is_positive(new))
+    return {"charts": charts}
+
+
+def render_budget_chart(
+    name: str, data: Dict[str, int], view_period: int
+) -> Tuple[str, str]:
+    """Render one budget graph, by its BudgetChartData field name"""
+    title = f"{CHART_TITLES[name]} ({TIME_PERIOD_CONVERTER[view_period]})"
+    if name == "income_vs_expenses":
+        return produce_bar_chart(data, title, colors=["#003300", "#7f1a22"])
+    return produce_pie_chart(data, title, sort=True)
+
+
+def budget_is_positive(chart_data: BudgetChartData) -> bool:
+    """Whether a budget's income is greater than its expenses"""
+    income_v_expense_data = chart_data.income_vs_expenses
+    return income_v_expense_data["Income"] > income_v_expense_data["Expenses"]
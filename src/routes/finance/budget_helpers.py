@@ -1,13 +1,14 @@
 """budget: module for handling budget.py logic"""
+import hashlib
 import json
 from copy import deepcopy
-from typing import List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from bson.objectid import ObjectId
-from flask import session
 from flask_login import current_user
 
-from .forms import BudgetForm
+from .drafts import get_draft, get_draft_entry
+from .forms import BudgetForm, BudgetPatchForm
 from .models import Budget
 
 TIME_PERIOD_CONVERTER = {
@@ -131,6 +132,71 @@ DEFAULT_BUDGET = {
 }
 
 
+class BudgetCell(NamedTuple):
+    """One changed field of a budget item"""
+
+    category: str
+    item: str
+    field: str
+    value: Any
+
+
+# Changed items' fields before and after a patch, by (category, item)
+BudgetChanges = Dict[Tuple[str, str], Tuple[Dict[str, Any], Dict[str, Any]]]
+
+
+# Fingerprints are sums of item digests, kept within 64 bits
+FINGERPRINT_MOD = 2**64
+
+
+def item_fingerprint(category: str, item: str, fields: Dict[str, Any]) -> int:
+    """A stable digest of one budget item and its fields
+
+    Numbers are digested as floats, so equal fields (such as a pos of 1 and
+    True) have equal digests.
+    """
+    canonical = repr(
+        (
+            category,
+            item,
+            [
+                (field, float(value) if isinstance(value, (int, float)) else value)
+                for field, value in sorted(fields.items())
+            ],
+        )
+    )
+    digest = hashlib.blake2b(canonical.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def budget_fingerprint(inner_budget: Dict[str, Dict[str, Any]]) -> int:
+    """A stable fingerprint of a budget's items, whatever their order
+
+    It is a sum of the items' digests, so changing some items only needs
+    their digests (see patch_fingerprint).
+    """
+    return (
+        sum(
+            item_fingerprint(category, item, fields)
+            for category, items in inner_budget.items()
+            for item, fields in items.items()
+        )
+        % FINGERPRINT_MOD
+    )
+
+
+def patch_fingerprint(fingerprint: int, changes: BudgetChanges) -> int:
+    """Adjust a budget's fingerprint for some changed items"""
+    for (category, item), (old_fields, new_fields) in changes.items():
+        fingerprint += item_fingerprint(category, item, new_fields)
+        fingerprint -= item_fingerprint(category, item, old_fields)
+    return fingerprint % FINGERPRINT_MOD
+
+
+DEFAULT_BUDGET_FINGERPRINT = budget_fingerprint(DEFAULT_BUDGET)
+DEFAULT_BUDGET_ITEMS = sum(len(items) for items in DEFAULT_BUDGET.values())
+
+
 def json_to_obj(budget_json: str) -> Budget:
     """Deserialize a budget json to a budget object"""
     budget_dict = json.loads(budget_json)
@@ -147,10 +213,10 @@ def get_default_budget() -> Budget:
 
 
 def get_current_or_default_budget() -> Budget:
-    """Retrieve current budget from session or default budget if none in session"""
-    budget_json = session.get("current_budget")
-    if budget_json:
-        return json_to_obj(budget_json)
+    """Retrieve the session's draft budget, or the default budget if it has none"""
+    budget = get_draft()
+    if budget is not None:
+        return budget
     return get_default_budget()
 
 
@@ -188,6 +254,64 @@ def set_budget_from_post() -> Budget:
     )
 
 
+def cells_from_post() -> List[BudgetCell]:
+    """Get the changed cells of a budget patch from form post"""
+    form = BudgetPatchForm()
+    if not form.validate_on_submit():
+        raise RuntimeError(dict(form.errors.items()))
+    try:
+        return [BudgetCell(*cell) for cell in json.loads(form.cells.data)]
+    except (TypeError, ValueError):
+        raise RuntimeError("Cells must be a list of [category, item, field, value].")
+
+
+def valid_cell(cell: BudgetCell) -> bool:
+    """Whether a cell changes an item field to a value it can hold"""
+    if not (isinstance(cell.category, str) and isinstance(cell.item, str)):
+        return False
+    if cell.field == "value":
+        return cell.value is None or (
+            isinstance(cell.value, (int, float)) and not isinstance(cell.value, bool)
+        )
+    if cell.field == "period":
+        return type(cell.value) is int and cell.value in TIME_PERIOD_CONVERTER
+    if cell.field == "pos":
+        return isinstance(cell.value, bool)
+    return False
+
+
+def apply_budget_cells(
+    budget: Budget, cells: List[BudgetCell]
+) -> Tuple[Budget, BudgetChanges]:
+    """Apply changed cells to a copy of a budget
+
+    Only the changed items are copied, the budget itself is left untouched.
+
+    Returns:
+        the patched budget, and the changed items' fields before and after
+    """
+    inner = {category: dict(items) for category, items in budget.budget.items()}
+    changes: BudgetChanges = {}
+    for cell in cells:
+        if not valid_cell(cell):
+            raise RuntimeError(f"Invalid cell {list(cell)!r}.")
+        if cell.item not in inner.get(cell.category, {}):
+            raise RuntimeError(f"No item {cell.item!r} in {cell.category!r}.")
+        old_fields = inner[cell.category][cell.item]
+        new_fields = {**old_fields, cell.field: cell.value}
+        inner[cell.category][cell.item] = new_fields
+        before = changes.get((cell.category, cell.item), (old_fields,))[0]
+        changes[(cell.category, cell.item)] = (before, new_fields)
+    patched = Budget(
+        id=budget.id,
+        author=budget.author,
+        name=budget.name,
+        period=budget.period,
+        budget=inner,
+    )
+    return patched, changes
+
+
 def copy_current_budget() -> Budget:
     """Copy the current budget"""
     budget = get_current_or_default_budget()
@@ -208,25 +332,40 @@ def get_user_budgets_limited() -> List[Budget]:
     return []
 
 
-def budget_is_default(budget_obj: Budget) -> bool:
-    """A test to see if the budget is equivalent to the default budget"""
-    default = json.loads(get_default_budget().to_json())
-    incoming = json.loads(budget_obj.to_json())
-    for budget_dict in (default, incoming):
-        budget_dict.pop("_id", None)
-        budget_dict.pop("author", None)
-    return bool(default == incoming)
+def budget_is_default(budget_obj: Budget, fingerprint: Optional[int] = None) -> bool:
+    """A test to see if the budget is equivalent to the default budget
+
+    Cheap differences (name, period, size) are checked first, then the
+    fingerprint of the budget's items, computed unless given. Nothing is
+    serialized.
+    """
+    inner_budget = budget_obj.budget
+    if (
+        budget_obj.name is not None
+        or budget_obj.period != Budget.period.default
+        or len(inner_budget) != len(DEFAULT_BUDGET)
+        or sum(len(items) for items in inner_budget.values()) != DEFAULT_BUDGET_ITEMS
+    ):
+        return False
+    if fingerprint is None:
+        fingerprint = budget_fingerprint(inner_budget)
+    return fingerprint == DEFAULT_BUDGET_FINGERPRINT and inner_budget == DEFAULT_BUDGET
 
 
 def save_budget() -> Budget:
     """Save current budget"""
     if not current_user.is_authenticated:
         return get_current_or_default_budget()
+    fingerprint = None
     try:
         budget_obj = set_budget_from_post()
     except RuntimeError:
-        budget_obj = get_current_or_default_budget()
-    if budget_is_default(budget_obj):
+        draft = get_draft_entry()
+        if draft is None:
+            return get_default_budget()
+        # Name and save a copy, the draft may be shared by this worker's cache
+        budget_obj, fingerprint = deepcopy(draft.budget), draft.fingerprint
+    if budget_is_default(budget_obj, fingerprint):
         return budget_obj
     if not budget_obj.name:
         budget_obj.name = "unnamed budget"
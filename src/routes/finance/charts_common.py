@@ -1,8 +1,19 @@
-"""graphs_common: functions commonly used in graph production"""
+"""graphs_common: functions commonly used in graph production
+
+Rendering a chart takes tens of milliseconds, and the same data (default
+budgets and loans, shared budgets) is charted again and again. So rendered
+charts are cached by a hash of the function and its arguments, in memory
+and, if CHART_CACHE_DIR is set, on disk shared between workers.
+"""
+import os
+import re
+import uuid
 from datetime import datetime
+from functools import wraps
 from math import pi
-from typing import Optional, Union
+from typing import Callable, Optional, Sequence, Union
 
+import bokeh
 import pandas as pd
 from bokeh.embed import components
 from bokeh.models import ColumnDataSource, HoverTool, NumeralTickFormatter
@@ -10,9 +21,84 @@ from bokeh.palettes import viridis
 from bokeh.plotting import figure
 from bokeh.transform import cumsum, dodge
 
+from src.cache import DiskCache, LRUCache, TieredCache, hash_key
+
 ChartHTML = tuple[str, str]
 
+# Bump to invalidate cached charts when the chart functions change
+CHART_CACHE_VERSION = 1
+CHART_CACHE_SIZE = 256
+CHART_CACHE_MAX_FILES = 10_000
+# Document and element ids of a rendered chart, unique to each use of it
+BOKEH_ID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+# Rendered charts by hash of chart function and arguments. The disk tier is
+# added on first use (once .env is loaded), see configure_chart_cache.
+chart_cache = TieredCache(LRUCache(maxsize=CHART_CACHE_SIZE))
+_cache_configured = False
+
+
+def configure_chart_cache() -> None:
+    """Add the shared disk tier of the chart cache if CHART_CACHE_DIR is set"""
+    global _cache_configured
+    if _cache_configured:
+        return
+    chart_cache_dir = os.getenv("CHART_CACHE_DIR")
+    if chart_cache_dir:
+        chart_cache.shared = DiskCache(
+            chart_cache_dir, max_entries=CHART_CACHE_MAX_FILES
+        )
+    _cache_configured = True
+
+
+def with_fresh_ids(chart: ChartHTML) -> ChartHTML:
+    """A rendered chart with new document and element ids
+
+    BokehJS embeds a chart by its element id, so a cached chart shown twice
+    on a page (or replacing itself) needs new ones each time.
+    """
+    script, div = chart
+    fresh_ids = {old_id: str(uuid.uuid4()) for old_id in BOKEH_ID.findall(div)}
+    fresh_ids.update(
+        (old_id, str(uuid.uuid4()))
+        for old_id in BOKEH_ID.findall(script)
+        if old_id not in fresh_ids
+    )
+
+    def replace(match: "re.Match[str]") -> str:
+        return fresh_ids[match[0]]
+
+    return BOKEH_ID.sub(replace, script), BOKEH_ID.sub(replace, div)
+
 
+def cached_chart(produce: Callable[..., ChartHTML]) -> Callable[..., ChartHTML]:
+    """Cache a chart function's output by a hash of its name and arguments
+
+    Arguments are hashed by their repr, which must not change between
+    processes (so no sets).
+    """
+
+    @wraps(produce)
+    def wrapper(*args, **kwargs) -> ChartHTML:
+        configure_chart_cache()
+        key = hash_key(
+            CHART_CACHE_VERSION,
+            bokeh.__version__,
+            produce.__name__,
+            repr(args),
+            repr(sorted(kwargs.items())),
+        )
+        chart = chart_cache.get(key)
+        if chart is None:
+            chart = produce(*args, **kwargs)
+            chart_cache.set(key, chart)
+            return chart
+        return with_fresh_ids(chart)
+
+    return wrapper
+
+
+@cached_chart
 def produce_pie_chart(
     data_dict: dict[str, int],
     title: str,
@@ -63,6 +149,7 @@ def produce_pie_chart(
     return components(plot)  # script, div
 
 
+@cached_chart
 def produce_bar_chart(
     data_dict: dict[str, int], title: str, colors: Optional[list[str]] = None
 ) -> ChartHTML:
@@ -98,6 +185,7 @@ def produce_bar_chart(
     return components(plot)  # script, div
 
 
+@cached_chart
 def produce_line_chart(
     x_val: list[Union[float, datetime]],
     y_vals: list[tuple[str, list[float]]],  # (legend_label, y_vals)
@@ -143,6 +231,7 @@ def produce_line_chart(
     return components(plot)  # script, div
 
 
+@cached_chart
 def produce_stacked_line_chart(
     x_val: list[Union[float]],
     y_vals: list[tuple[str, list[float]]],  # (legend_label, y_vals)
@@ -189,6 +278,7 @@ def produce_stacked_line_chart(
     return components(plot)  # script, div
 
 
+@cached_chart
 def produce_multi_bar_chart(
     data: dict[str, list[Union[str, int]]],
     x_label: str,
@@ -234,6 +324,7 @@ def produce_multi_bar_chart(
     return components(plot)  # script, div
 
 
+@cached_chart
 def produce_stacked_bar_chart(
     data: dict[str, list[Union[str, int]]],
     x_label: str,
@@ -297,13 +388,23 @@ def adjust_plot_settings(plot, legend=True):
         plot.legend.background_fill_alpha = 0.6
 
 
-def combine_charts(*charts: tuple[str, str]) -> str:
-    """Combine all chart data"""
+def combine_charts(
+    *charts: tuple[str, str], ids: Optional[Sequence[str]] = None
+) -> str:
+    """Combine all chart data
+
+    Params:
+        ids: element ids of the charts' containers, so they can be replaced
+    """
     html = '<div class="row">'
     for i, (script, div) in enumerate(charts, start=1):
         if i % 2 == 1 and i != 1:
             html += '<div class="row">'
-        html += f'<div class="col-lg-6"><div class="chart">{script}{div}</div></div>'
+        chart_id = f' id="{ids[i - 1]}"' if ids else ""
+        html += (
+            f'<div class="col-lg-6"><div class="chart"{chart_id}>{script}{div}</div>'
+            "</div>"
+        )
         if i % 2 == 0 or i == len(charts):
             html += "</div>"
     return html
@@ -0,0 +1,86 @@
+"""Server-side store of the budget each session is editing
+
+The session cookie only carries a short random token and a revision number.
+The budget itself is kept in mongo, so every worker and restart sees it,
+with a per-worker in-memory copy in front. Memory copies are keyed by
+revision too, so a worker never serves a draft another worker has since
+replaced. The budget's chart data and fingerprint are kept alongside, so
+patches only adjust them. Drafts untouched for DRAFT_BUDGET_TTL expire.
+"""
+import secrets
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from flask import session
+
+from src.cache import MISSING, LRUCache, MongoCache
+
+from .models import DRAFT_BUDGET_TTL, Budget, DraftBudgetEntry
+
+if TYPE_CHECKING:
+    from .budget_charts import BudgetChartData
+
+SESSION_KEY = "budget_draft"
+# Bytes of randomness in a draft token (its urlsafe text is a third longer)
+TOKEN_BYTES = 12
+DRAFT_CACHE_SIZE = 1_024
+
+# Drafts by "token:revision", and the latest draft by token
+memory_drafts = LRUCache(maxsize=DRAFT_CACHE_SIZE, ttl=DRAFT_BUDGET_TTL.total_seconds())
+shared_drafts = MongoCache(DraftBudgetEntry, ttl=DRAFT_BUDGET_TTL.total_seconds())
+
+
+class Draft(NamedTuple):
+    """A draft budget, with its chart data and fingerprint if already known
+
+    See budget_charts.patch_chart_data and budget_helpers.patch_fingerprint.
+    """
+
+    budget: Budget
+    chart_data: Optional["BudgetChartData"] = None
+    fingerprint: Optional[int] = None
+
+
+def get_draft_entry() -> Optional[Draft]:
+    """The draft the current session is editing, if any
+
+    The draft is shared with later requests of the session, so replace it
+    with stash_draft rather than changing it in place.
+    """
+    token, revision = session.get(SESSION_KEY, (None, 0))
+    if token is None:
+        return None
+    draft = memory_drafts.get(f"{token}:{revision}", MISSING)
+    if draft is MISSING:
+        draft = shared_drafts.get(token)
+        if draft is not None:
+            memory_drafts.set(f"{token}:{revision}", draft)
+    return draft
+
+
+def get_draft() -> Optional[Budget]:
+    """The budget the current session is editing, if any"""
+    draft = get_draft_entry()
+    return None if draft is None else draft.budget
+
+
+def stash_draft(
+    budget: Budget,
+    chart_data: Optional["BudgetChartData"] = None,
+    fingerprint: Optional[int] = None,
+) -> None:
+    """Keep a budget, and what is known about it, as the session's draft"""
+    draft = Draft(budget, chart_data, fingerprint)
+    token, revision = session.get(SESSION_KEY, (None, 0))
+    if token is None:
+        token = secrets.token_urlsafe(TOKEN_BYTES)
+    session[SESSION_KEY] = (token, revision + 1)
+    shared_drafts.set(token, draft)
+    memory_drafts.set(f"{token}:{revision + 1}", draft)
+
+
+def discard_draft() -> None:
+    """Forget the budget the current session was editing"""
+    token, revision = session.pop(SESSION_KEY, (None, 0))
+    if token is not None:
+        shared_drafts.delete(token)
+        memory_drafts.delete(f"{token}:{revision}")
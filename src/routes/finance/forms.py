@@ -36,6 +36,11 @@ class BudgetForm(FlaskForm):
     budget_json = HiddenField("Budget")
 
 
+class BudgetPatchForm(FlaskForm):
+    # JSON list of changed [category, item, field, value] cells
+    cells = HiddenField("Changed cells")
+
+
 MONTHS = {
     1: "January",
     2: "February",
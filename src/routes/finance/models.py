@@ -4,10 +4,15 @@ Initial blog inspired by:
 https://charlesleifer.com/blog/how-to-make-a-flask-blog-in-one-hour-or-less/
 """
 
+from datetime import timedelta
+
 from bson.objectid import ObjectId
 
 from src.globals import db
 
+# How long an untouched draft budget is kept
+DRAFT_BUDGET_TTL = timedelta(days=7)
+
 
 class Budget(db.Document):
     """Budget Model"""
@@ -25,3 +30,24 @@ class Budget(db.Document):
 
     def __str__(self) -> str:
         return f"Budget(id: {self.id}, author: {self.author}, name: {self.name})"
+
+
+class DraftBudgetEntry(db.Document):
+    """Budget being edited in a session (see src.routes.finance.drafts)"""
+
+    key = db.StringField(required=True, unique=True)
+    value = db.BinaryField(required=True)
+    created_timestamp = db.DateTimeField(required=True)
+
+    meta = {
+        "collection": "draft_budget",
+        "indexes": [
+            {
+                "fields": ["created_timestamp"],
+                "expireAfterSeconds": int(DRAFT_BUDGET_TTL.total_seconds()),
+            },
+        ],
+    }
+
+    def __str__(self) -> str:
+        return f"DraftBudgetEntry(key: {self.key})"
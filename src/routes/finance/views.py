@@ -1,10 +1,16 @@
-from typing import Union
+from typing import Tuple, Union
 
-from flask import Blueprint, redirect, render_template, request, session, url_for
+from flask import Blueprint, jsonify, redirect, render_template, request, url_for
 from flask_login import login_required
 from werkzeug.wrappers import Response
 
-from . import budget_charts, budget_helpers, interest_calculator, loan_calculator
+from . import (
+    budget_charts,
+    budget_helpers,
+    drafts,
+    interest_calculator,
+    loan_calculator,
+)
 from .forms import BudgetForm
 
 finance = Blueprint("finance", __name__)
@@ -34,17 +40,46 @@ def budget_page() -> str:
 
 @finance.route("/budget/update", methods=["POST"])
 def update_current_budget() -> str:
-    """Stash the currently opened budget in the session and return graphs"""
+    """Stash the currently opened budget as the session's draft and return graphs"""
     budget = budget_helpers.set_budget_from_post()
-    session["current_budget"] = budget.to_json()
-    return budget_charts.prepare_all_budget_charts(budget)
+    chart_data = budget_charts.aggregate_budget(budget)
+    fingerprint = budget_helpers.budget_fingerprint(budget.budget)
+    drafts.stash_draft(budget, chart_data, fingerprint)
+    return budget_charts.render_budget_charts(budget, chart_data)
+
+
+@finance.route("/budget/patch", methods=["POST"])
+def patch_current_budget() -> Union[Response, Tuple[Response, int]]:
+    """Apply changed cells to the stashed budget and return changed graphs
+
+    Answers 409 if there is no stashed budget to patch, so the page sends
+    the whole budget instead.
+    """
+    draft = drafts.get_draft_entry()
+    if draft is None:
+        return jsonify(error="No budget to patch."), 409
+    try:
+        cells = budget_helpers.cells_from_post()
+        budget, changes = budget_helpers.apply_budget_cells(draft.budget, cells)
+    except RuntimeError as err:
+        return jsonify(error=str(err)), 400
+    chart_data = draft.chart_data or budget_charts.aggregate_budget(draft.budget)
+    new_chart_data = budget_charts.patch_chart_data(budget, chart_data, changes)
+    fingerprint = draft.fingerprint
+    if fingerprint is None:
+        fingerprint = budget_helpers.budget_fingerprint(draft.budget.budget)
+    fingerprint = budget_helpers.patch_fingerprint(fingerprint, changes)
+    drafts.stash_draft(budget, new_chart_data, fingerprint)
+    return jsonify(
+        budget_charts.render_changed_budget_charts(budget, chart_data, new_chart_data)
+    )
 
 
 @finance.route("/budget/new", methods=["GET"])
 def new_budget() -> str:
     """Create a new budget, removing old one from stash"""
     budget_helpers.save_budget()
-    session.pop("current_budget", None)
+    drafts.discard_draft()
     form = BudgetForm()
     budget = budget_helpers.get_default_budget()
     return render_template(
@@ -64,7 +99,7 @@ def copy_budget() -> str:
     budget_helpers.save_budget()
     form = BudgetForm()
     budget = budget_helpers.copy_current_budget()
-    session["current_budget"] = budget.to_json()
+    drafts.stash_draft(budget)
     return render_template(
         "finance/budget_inner.html",
         budget=budget,
@@ -81,7 +116,7 @@ def save_current_budget() -> str:
     """Save the currently opened budget to mongoengine"""
     form = BudgetForm()
     budget = budget_helpers.save_budget()
-    session["current_budget"] = budget.to_json()
+    drafts.stash_draft(budget)
     return render_template(
         "finance/budget_inner.html",
         budget=budget,
@@ -98,7 +133,7 @@ def retrieve_budget(budget_id: str) -> str:
     form = BudgetForm()
     budget_helpers.save_budget()
     budget = budget_helpers.retrieve_budget(budget_id)
-    session["current_budget"] = budget.to_json()
+    drafts.stash_draft(budget)
     return render_template(
         "finance/budget_inner.html",
         budget=budget,
@@ -115,7 +150,7 @@ def delete_budget(budget_id: str) -> str:
     """Retrieve a budget, only available to budget owner"""
     form = BudgetForm()
     if budget_id == form.budget_id.data:
-        session.pop("current_budget", None)
+        drafts.discard_draft()
     else:
         budget_helpers.save_budget()
     budget_helpers.delete_budget(budget_id)
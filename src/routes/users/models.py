@@ -1,12 +1,78 @@
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from bson.objectid import ObjectId
 from flask_login import UserMixin
 from werkzeug.security import check_password_hash
 
+from src.cache import MISSING, LRUCache
 from src.globals import db, login_manager
 
+# The fields of current_user that request handling (navbar, blog, finance)
+# reads. Views needing the rest of the user call current_user.reload().
+SESSION_USER_FIELDS = ("id", "username", "access_level", "avatar_location")
+SESSION_USER_TTL = 60
+
+# Raw session fields of logged in users by id, so most requests don't query
+# the users collection. Per process, entries are dropped when a user is
+# saved or deleted here, and expire to pick up changes made elsewhere.
+session_user_cache = LRUCache(maxsize=1_024, ttl=SESSION_USER_TTL)
+
+AUTHOR_PROFILE_TTL = 300
+
+
+class AuthorProfile(NamedTuple):
+    """The public user fields shown with a user's comments"""
+
+    id: ObjectId
+    username: str
+    avatar_location: Optional[str]
+
+
+# Author profiles by user id (None if the user was deleted), dropped and
+# expired like session_user_cache
+author_profile_cache = LRUCache(maxsize=4_096, ttl=AUTHOR_PROFILE_TTL)
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.objects(pk=user_id).first()
+    """Load the session fields of the logged in user
+
+    The user is marked `_session_only` until its other fields are loaded
+    (see users.views.load_full_current_user).
+    """
+    son = session_user_cache.get(user_id)
+    if son is None:
+        users = User.objects(pk=user_id).only(*SESSION_USER_FIELDS).as_pymongo()
+        son = users.first()
+        if son is None:
+            return None
+        session_user_cache.set(user_id, son)
+    user = User._from_son(dict(son))
+    user._session_only = True
+    return user
+
+
+def get_author_profiles(user_ids: Iterable[ObjectId]) -> Dict[ObjectId, AuthorProfile]:
+    """Get the profiles of users by id, missing deleted users
+
+    Profiles not cached yet are fetched in one query.
+    """
+    profiles = {}
+    missing = set()
+    for user_id in set(user_ids):
+        profile = author_profile_cache.get(user_id, MISSING)
+        if profile is MISSING:
+            missing.add(user_id)
+        elif profile is not None:
+            profiles[user_id] = profile
+    if not missing:
+        return profiles
+    for user in User.objects(id__in=missing).only("username", "avatar_location"):
+        profiles[user.id] = AuthorProfile(user.id, user.username, user.avatar_location)
+        author_profile_cache.set(user.id, profiles[user.id])
+    for user_id in missing - profiles.keys():
+        author_profile_cache.set(user_id, None)
+    return profiles
 
 
 class User(db.Document, UserMixin):
@@ -39,29 +105,27 @@ class User(db.Document, UserMixin):
 
     meta = {
         "collection": "users",
-        "indexes": [
-            "username",
-            "email",
-            "password_hash",
-            "share_email",
-            "full_name",
-            "share_name",
-            "avatar_location",
-            "bio",
-            "birth_date",
-            "share_birth_date",
-            "timezone",
-            "share_timezone",
-            "access_level",
-            "github_id",
-            "facebook_id",
-            "google_id",
-        ],
+        # Users are only looked up by id, username, email and oauth ids,
+        # which all get unique indexes from their fields
+        "indexes": [],
     }
 
     def __str__(self):
         return f"User(username: {self.username}, id: {self.id})"
 
+    def save(self, *args, **kwargs):
+        """Save the user, dropping its cached session fields and profile"""
+        result = super().save(*args, **kwargs)
+        session_user_cache.delete(str(self.id))
+        author_profile_cache.delete(self.id)
+        return result
+
+    def delete(self, *args, **kwargs):
+        """Delete the user, dropping its cached session fields and profile"""
+        super().delete(*args, **kwargs)
+        session_user_cache.delete(str(self.id))
+        author_profile_cache.delete(self.id)
+
     def check_password(self, password: str) -> bool:
         """Checks that the pw provided hashes to the stored pw hash value"""
         return check_password_hash(self.password_hash, password)
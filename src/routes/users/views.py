@@ -18,7 +18,12 @@ from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
 
 from src.globals import STATIC_PATH, FlaskResponse
-from src.image_handler import delete_current_avatar, upload_avatar
+from src.image_handler import (
+    UploadError,
+    delete_current_avatar,
+    get_pending_images,
+    upload_avatar,
+)
 from src.routes.users.forms import (
     LoginForm,
     RegistrationForm,
@@ -94,14 +99,21 @@ def profile(username) -> FlaskResponse:
     if not user:
         abort(404, "User not found.")
     is_current_user = True if user.id == current_user.id else False
+    pending_images = get_pending_images(
+        [user.avatar_location] if is_current_user and user.avatar_location else []
+    )
     return render_template(
-        "users/profile.html", user=user, is_current_user=is_current_user
+        "users/profile.html",
+        user=user,
+        is_current_user=is_current_user,
+        pending_images=pending_images,
     )
 
 
 @users.route("/edit_profile", methods=["GET", "POST"])
 @login_required
 def edit_profile() -> FlaskResponse:
+    load_full_current_user()
     form = UserProfileForm()
     if form.validate_on_submit():
         current_user.username = form.username.data
@@ -112,7 +124,11 @@ def edit_profile() -> FlaskResponse:
         else:
             current_user.birth_date = None
         if form.upload_avatar.data:
-            avatar_image = upload_avatar(form.upload_avatar.data)
+            try:
+                avatar_image = upload_avatar(form.upload_avatar.data)
+            except UploadError as e:
+                flash(str(e), category="error")
+                return redirect(url_for("users.edit_profile"))
             if avatar_image is None:
                 flash("Invalid image extension type used!", category="error")
                 return redirect(url_for("users.edit_profile"))
@@ -138,15 +154,21 @@ def edit_profile() -> FlaskResponse:
         form.birth_date.data = current_user.birth_date
         form.share_birth_date.data = current_user.share_birth_date
         form.share_name.data = current_user.share_name
+    pending_images = get_pending_images(
+        [current_user.avatar_location] if current_user.avatar_location else []
+    )
     return render_template(
-        "users/edit_profile.html", form=form, default_pics=DEFAULT_PICS
+        "users/edit_profile.html",
+        form=form,
+        default_pics=DEFAULT_PICS,
+        pending_images=pending_images,
     )
 
 
 @users.route("/account_settings", methods=["GET", "POST"])
 @login_required
 def account_settings() -> FlaskResponse:
-
+    load_full_current_user()
     form = UserSettingsForm()
     if form.validate_on_submit():
         if form.email.data:
@@ -177,6 +199,7 @@ def account_settings() -> FlaskResponse:
 @login_required
 def delete_account() -> FlaskResponse:
     """Delete current user's account"""
+    load_full_current_user()
     current_user.delete()
     logout_user()
     session_clear_special()
@@ -218,6 +241,17 @@ def github_oauth_disconnect() -> FlaskResponse:
 # ----------------------------------------------------------------------------
 # HELPER METHODS
 # ----------------------------------------------------------------------------
+def load_full_current_user() -> None:
+    """Load the fields of current_user that the session user leaves out
+
+    Logged in users are loaded with only SESSION_USER_FIELDS (see
+    users.models.load_user), call this before reading or editing the rest.
+    """
+    if current_user.is_authenticated and getattr(current_user, "_session_only", False):
+        current_user.reload()
+        current_user._session_only = False
+
+
 def can_oauth_disconnect() -> bool:
     """Test to determin if oauth disconnect is allowed"""
     has_gh = True if current_user.github_id else False
@@ -233,6 +267,7 @@ def can_oauth_disconnect() -> bool:
 @login_required
 def oauth_disconnect(oauth_client: str) -> FlaskResponse:
     """Generalized oauth disconnect"""
+    load_full_current_user()
     if not can_oauth_disconnect():
         flash(
             "You must set an email and password before disconnecting oauth.",
@@ -286,6 +321,7 @@ def oauth_generalized(oauth_client: str) -> FlaskResponse:
             )
         # Add this oauth method to current user
         else:
+            load_full_current_user()
             current_user[db_oauth_key] = client_oauth_id
             current_user.save()
             flash(f"Connected to {oauth_client}!", category="success")
@@ -3,9 +3,27 @@ $(".blog-view table").addClass("table")
 $(".blog-view table").addClass("table-dark")
 $(".blog-view table").addClass("table-striped")
 $(".blog-view table").addClass("table-hover")
+// Search box suggestions: label -> url of the suggested post or tag
+var blogSuggestions = {}
 $("#search-submit").on("click", function () {
   var search = $("#blog-search").val()
-  window.location = "/blog?search=" + search
+  if (blogSuggestions.hasOwnProperty(search)) {
+    window.location = blogSuggestions[search]
+  } else {
+    window.location = "/blog?search=" + encodeURIComponent(search)
+  }
+})
+$("#blog-search").on("input", function () {
+  $.getJSON($(this).data("suggest-url"), { q: $(this).val() }, function (data) {
+    var datalist = $("#blog-suggestions").empty()
+    blogSuggestions = {}
+    $.each(data.suggestions, function (i, suggestion) {
+      var label =
+        suggestion.type === "tag" ? "tag: " + suggestion.label : suggestion.label
+      blogSuggestions[label] = suggestion.url
+      datalist.append($("<option>").attr("value", label))
+    })
+  })
 })
 $("#blog-search").keydown(function (event) {
   // Number 13 is the "Enter" key on the keyboard
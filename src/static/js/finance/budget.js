@@ -14,6 +14,8 @@ const domStrings = {
   budgetName: "#budget_name",
   viewTimePeriod: "#budget_view_period",
   budgetJson: "#budget_json",
+  csrfToken: "#csrf_token",
+  graphs: "#graphs-Collapse",
   summaryTotal: ".summary-total",
   red: "in-the-red",
   green: "in-the-green",
@@ -48,6 +50,8 @@ let budgetUpdatedTime = new Date()
 let budgetStashTime = new Date()
 budgetStashTime.setSeconds(budgetStashTime.getSeconds() + 1)
 let budgetSummary
+// The budget as the server last saw it, to send only what changed since
+let stashedBudget
 
 // -------------------------------------------------------------------------
 // Classes
@@ -373,7 +377,7 @@ function setBudgetJson() {
     category.itemsArr.forEach((item) => {
       let period = parseInt(item.inputTimePeriod.val(), 10)
       let val = parseInt(item.input.val(), 10)
-      if (val === NaN) {
+      if (Number.isNaN(val)) {
         val = null
       }
       let isPos = false
@@ -388,32 +392,93 @@ function setBudgetJson() {
     })
   })
   $(domStrings.budgetJson).val(JSON.stringify(budgetObj))
+  return budgetObj
+}
+
+function snapshotBudget() {
+  return {
+    name: $(domStrings.budgetName).val(),
+    period: $(domStrings.viewTimePeriod).val(),
+    budget: setBudgetJson(),
+  }
+}
+
+function changedCells(before, after) {
+  // [category, item, field, value] cells changed between two budget
+  // snapshots, or null if more than item fields changed
+  if (before.name !== after.name || before.period !== after.period) {
+    return null
+  }
+  const beforeItems = Object.entries(before.budget).map(([category, items]) => [
+    category,
+    Object.keys(items),
+  ])
+  const afterItems = Object.entries(after.budget).map(([category, items]) => [
+    category,
+    Object.keys(items),
+  ])
+  if (JSON.stringify(beforeItems) !== JSON.stringify(afterItems)) {
+    return null
+  }
+  let cells = []
+  afterItems.forEach(([category, items]) => {
+    items.forEach((item) => {
+      ;["value", "period", "pos"].forEach((field) => {
+        const value = after.budget[category][item][field]
+        if (before.budget[category][item][field] !== value) {
+          cells.push([category, item, field, value])
+        }
+      })
+    })
+  })
+  return cells
 }
 
 function updateBudget() {
-  console.log("In updateBudget")
-  console.log(budgetUpdatedTime)
-  console.log(budgetStashTime)
   if (budgetUpdatedTime < budgetStashTime) {
     return
   }
-  setBudgetJson()
   budgetStashTime = new Date()
-  let posting = $.post(
-    "/finance/budget/update",
-    $(domStrings.budgetForm).serialize(),
-    function (data) {
-      console.log(`Stashing budget at ${budgetStashTime}.`)
-    }
-  )
+  const snapshot = snapshotBudget()
+  const cells = stashedBudget ? changedCells(stashedBudget, snapshot) : null
+  if (cells === null) {
+    postBudget(snapshot)
+  } else if (cells.length) {
+    patchBudget(snapshot, cells)
+  }
+}
+
+function postBudget(snapshot) {
+  // Stash the whole budget and replace all graphs
+  $.post("/finance/budget/update", $(domStrings.budgetForm).serialize())
     .done(function (data) {
-      console.log("Stash success!")
-      let content = $(data)
-      $("#budgetSummary-Collapse").empty().append(content)
-      console.log("Loaded budget graphs!")
+      stashedBudget = snapshot
+      $(domStrings.graphs).empty().append($(data))
+    })
+    .fail(function () {
+      console.log("Error stashing budget...")
+    })
+}
+
+function patchBudget(snapshot, cells) {
+  // Send only the changed cells and replace only the changed graphs
+  $.post("/finance/budget/patch", {
+    csrf_token: $(domStrings.csrfToken).val(),
+    cells: JSON.stringify(cells),
+  })
+    .done(function (data) {
+      stashedBudget = snapshot
+      if (data.graphs !== undefined) {
+        $(domStrings.graphs).empty().append($(data.graphs))
+        return
+      }
+      Object.entries(data.charts).forEach(([id, html]) => {
+        $(`#${id}`).html(html)
+      })
     })
     .fail(function () {
-      console.log("Error Stashing budget...")
+      // No stashed budget to patch (or it differs), send all of it
+      postBudget(snapshot)
     })
 }
 
@@ -444,7 +509,7 @@ function addEvents(budgetSummary) {
 function setUpBudget() {
   budgetSummary = new BudgetSummary($(domStrings.budgetSummary))
   addEvents(budgetSummary)
-  setBudgetJson()
+  stashedBudget = snapshotBudget()
   // only updateBudget (stash and recreate graphs) if not a shared budget
   if (!$(domStrings.sharedBudget).length) {
     setInterval(updateBudget, 10000)
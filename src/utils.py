@@ -1,30 +1,210 @@
 """Utility functions available throughout app"""
+import base64
+import binascii
 import re
-from math import ceil
-from typing import List
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
 
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
 from flask_mongoengine import BaseQuerySet
-from flask_mongoengine.pagination import Pagination
-
-
-def setup_pagination(
-    page: int, results_per_page: int, mongo_query: BaseQuerySet
-) -> Pagination:
-    """Validate current page and create pagination object"""
-    page = int(page)
-    post_count = mongo_query.count()
-    page_ceiling = ceil(post_count / results_per_page)
-    if page > page_ceiling:
-        page = page_ceiling
-    elif page < 1:
-        page = 1
-    if post_count == 0:
-        paginator = None
+from mongoengine.queryset.visitor import Q
+
+Cursor = Tuple[datetime, ObjectId]
+
+
+class KeysetPagination:
+    """A single page of keyset (cursor) paginated results
+
+    Pages are keyed on (sort_field, id) rather than an offset, so fetching
+    any page is an indexed range scan of `per_page + 1` documents instead of
+    a count followed by a skip.
+    """
+
+    def __init__(
+        self,
+        items: List[Any],
+        per_page: int,
+        next_cursor: Optional[str] = None,
+        prev_cursor: Optional[str] = None,
+        total: Optional[int] = None,
+        total_capped: bool = False,
+    ):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_capped = total_capped
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+
+def encode_cursor(timestamp: datetime, object_id: ObjectId) -> str:
+    """Encode a (timestamp, id) position as an opaque url safe token"""
+    raw = f"{timestamp.isoformat()}|{object_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    """Decode a cursor token, returning None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        timestamp, object_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidId):
+        return None
+
+
+def setup_keyset_pagination(
+    mongo_query: BaseQuerySet,
+    results_per_page: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    count_limit: Optional[int] = None,
+    sort_field: str = "created_timestamp",
+    restart_on_stale: bool = True,
+) -> Optional[KeysetPagination]:
+    """Fetch one newest-first page of a query and create a pagination object
+
+    Params:
+        mongo_query: the filtered (but not yet ordered) query to paginate
+        results_per_page: maximum number of items on the page
+        after: cursor of the last item of the previous page (go forward)
+        before: cursor of the first item of the next page (go back)
+        count_limit: if set, also count results, stopping at this many
+        sort_field: datetime field to order on, with id as a tie breaker
+        restart_on_stale: return the first page if a cursor has no results
+    Returns:
+        pagination object, or None if the query has no results
+    """
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+    if after_key:
+        items = _fetch_keyset_page(
+            mongo_query, results_per_page + 1, sort_field, after_key, older=True
+        )
+        has_more_newer, has_more_older = True, len(items) > results_per_page
+        items = items[:results_per_page]
+    elif before_key:
+        items = _fetch_keyset_page(
+            mongo_query, results_per_page + 1, sort_field, before_key, older=False
+        )
+        has_more_newer, has_more_older = len(items) > results_per_page, True
+        items = items[:results_per_page][::-1]
     else:
-        paginator = mongo_query.paginate(page=page, per_page=results_per_page)
+        items = _fetch_keyset_page(mongo_query, results_per_page + 1, sort_field)
+        has_more_newer, has_more_older = False, len(items) > results_per_page
+        items = items[:results_per_page]
+
+    if not items:
+        if (after_key or before_key) and restart_on_stale:
+            # Stale or out of range cursor, fall back to the first page
+            return setup_keyset_pagination(
+                mongo_query,
+                results_per_page,
+                count_limit=count_limit,
+                sort_field=sort_field,
+            )
+        return None
+
+    paginator = KeysetPagination(items, results_per_page)
+    if has_more_older:
+        paginator.next_cursor = encode_cursor(items[-1][sort_field], items[-1].id)
+    if has_more_newer:
+        paginator.prev_cursor = encode_cursor(items[0][sort_field], items[0].id)
+    if count_limit:
+        paginator.total = mongo_query.limit(count_limit).count(with_limit_and_skip=True)
+        paginator.total_capped = paginator.total >= count_limit
+    return paginator
+
+
+def _fetch_keyset_page(
+    mongo_query: BaseQuerySet,
+    limit: int,
+    sort_field: str,
+    key: Optional[Cursor] = None,
+    older: bool = True,
+) -> List[Any]:
+    """Fetch up to `limit` documents strictly older (or newer) than key"""
+    direction = "-" if older else "+"
+    if key:
+        timestamp, object_id = key
+        op = "lt" if older else "gt"
+        mongo_query = mongo_query.filter(
+            Q(**{f"{sort_field}__{op}": timestamp})
+            | Q(**{sort_field: timestamp, f"id__{op}": object_id})
+        )
+    ordered = mongo_query.order_by(f"{direction}{sort_field}", f"{direction}id")
+    return list(ordered.limit(limit))
+
+
+def setup_ranked_pagination(
+    mongo_query: BaseQuerySet,
+    ranked_ids: List[ObjectId],
+    results_per_page: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    count_limit: Optional[int] = None,
+) -> Optional[KeysetPagination]:
+    """Fetch one page of documents in an already ranked order of ids
+
+    Used for search results, which are ordered by score rather than a
+    field. Cursors are positions in the ranking, and only the page's
+    documents are fetched from mongo.
+
+    Params:
+        mongo_query: the query to fetch the page's documents with
+        ranked_ids: ids of every result, best first
+        results_per_page: maximum number of items on the page
+        after: cursor of the last item of the previous page (go forward)
+        before: cursor of the first item of the next page (go back)
+        count_limit: if set, also set the total, stopping at this many
+    Returns:
+        pagination object, or None if there are no results
+    """
+    start = 0
+    if after:
+        start = _decode_position(after) + 1
+    elif before:
+        start = _decode_position(before) - results_per_page
+    if not 0 <= start < len(ranked_ids):
+        start = 0
+    page_ids = ranked_ids[start : start + results_per_page]
+    documents = {doc.id: doc for doc in mongo_query.filter(id__in=page_ids)}
+    items = [documents[doc_id] for doc_id in page_ids if doc_id in documents]
+    if not items:
+        return None
+
+    paginator = KeysetPagination(items, results_per_page)
+    end = start + len(page_ids)
+    if end < len(ranked_ids):
+        paginator.next_cursor = str(end - 1)
+    if start > 0:
+        paginator.prev_cursor = str(start)
+    if count_limit:
+        paginator.total = min(len(ranked_ids), count_limit)
+        paginator.total_capped = len(ranked_ids) >= count_limit
     return paginator
 
 
+def _decode_position(cursor: str) -> int:
+    """Position in a ranking from a cursor, or -1 if malformed"""
+    try:
+        return int(cursor)
+    except ValueError:
+        return -1
+
+
 def get_slug(title: str) -> str:
     """Generate slug from title
 
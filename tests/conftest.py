@@ -7,6 +7,7 @@ from werkzeug.datastructures import FileStorage
 
 from src.factory import create_app
 from src.globals import PROJECT_ROOT_PATH
+from src.routes.finance.drafts import memory_drafts
 from src.routes.users.models import User
 from tests.globals import DOCKER_CLIENT, MONGODB_CONTAINER_NAME, MONGODB_DATA_DIR
 from tests.mongodb_helpers import (
@@ -197,6 +198,24 @@ def delete_budgets():
     delete_all_docs("budget")
 
 
+@pytest.fixture
+def delete_stored_images():
+    """Delete all stored image reference counts in collection"""
+    delete_all_docs("stored_images")
+    yield
+    delete_all_docs("stored_images")
+
+
+@pytest.fixture
+def delete_draft_budgets():
+    """Delete all draft budgets, in mongo and in memory"""
+    delete_all_docs("draft_budget")
+    memory_drafts.clear()
+    yield
+    delete_all_docs("draft_budget")
+    memory_drafts.clear()
+
+
 @pytest.fixture(scope="module")
 def delete_blogposts_mod():
     """Delete all blog posts in collection per module
@@ -205,8 +224,12 @@ def delete_blogposts_mod():
     (which are slow to create) will remain intact.
     """
     delete_all_docs("blog")
+    delete_all_docs("comments")
+    delete_all_docs("tag_stats")
     yield
     delete_all_docs("blog")
+    delete_all_docs("comments")
+    delete_all_docs("tag_stats")
 
 
 @pytest.fixture
@@ -217,8 +240,12 @@ def delete_blogposts():
     (which are slow to create) will remain intact.
     """
     delete_all_docs("blog")
+    delete_all_docs("comments")
+    delete_all_docs("tag_stats")
     yield
     delete_all_docs("blog")
+    delete_all_docs("comments")
+    delete_all_docs("tag_stats")
 
 
 @pytest.fixture
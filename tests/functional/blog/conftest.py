@@ -4,7 +4,8 @@ import datetime
 import pytest
 from bson.objectid import ObjectId
 
-from src.routes.blog.models import BlogPost
+from src.routes.blog.models import BlogPost, Comment
+from src.routes.blog.views import rebuild_tag_stats
 from tests.conftest import STANDARD_USER
 
 DATE = datetime.datetime.now() - datetime.timedelta(7)
@@ -112,12 +113,10 @@ BP5_BP1_BUT_COMMENTS_LOCKED = {
 @pytest.fixture(scope="module")
 def load_3_bp_mod(client_module):
     """Loads 3 blogposts into database"""
-    bp1 = BlogPost(**BP1_PUBLISHED)
-    bp1.save()
-    bp2 = BlogPost(**BP2_PUBLISHED)
-    bp2.save()
-    bp3 = BlogPost(**BP3_UNPUBLISHED)
-    bp3.save()
+    bp1 = save_post(BP1_PUBLISHED)
+    bp2 = save_post(BP2_PUBLISHED)
+    bp3 = save_post(BP3_UNPUBLISHED)
+    rebuild_tag_stats()
 
     yield bp1, bp2, bp3
 
@@ -127,13 +126,13 @@ def load_3_bp_mod(client_module):
     bp2.delete()
     bp3 = BlogPost.objects(id=bp3.id)
     bp3.delete()
+    rebuild_tag_stats()
 
 
 @pytest.fixture
 def bp1():
     """Load blogpost 1"""
-    bp1 = BlogPost(**BP1_PUBLISHED)
-    bp1.save()
+    bp1 = save_post(BP1_PUBLISHED)
 
     yield bp1
 
@@ -144,8 +143,7 @@ def bp1():
 @pytest.fixture
 def bp2():
     """Load blogpost 2"""
-    bp2 = BlogPost(**BP2_PUBLISHED)
-    bp2.save()
+    bp2 = save_post(BP2_PUBLISHED)
 
     yield bp2
 
@@ -156,8 +154,7 @@ def bp2():
 @pytest.fixture
 def bp3():
     """Load blogpost 3"""
-    bp3 = BlogPost(**BP3_UNPUBLISHED)
-    bp3.save()
+    bp3 = save_post(BP3_UNPUBLISHED)
 
     yield bp3
 
@@ -168,8 +165,7 @@ def bp3():
 @pytest.fixture
 def bp4():
     """Load blogpost 4"""
-    bp4 = BlogPost(**BP4_PUBLISHED_COMMENTS_LOCKED)
-    bp4.save()
+    bp4 = save_post(BP4_PUBLISHED_COMMENTS_LOCKED)
 
     yield bp4
 
@@ -180,10 +176,28 @@ def bp4():
 @pytest.fixture
 def bp5():
     """Load blogpost 4"""
-    bp5 = BlogPost(**BP5_BP1_BUT_COMMENTS_LOCKED)
-    bp5.save()
+    bp5 = save_post(BP5_BP1_BUT_COMMENTS_LOCKED)
 
     yield bp5
 
     bp5 = BlogPost.objects(id=bp5.id)
     bp5.delete()
+
+
+# --------------------------------------------------------------------------
+# Helpers
+# --------------------------------------------------------------------------
+def save_post(post_dict):
+    """Save a blog post, storing any "comments" in the comments collection"""
+    post_dict = dict(post_dict)
+    comments = post_dict.pop("comments", [])
+    post = BlogPost(**post_dict, comment_count=len(comments))
+    post.save()
+    for comment_dict in comments:
+        Comment(post_id=post.id, **comment_dict).save()
+    return post
+
+
+def get_comments(post):
+    """Get a post's comments, newest first, fresh from the database"""
+    return list(Comment.objects(post_id=post.id).order_by("-created_timestamp"))
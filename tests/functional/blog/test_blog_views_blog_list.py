@@ -1,4 +1,5 @@
 """Test blog list view"""
+import pytest
 
 
 def test_blog_list_get_standard(client, delete_blogposts_mod, load_3_bp_mod):
@@ -12,7 +13,7 @@ def test_blog_list_get_standard(client, delete_blogposts_mod, load_3_bp_mod):
         if post.published is True:
             assert title_anchor in data
             assert post.created_timestamp.strftime("%B %d, %Y %I:%M %p") in data
-            assert f"{len(post.comments)} comments" in data
+            assert f"{post.comment_count} comments" in data
             for tag in post.tags:
                 assert f'<a href="/blog/?tag={tag}">{tag}</a>' in data
         else:
@@ -33,7 +34,7 @@ def test_blog_list_get_admin(
         title_anchor = f'<a href="/blog/view/{post.slug}">{post.title}</a>'
         assert title_anchor in data
         assert post.created_timestamp.strftime("%B %d, %Y %I:%M %p") in data
-        assert f"{len(post.comments)} comments" in data
+        assert f"{post.comment_count} comments" in data
         for tag in post.tags:
             assert f'<a href="/blog/?tag={tag}">{tag}</a>' in data
     assert data.count("[unpublished]") == len(unpublished_posts)
@@ -59,7 +60,7 @@ def test_blog_list_get_tags(client, delete_blogposts_mod, load_3_bp_mod):
                         post_inner.created_timestamp.strftime("%B %d, %Y %I:%M %p")
                         in data
                     )
-                    assert f"{len(post_inner.comments)} comments" in data
+                    assert f"{post_inner.comment_count} comments" in data
                     for tag_inner in post_inner.tags:
                         assert (
                             f'<a href="/blog/?tag={tag_inner}">{tag_inner}</a>' in data
@@ -76,3 +77,16 @@ def test_blog_list_get_search(client, delete_blogposts_mod, load_3_bp_mod):
     bp1, bp2, bp3 = load_3_bp_mod
     assert f'<a href="/blog/view/{bp2.slug}">{bp2.title}</a>' in data
     assert f'<a href="/blog/view/{bp1.slug}">{bp1.title}</a>' not in data
+
+
+@pytest.mark.parametrize("search", ["cra", "crazzy", "tag3 nothing"])
+def test_blog_list_get_search_partial(
+    client, delete_blogposts_mod, load_3_bp_mod, search
+):
+    """Test prefixes and typos of a post's words also find it"""
+    response = client.get(f"/blog/?search={search}")
+    assert response.status_code == 200
+    data = response.data.decode()
+    bp1, bp2, bp3 = load_3_bp_mod
+    assert f'<a href="/blog/view/{bp2.slug}">{bp2.title}</a>' in data
+    assert f'<a href="/blog/view/{bp1.slug}">{bp1.title}</a>' not in data
@@ -0,0 +1,125 @@
+"""Test blog comment page and comment replies views"""
+import datetime
+import re
+
+import pytest
+from bson.objectid import ObjectId
+
+from src.routes.blog.models import BlogPost, Comment, Reply
+from src.routes.blog.views import COMMENTS_PER_PAGE, REPLIES_SHOWN
+
+DATE = datetime.datetime(2020, 1, 1)
+
+
+def add_comments(post, count, reply_count=0):
+    """Add count comments (each with reply_count replies) to a post"""
+    for i in range(count):
+        replies = [
+            Reply(
+                author=ObjectId(),
+                content=f"Reply {j} to comment {i}",
+                created_timestamp=DATE,
+                updated_timestamp=DATE,
+            )
+            for j in range(reply_count)
+        ]
+        Comment(
+            post_id=post.id,
+            author=ObjectId(),
+            content=f"Paged comment {i}",
+            created_timestamp=DATE + datetime.timedelta(minutes=i),
+            updated_timestamp=DATE + datetime.timedelta(minutes=i),
+            replies=replies,
+        ).save()
+    BlogPost.objects(id=post.id).update_one(inc__comment_count=count)
+
+
+def get_next_page_url(data):
+    """Get the url of the 'load more comments' link of a comments page"""
+    match = re.search(r'ic-get-from="(/blog/comment/[^"]+/page\?after=[^"]+)"', data)
+    return match.group(1) if match else None
+
+
+def test_blog_view_comments_first_page_only(client, delete_blogposts, bp1):
+    """Test blog view renders only the first page of comments"""
+    add_comments(bp1, COMMENTS_PER_PAGE + 2)
+    response = client.get(f"/blog/view/{bp1.slug}")
+    assert response.status_code == 200
+    data = response.data.decode()
+    assert f"Comments ({COMMENTS_PER_PAGE + 3})" in data
+    # The fixture's own comment is the newest, so fills one slot of the page
+    assert "BP comment" in data
+    assert data.count("Paged comment") == COMMENTS_PER_PAGE - 1
+    assert f"Paged comment {COMMENTS_PER_PAGE + 1}" in data
+    assert "load more comments" in data
+
+
+def test_blog_comment_page_next_page(client, delete_blogposts, bp1):
+    """Test comment page returns the next page of comments only"""
+    add_comments(bp1, COMMENTS_PER_PAGE + 2)
+    first_page = client.get(f"/blog/view/{bp1.slug}").data.decode()
+    response = client.get(get_next_page_url(first_page))
+    assert response.status_code == 200
+    data = response.data.decode()
+    assert "<form" not in data
+    assert "BP comment" not in data
+    assert data.count("Paged comment") == 3
+    for i in range(3):
+        assert f"Paged comment {i}\n" in data
+    assert "load more comments" not in data
+
+
+def test_blog_comment_page_stale_cursor_empty(client, delete_blogposts, bp1):
+    """Test comment page past the last comment returns no comments"""
+    add_comments(bp1, COMMENTS_PER_PAGE + 2)
+    first_page = client.get(f"/blog/view/{bp1.slug}").data.decode()
+    next_page_url = get_next_page_url(first_page)
+    Comment.objects(post_id=bp1.id).delete()
+    response = client.get(next_page_url)
+    assert response.status_code == 200
+    assert not response.data.decode().strip()
+
+
+@pytest.mark.parametrize("query", ["", "?after=", "?after=garbage"])
+def test_blog_comment_page_invalid_cursor_fails(client, delete_blogposts, bp1, query):
+    """Test comment page fails with 400 without a valid cursor"""
+    add_comments(bp1, COMMENTS_PER_PAGE + 2)
+    response = client.get(f"/blog/comment/{bp1.slug}/page{query}")
+    assert response.status_code == 400
+    data = response.data.decode()
+    assert "Invalid comment page cursor!" in data
+    assert "Paged comment" not in data
+
+
+def test_blog_comment_page_non_existant_post_fails(client, delete_blogposts, bp1):
+    """Test comment page fails with 404 if slug not found"""
+    response = client.get("/blog/comment/some-nonexistant-post/page")
+    assert response.status_code == 404
+    assert "Blog post not found!" in response.data.decode()
+
+
+def test_blog_view_replies_collapsed(client, delete_blogposts, bp1):
+    """Test replies beyond REPLIES_SHOWN are collapsed"""
+    add_comments(bp1, 1, reply_count=REPLIES_SHOWN + 2)
+    response = client.get(f"/blog/view/{bp1.slug}")
+    data = response.data.decode()
+    assert data.count("to comment 0") == REPLIES_SHOWN
+    assert "show all replies" in data
+
+
+def test_blog_comment_replies_all(client, delete_blogposts, bp1):
+    """Test comment replies returns every reply of a comment"""
+    add_comments(bp1, 1, reply_count=REPLIES_SHOWN + 2)
+    comment = Comment.objects(post_id=bp1.id, content="Paged comment 0").first()
+    response = client.get(f"/blog/comment/{bp1.slug}/replies/{comment.id}")
+    assert response.status_code == 200
+    data = response.data.decode()
+    assert data.count("to comment 0") == REPLIES_SHOWN + 2
+    assert "show all replies" not in data
+
+
+def test_blog_comment_replies_non_existant_comment_fails(client, delete_blogposts, bp1):
+    """Test comment replies fails with 404 if comment not found"""
+    response = client.get(f"/blog/comment/{bp1.slug}/replies/randomid")
+    assert response.status_code == 404
+    assert "Comment not found!" in response.data.decode()
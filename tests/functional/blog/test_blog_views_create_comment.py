@@ -1,5 +1,6 @@
 """Test blog create reply view"""
 from src.routes.blog.models import BlogPost
+from tests.functional.blog.conftest import get_comments
 
 
 def test_blog_create_comment_not_logged_in_fails(client, delete_blogposts, bp2):
@@ -11,8 +12,7 @@ def test_blog_create_comment_not_logged_in_fails(client, delete_blogposts, bp2):
     assert response.status_code == 200
     data = response.data.decode()
     assert "Please log in to access this page." in data
-    bp2 = BlogPost.objects(id=bp2.id).first()
-    assert not bp2.comments
+    assert not get_comments(bp2)
 
 
 def test_blog_create_comment_non_existant_post_fails(
@@ -39,8 +39,7 @@ def test_blog_comment_too_long_fails(
     assert response.status_code == 200
     data = response.data.decode()
     assert "Field cannot be longer than 500 characters." in data
-    bp2 = BlogPost.objects(id=bp2.id).first()
-    assert not bp2.comments
+    assert not get_comments(bp2)
 
 
 def test_blog_create_comment_comments_locked_fails(
@@ -55,8 +54,7 @@ def test_blog_create_comment_comments_locked_fails(
     data = response.data.decode()
     assert "Commenting is locked for this post." in data
     assert "Commenting has been closed for this post." in data
-    bp4 = BlogPost.objects(id=bp4.id).first()
-    assert not bp4.comments
+    assert not get_comments(bp4)
 
 
 def test_blog_create_comment_happy(
@@ -70,5 +68,5 @@ def test_blog_create_comment_happy(
     assert response.status_code == 200
     data = response.data.decode()
     assert "Cool post!" in data
-    bp2 = BlogPost.objects(id=bp2.id).first()
-    assert bp2.comments
+    assert get_comments(bp2)
+    assert BlogPost.objects(id=bp2.id).first().comment_count == 1
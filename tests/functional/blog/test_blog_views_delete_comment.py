@@ -1,10 +1,11 @@
 """Test blog delete comment view"""
 from src.routes.blog.models import BlogPost
+from tests.functional.blog.conftest import get_comments
 
 
 def test_blog_delete_comment_not_logged_in_fails(client, delete_blogposts, bp1):
     """Test comment delete while not logged in fails with login redirect"""
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/{bp1.slug}/delete/{comment_id}",
         follow_redirects=True,
@@ -12,15 +13,14 @@ def test_blog_delete_comment_not_logged_in_fails(client, delete_blogposts, bp1):
     assert response.status_code == 200
     data = response.data.decode()
     assert "Please log in to access this page." in data
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments
+    assert get_comments(bp1)
 
 
 def test_blog_delete_comment_non_existant_post_fails(
     client, current_user_standard, delete_blogposts, bp1
 ):
     """Test comment delete fails with 404 if slug not found"""
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/some-nonexistant-post/delete/{comment_id}",
         follow_redirects=True,
@@ -28,8 +28,7 @@ def test_blog_delete_comment_non_existant_post_fails(
     assert response.status_code == 404
     data = response.data.decode()
     assert "Blog post not found!" in data
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments
+    assert get_comments(bp1)
 
 
 def test_blog_delete_comment_non_existant_no_change(
@@ -40,15 +39,14 @@ def test_blog_delete_comment_non_existant_no_change(
         f"/blog/comment/{bp1.slug}/delete/randomid", follow_redirects=True
     )
     assert response.status_code == 200
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments
+    assert get_comments(bp1)
 
 
 def test_blog_delete_comment_comments_locked_fails(
     client, current_user_standard, delete_blogposts, bp5
 ):
     """Test delete comment fails if comments locked"""
-    comment_id = bp5.comments[0].id
+    comment_id = get_comments(bp5)[0].id
     response = client.post(
         f"/blog/comment/{bp5.slug}/delete/{comment_id}",
         follow_redirects=True,
@@ -57,15 +55,14 @@ def test_blog_delete_comment_comments_locked_fails(
     data = response.data.decode()
     assert "Commenting is locked for this post." in data
     assert "Commenting has been closed for this post." in data
-    bp5 = BlogPost.objects(id=bp5.id).first()
-    assert bp5.comments
+    assert get_comments(bp5)
 
 
 def test_blog_comment_delete_wrong_user_fails(
     client, current_user_admin, delete_blogposts, bp1
 ):
     """Test delete comment as non-owner fails"""
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/{bp1.slug}/delete/{comment_id}",
         follow_redirects=True,
@@ -73,19 +70,18 @@ def test_blog_comment_delete_wrong_user_fails(
     assert response.status_code == 200
     data = response.data.decode()
     assert "Can only delete your own comment!" in data
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments
+    assert get_comments(bp1)
 
 
 def test_blog_delete_comment_happy(
     client, current_user_standard, delete_blogposts, bp1
 ):
     """Test comment delete succeeds"""
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/{bp1.slug}/delete/{comment_id}",
         follow_redirects=True,
     )
     assert response.status_code == 200
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert not bp1.comments
+    assert not get_comments(bp1)
+    assert BlogPost.objects(id=bp1.id).first().comment_count == 0
@@ -1,12 +1,12 @@
 """Test blog edit comment view"""
-from src.routes.blog.models import BlogPost
+from tests.functional.blog.conftest import get_comments
 
 
 def test_blog_edit_comment_not_logged_in_fails(client, delete_blogposts, bp1):
     """Test comment edit while not logged in fails with login redirect"""
     comment_edit = "Updated comment"
     form_data = {"comment": comment_edit}
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/{bp1.slug}/edit/{comment_id}",
         data=form_data,
@@ -16,8 +16,7 @@ def test_blog_edit_comment_not_logged_in_fails(client, delete_blogposts, bp1):
     data = response.data.decode()
     assert comment_edit not in data
     assert "Please log in to access this page." in data
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments[0].content != comment_edit
+    assert get_comments(bp1)[0].content != comment_edit
 
 
 def test_blog_edit_comment_non_existant_post_fails(
@@ -26,7 +25,7 @@ def test_blog_edit_comment_non_existant_post_fails(
     """Test comment edit fails with 404 if slug not found"""
     comment_edit = "Updated comment"
     form_data = {"comment": comment_edit}
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/some-nonexistant-post/edit/{comment_id}",
         data=form_data,
@@ -35,8 +34,7 @@ def test_blog_edit_comment_non_existant_post_fails(
     assert response.status_code == 404
     data = response.data.decode()
     assert "Blog post not found!" in data
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments[0].content != comment_edit
+    assert get_comments(bp1)[0].content != comment_edit
 
 
 def test_blog_edit_comment_non_existant_no_change(
@@ -49,8 +47,7 @@ def test_blog_edit_comment_non_existant_no_change(
         f"/blog/comment/{bp1.slug}/edit/randomid", data=form_data, follow_redirects=True
     )
     assert response.status_code == 200
-    bp1_after = BlogPost.objects(id=bp1.id).first()
-    assert bp1_after == bp1
+    assert get_comments(bp1)[0].content != comment_edit
 
 
 def test_blog_comment_edit_too_long_fails(
@@ -59,7 +56,7 @@ def test_blog_comment_edit_too_long_fails(
     """Test too long comment fails fails"""
     comment_edit = "A" * 501
     form_data = {"comment": comment_edit}
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/{bp1.slug}/edit/{comment_id}",
         data=form_data,
@@ -68,8 +65,7 @@ def test_blog_comment_edit_too_long_fails(
     assert response.status_code == 200
     data = response.data.decode()
     assert "Field cannot be longer than 500 characters." in data
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments[0].content != comment_edit
+    assert get_comments(bp1)[0].content != comment_edit
 
 
 def test_blog_edit_comment_comments_locked_fails(
@@ -78,7 +74,7 @@ def test_blog_edit_comment_comments_locked_fails(
     """Test comment fails if comments locked"""
     comment_edit = "Updated comment"
     form_data = {"comment": comment_edit}
-    comment_id = bp5.comments[0].id
+    comment_id = get_comments(bp5)[0].id
     response = client.post(
         f"/blog/comment/{bp5.slug}/edit/{comment_id}",
         data=form_data,
@@ -88,8 +84,7 @@ def test_blog_edit_comment_comments_locked_fails(
     data = response.data.decode()
     assert "Commenting is locked for this post." in data
     assert "Commenting has been closed for this post." in data
-    bp5 = BlogPost.objects(id=bp5.id).first()
-    assert bp5.comments[0].content != comment_edit
+    assert get_comments(bp5)[0].content != comment_edit
 
 
 def test_blog_comment_edit_wrong_user_fails(
@@ -98,7 +93,7 @@ def test_blog_comment_edit_wrong_user_fails(
     """Test edit comment as non-owner fails"""
     comment_edit = "Updated comment"
     form_data = {"comment": comment_edit}
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/{bp1.slug}/edit/{comment_id}",
         data=form_data,
@@ -107,20 +102,18 @@ def test_blog_comment_edit_wrong_user_fails(
     assert response.status_code == 200
     data = response.data.decode()
     assert "Can only edit your own comment!" in data
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments[0].content != comment_edit
+    assert get_comments(bp1)[0].content != comment_edit
 
 
 def test_blog_edit_comment_happy(client, current_user_standard, delete_blogposts, bp1):
     """Test comment edit succeeds"""
     comment_edit = "Updated comment"
     form_data = {"comment": comment_edit}
-    comment_id = bp1.comments[0].id
+    comment_id = get_comments(bp1)[0].id
     response = client.post(
         f"/blog/comment/{bp1.slug}/edit/{comment_id}",
         data=form_data,
         follow_redirects=True,
     )
     assert response.status_code == 200
-    bp1 = BlogPost.objects(id=bp1.id).first()
-    assert bp1.comments[0].content == comment_edit
+    assert get_comments(bp1)[0].content == comment_edit
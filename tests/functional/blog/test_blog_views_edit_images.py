@@ -3,7 +3,9 @@ import os
 
 import pytest
 from PIL import Image
+from werkzeug.datastructures import FileStorage
 
+from src.routes.blog.models import Image as BlogImage
 from tests.conftest import EXAMPLE_IMAGE_PATHS
 
 
@@ -54,6 +56,7 @@ def test_blog_edit_images_submit_upload_happy(
     client,
     current_user_admin,
     delete_blogposts,
+    delete_stored_images,
     bp1,
     example_image,
 ):
@@ -69,6 +72,13 @@ def test_blog_edit_images_submit_upload_happy(
     data = response.data.decode()
     assert "No Uploaded Images Found" not in data
     assert data.count("![example image](/static/images/blog_uploaded/") == 1
+    bp1.reload()
+    if example_image.filename.endswith(".gif"):
+        assert bp1.images[0].variants == []
+    else:
+        assert bp1.images[0].variants
+        for variant in bp1.images[0].variants:
+            assert variant.location.startswith("/static/images/blog_uploaded/")
 
 
 @pytest.mark.parametrize("get_path", EXAMPLE_IMAGE_PATHS)
@@ -78,6 +88,7 @@ def test_blog_edit_images_submit_delete_happy(
     client,
     current_user_admin,
     delete_blogposts,
+    delete_stored_images,
     bp1,
     get_path,
 ):
@@ -89,6 +100,8 @@ def test_blog_edit_images_submit_delete_happy(
     image = Image.open(get_path)
     image.save(put_path)
     assert os.path.isfile(put_path)
+    bp1.images.append(BlogImage(name="image_name", location=new_filename))
+    bp1.save()
     mocker.patch("src.image_handler.BLOG_UPLOAD_FOLDER", image_storage_path)
     form_data = {
         "delete_image": new_filename,
@@ -103,6 +116,36 @@ def test_blog_edit_images_submit_delete_happy(
     assert not os.path.isfile(put_path)
 
 
+def test_blog_edit_images_shared_upload(
+    tmpdir,
+    mocker,
+    client,
+    current_user_admin,
+    delete_blogposts,
+    delete_stored_images,
+    bp1,
+    bp2,
+):
+    """Test uploading an image twice stores it once, until both are deleted"""
+    image_storage_path = tmpdir.mkdir("image_storage_tmp")
+    mocker.patch("src.image_handler.BLOG_UPLOAD_FOLDER", image_storage_path)
+    locations = []
+    for post in (bp1, bp2):
+        with open(EXAMPLE_IMAGE_PATHS[0], "rb") as fp:
+            form_data = {"upload_image": FileStorage(fp), "image_name": "shared"}
+            client.post(f"/blog/edit_images/{post.slug}", data=form_data)
+        post.reload()
+        locations.append(post.images[0].location)
+    assert locations[0] == locations[1]
+    filename = os.path.basename(locations[0])
+    filepath = os.path.join(image_storage_path, filename)
+    assert os.listdir(os.path.join(image_storage_path, "originals")) == [filename]
+    for post, remaining in ((bp1, True), (bp2, False)):
+        form_data = {"delete_image": locations[0]}
+        client.post(f"/blog/edit_images/{post.slug}", data=form_data)
+        assert os.path.isfile(filepath) is remaining
+
+
 def test_blog_edit_images_submit_delete_bad_type(
     tmpdir,
     mocker,
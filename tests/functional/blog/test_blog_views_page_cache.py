@@ -0,0 +1,101 @@
+"""Test the whole page cache of the public blog views"""
+import time
+
+import pytest
+
+from src.page_cache import ANONYMOUS, PageCache, page_cache
+from src.routes.blog.models import BlogPost
+from tests.conftest import STANDARD_USER, mock_current_user
+
+
+@pytest.fixture
+def cache_pages(client):
+    """Enable the page cache, starting empty"""
+    client.application.config["PAGE_CACHE"] = True
+    page_cache.clear()
+
+    yield page_cache
+
+    page_cache.clear()
+
+
+def rename_post(post, title):
+    """Change a post's title behind the page cache's back"""
+    BlogPost.objects(id=post.id).update_one(set__title=title)
+
+
+@pytest.mark.parametrize("url", ["/", "/blog/", "/blog/?tag=tag1", "/blog/view/post-1"])
+def test_page_cache_serves_anonymous_pages(
+    client, delete_blogposts, bp1, cache_pages, url
+):
+    """Test anonymous pages are served from the cache until invalidated"""
+    assert bp1.title in client.get(url).data.decode()
+    rename_post(bp1, "Renamed post")
+    assert bp1.title in client.get(url).data.decode()
+    cache_pages.invalidate()
+    data = client.get(url).data.decode()
+    assert bp1.title not in data
+    assert "Renamed post" in data
+
+
+def test_page_cache_keyed_by_args(client, delete_blogposts, bp1, bp2, cache_pages):
+    """Test pages with different url arguments are cached separately"""
+    assert bp2.title in client.get("/blog/?tag=tag3").data.decode()
+    assert bp2.title not in client.get("/blog/?tag=tag1").data.decode()
+
+
+def test_page_cache_skips_logged_in_users(
+    client, mocker, delete_blogposts, bp1, cache_pages
+):
+    """Test logged in users never get anonymous cached pages"""
+    client.get(f"/blog/view/{bp1.slug}")
+    rename_post(bp1, "Renamed post")
+    mock_current_user(mocker, STANDARD_USER)
+    assert "Renamed post" in client.get(f"/blog/view/{bp1.slug}").data.decode()
+
+
+def test_page_cache_invalidated_by_comment(
+    client, mocker, delete_blogposts, bp1, cache_pages
+):
+    """Test creating a comment invalidates cached pages"""
+    client.get(f"/blog/view/{bp1.slug}")
+    mock_current_user(mocker, STANDARD_USER)
+    client.post(f"/blog/comment/{bp1.slug}", data={"comment": "Cache buster"})
+    mocker.stopall()
+    assert "Cache buster" in client.get(f"/blog/view/{bp1.slug}").data.decode()
+
+
+def test_page_cache_disabled(client, delete_blogposts, bp1):
+    """Test pages are not cached when the page cache is disabled"""
+    client.get(f"/blog/view/{bp1.slug}")
+    rename_post(bp1, "Renamed post")
+    assert "Renamed post" in client.get(f"/blog/view/{bp1.slug}").data.decode()
+
+
+def test_page_cache_shared_generation(client, tmpdir):
+    """Test invalidating one worker's disk backed cache invalidates the others"""
+    client.application.config["PAGE_CACHE_DIR"] = str(tmpdir)
+    workers = [PageCache(), PageCache()]
+    with client.application.test_request_context("/blog/"):
+        for worker in workers:
+            worker.configure()
+        key = workers[0].make_key(ANONYMOUS)
+        assert workers[1].make_key(ANONYMOUS) == key
+        workers[1].invalidate()
+        assert workers[0].make_key(ANONYMOUS) != key
+        assert workers[0].generation() == workers[1].generation() == 1
+
+
+def test_page_cache_generation_outlives_pages(client, tmpdir):
+    """Test the shared generation does not expire with the cached pages"""
+    client.application.config["PAGE_CACHE_DIR"] = str(tmpdir)
+    worker = PageCache(ttl=0)
+    with client.application.test_request_context("/blog/"):
+        worker.configure()
+        worker.invalidate()
+        key = worker.make_key(ANONYMOUS)
+        time.sleep(0.01)
+        assert worker.generation() == 1
+        worker.invalidate()
+        assert worker.generation() == 2
+        assert worker.make_key(ANONYMOUS) != key
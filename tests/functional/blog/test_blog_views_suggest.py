@@ -0,0 +1,42 @@
+"""Test blog suggest view"""
+import pytest
+
+from src.routes.blog.suggestions import suggester
+
+
+@pytest.fixture
+def built_suggester(client, delete_blogposts_mod, load_3_bp_mod):
+    """Rebuild the suggestions from the loaded posts"""
+    suggester.rebuild()
+
+    yield suggester
+
+    suggester.rebuild()
+
+
+def test_suggest_get(client, built_suggester, mocker):
+    """Test suggestions of published posts and tags, without a mongo query"""
+    rebuild = mocker.patch.object(built_suggester, "rebuild")
+    response = client.get("/blog/suggest?q=post")
+    assert response.status_code == 200
+    assert response.json == {
+        "suggestions": [
+            {"type": "post", "label": "Post 1", "url": "/blog/view/post-1"},
+            {"type": "post", "label": "Post 2", "url": "/blog/view/post-2"},
+        ]
+    }
+    response = client.get("/blog/suggest?q=tag")
+    assert [suggestion["label"] for suggestion in response.json["suggestions"]] == [
+        "tag1",
+        "tag2",
+        "tag3",
+    ]
+    assert response.json["suggestions"][0]["url"] == "/blog/?tag=tag1"
+    rebuild.assert_not_called()
+
+
+def test_suggest_get_empty(client, built_suggester):
+    """Test an empty query gets no suggestions"""
+    response = client.get("/blog/suggest")
+    assert response.status_code == 200
+    assert response.json == {"suggestions": []}
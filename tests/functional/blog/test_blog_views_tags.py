@@ -1,4 +1,6 @@
 """Test blog tags view"""
+from src.routes.blog.models import TagStats
+from src.routes.blog.views import update_tag_stats
 
 
 def test_blog_tags_get_standard(client, delete_blogposts_mod, load_3_bp_mod):
@@ -16,7 +18,7 @@ def test_blog_tags_get_standard(client, delete_blogposts_mod, load_3_bp_mod):
                 else:
                     tags_dict[tag] = 1
     for tag, count in tags_dict.items():
-        assert f'<a href="/blog/?tag={tag}">{tag}</a> ({count})'
+        assert f'<a href="/blog/?tag={tag}">{tag}</a> ({count})' in data
 
 
 def test_blog_tags_get_admin(
@@ -35,4 +37,48 @@ def test_blog_tags_get_admin(
             else:
                 tags_dict[tag] = 1
     for tag, count in tags_dict.items():
-        assert f'<a href="/blog/?tag={tag}">{tag}</a> ({count})'
+        assert f'<a href="/blog/?tag={tag}">{tag}</a> ({count})' in data
+
+
+def test_update_tag_stats(client, delete_blogposts):
+    """Test tag stats follow a post through create, edit, publish and delete"""
+    update_tag_stats([], False, ["tag1", "tag2"], False)
+    update_tag_stats([], False, ["tag2"], True)
+    assert get_stats() == {"tag1": (0, 1), "tag2": (1, 2)}
+    # Edit: publish the first post and swap tag1 for tag3
+    update_tag_stats(["tag1", "tag2"], False, ["tag2", "tag3"], True)
+    assert get_stats() == {"tag2": (2, 2), "tag3": (1, 1)}
+    # Delete both posts
+    update_tag_stats(["tag2", "tag3"], True, [], False)
+    update_tag_stats(["tag2"], True, [], False)
+    assert get_stats() == {}
+
+
+def test_blog_tags_follow_create_and_delete(
+    client, current_user_admin, delete_blogposts
+):
+    """Test creating and deleting a post through the views updates the tags page"""
+    form_data = {
+        "title": "Tagged Post",
+        "tags": "fresh,tag2",
+        "publish": True,
+        "can_comment": True,
+        "description": "# description",
+        "content": "# content",
+    }
+    response = client.post("/blog/create", data=form_data, follow_redirects=True)
+    assert response.status_code == 200
+    data = client.get("/blog/tags").data.decode()
+    assert '<a href="/blog/?tag=fresh">fresh</a> (1)' in data
+    response = client.get("/blog/delete/tagged-post", follow_redirects=True)
+    assert response.status_code == 200
+    data = client.get("/blog/tags").data.decode()
+    assert "fresh" not in data
+
+
+def get_stats():
+    """Get {tag: (published_count, total_count)} from the tag stats collection"""
+    return {
+        stat.tag: (stat.published_count, stat.total_count)
+        for stat in TagStats.objects()
+    }
@@ -1,4 +1,8 @@
 """Test blog view view"""
+import datetime
+
+from src.page_cache import page_cache
+from src.routes.blog import views
 
 
 def test_blog_view_get_standard(client, delete_blogposts_mod, bp1):
@@ -30,3 +34,75 @@ def test_blog_view_get_hidden_as_non_admin_fails(
         "This post is unpublished. Only admin can view it, sorry. Check back later!"
         in data
     )
+
+
+def test_blog_view_get_sets_validators(client, delete_blogposts, bp1):
+    """Test anonymous GET of the blog view route sets ETag and Last-Modified"""
+    response = client.get(f"/blog/view/{bp1.slug}")
+    assert response.status_code == 200
+    assert response.headers.get("ETag")
+    updated = bp1.updated_timestamp.astimezone(datetime.timezone.utc)
+    # Newer werkzeug versions return an aware datetime
+    last_modified = response.last_modified.replace(tzinfo=None)
+    assert last_modified == updated.replace(tzinfo=None, microsecond=0)
+
+
+def test_blog_view_get_single_query(client, mocker, delete_blogposts, bp1):
+    """Test a GET without conditional headers loads the post only once"""
+    get_post = mocker.spy(views, "get_post_for_view")
+    response = client.get(f"/blog/view/{bp1.slug}")
+    assert response.status_code == 200
+    assert response.headers.get("ETag")
+    get_post.assert_called_once_with(bp1.slug)
+
+
+def test_blog_view_if_none_match_not_modified(client, mocker, delete_blogposts, bp1):
+    """Test GET with a matching If-None-Match answers 304 from a slim query"""
+    etag = client.get(f"/blog/view/{bp1.slug}").headers["ETag"]
+    get_post = mocker.spy(views, "get_post_for_view")
+    response = client.get(f"/blog/view/{bp1.slug}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+    get_post.assert_called_once_with(bp1.slug, fields=views.POST_VALIDATOR_FIELDS)
+
+
+def test_blog_view_if_modified_since_not_modified(client, delete_blogposts, bp1):
+    """Test GET with a current If-Modified-Since answers 304"""
+    last_modified = client.get(f"/blog/view/{bp1.slug}").headers["Last-Modified"]
+    response = client.get(
+        f"/blog/view/{bp1.slug}", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+
+
+def test_blog_view_etag_changes_with_comments(client, delete_blogposts, bp1):
+    """Test a comment change gives the post page a new ETag"""
+    etag = client.get(f"/blog/view/{bp1.slug}").headers["ETag"]
+    views.comments_changed(bp1)
+    response = client.get(f"/blog/view/{bp1.slug}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_blog_view_logged_in_no_validators(
+    client, current_user_standard, delete_blogposts, bp1
+):
+    """Test logged in users always get a freshly rendered post page"""
+    response = client.get(f"/blog/view/{bp1.slug}")
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    response = client.get(f"/blog/view/{bp1.slug}", headers={"If-None-Match": "*"})
+    assert response.status_code == 200
+
+
+def test_blog_view_page_cache_not_modified(client, delete_blogposts, bp1):
+    """Test pages served from the page cache still answer conditional GETs"""
+    client.application.config["PAGE_CACHE"] = True
+    page_cache.clear()
+    etag = client.get(f"/blog/view/{bp1.slug}").headers["ETag"]
+    response = client.get(f"/blog/view/{bp1.slug}")
+    assert response.headers["ETag"] == etag
+    response = client.get(f"/blog/view/{bp1.slug}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    page_cache.clear()
@@ -1,4 +1,9 @@
 """Test features of the core views"""
+import os
+
+from src import image_jobs
+from src.image_handler import BLOG_UPLOAD_FOLDER
+from src.image_jobs import DONE, ImagePipeline
 
 
 def test_index_basics(client):
@@ -34,3 +39,58 @@ def test_index_while_logged_in(client, current_user_standard):
     assert 'href="/users/edit_profile">' in data
     assert 'href="/users/account_settings">' in data
     assert 'href="/users/logout' in data
+
+
+def test_image_status(client, tmpdir, mocker):
+    """
+    GIVEN an uploaded image being resized
+    THEN its status fragment polls until the resized image is ready,
+        then shows it without polling
+    """
+    pipeline = ImagePipeline(jobs_db=str(tmpdir.join("jobs.sqlite3")))
+    mocker.patch("src.routes.core.views.image_pipeline", pipeline)
+    table = pipeline.table
+    target = os.path.join(BLOG_UPLOAD_FOLDER, "status_test.png")
+    table.add("status_test.png", "source", target, 20)
+    query = {"img_class": "rounded", "img_id": "avatar-img"}
+    response = client.get("/image_status/status_test.png", query_string=query)
+    assert response.status_code == 200
+    data = response.data.decode()
+    assert 'ic-poll="1s"' in data
+    assert 'src="/static/images/blog_uploaded/status_test.png"' in data
+    assert 'class="rounded"' in data and 'id="avatar-img"' in data
+    table.claim("status_test.png")
+    table.finish("status_test.png", DONE)
+    data = client.get("/image_status/status_test.png").data.decode()
+    assert "ic-poll" not in data
+    assert "/static/images/blog_uploaded/status_test.png" in data
+    assert client.get("/image_status/missing.png").status_code == 404
+
+
+def test_stored_images_cached_immutably(client, tmpdir, mocker):
+    """
+    GIVEN a stored image, a stored image being resized and another static file
+    THEN only the resized stored image is cached for good
+    """
+    pipeline = ImagePipeline(jobs_db=str(tmpdir.join("jobs.sqlite3")))
+    mocker.patch("src.image_handler.image_pipeline", pipeline)
+    done, pending = "a" * 32, "b" * 32
+    for digest in (done, pending):
+        with open(os.path.join(BLOG_UPLOAD_FOLDER, f"{digest}.png"), "wb") as f:
+            f.write(b"png")
+        pipeline.table.add(f"{digest}.png", "source", "target", 20)
+    pipeline.table.finish(f"{done}.png", DONE)
+    try:
+        response = client.get(f"/static/images/blog_uploaded/{done}.png")
+        assert "immutable" in response.headers["Cache-Control"]
+        connect = mocker.spy(image_jobs.sqlite3, "connect")
+        response = client.get(f"/static/images/blog_uploaded/{done}.png")
+        assert "immutable" in response.headers["Cache-Control"]
+        assert connect.call_count == 0
+        response = client.get(f"/static/images/blog_uploaded/{pending}.png")
+        assert "immutable" not in response.headers.get("Cache-Control", "")
+        response = client.get("/static/images/core/suit_headshot_cropped.jpg")
+        assert "immutable" not in response.headers.get("Cache-Control", "")
+    finally:
+        for digest in (done, pending):
+            os.remove(os.path.join(BLOG_UPLOAD_FOLDER, f"{digest}.png"))
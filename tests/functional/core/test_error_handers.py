@@ -31,6 +31,7 @@ ERRORS = [
         ),
         id="403",
     ),
+    pytest.param(413, "That upload is too large, sorry!", id="413"),
 ]
 
 
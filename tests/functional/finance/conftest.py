@@ -1,4 +1,6 @@
 """conftest: pytest configuration file"""
+import json
+
 import pytest
 from bson.objectid import ObjectId
 
@@ -125,3 +127,10 @@ def update_budget(client, form_data, status_code=200):
 def get_budget(client, status_code=200):
     """Call get_budget"""
     return get_and_decode(client, "/finance/budget", status_code=status_code)
+
+
+def patch_budget(client, cells, status_code=200):
+    """Call patch_current_budget view with changed cells, returning its json"""
+    response = client.post("/finance/budget/patch", data={"cells": json.dumps(cells)})
+    assert response.status_code == status_code
+    return response.get_json()
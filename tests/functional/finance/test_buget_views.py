@@ -1,6 +1,7 @@
 """test_budget_views_budget_page: test all budget related views"""
 import json
 
+from src.routes.finance import drafts
 from tests.conftest import get_and_decode, post_and_decode
 
 from .conftest import (
@@ -8,6 +9,7 @@ from .conftest import (
     SMALL_INNER_BUDGET_1,
     SMALL_INNER_BUDGET_2,
     get_budget,
+    patch_budget,
     retrieve_budget,
     update_budget,
 )
@@ -92,6 +94,63 @@ def test_budget_views_update_budget(client):
     assert "It looks like your income is greater than your spending." in data
 
 
+def test_budget_views_update_budget_session_cookie(client, delete_draft_budgets):
+    """Test the updated budget is kept server-side, not in the session cookie"""
+    update_budget(client, SIMPLE_BUDGET_FORM)
+    cookie = client.cookie_jar._cookies["localhost.local"]["/"]["session"]
+    assert len(cookie.value) < 120
+    drafts.memory_drafts.clear()
+    assert "Wages" in get_budget(client)
+
+
+def test_budget_views_patch_budget(client, delete_draft_budgets):
+    """Test patching a value only returns the graphs it changes"""
+    update_budget(client, SIMPLE_BUDGET_FORM)
+    data = patch_budget(client, [["Expenses", "Spending", "value", 400]])
+    assert set(data["charts"]) == {
+        "budget-chart-categories",
+        "budget-chart-items",
+        "budget-chart-income-vs-expenses",
+        "budget-advice",
+    }
+    assert data["charts"]["budget-chart-items"].count("docs_json") == 2
+    data = patch_budget(client, [["Income", "Wages", "period", 1]])
+    assert set(data["charts"]) == {
+        "budget-chart-income",
+        "budget-chart-income-vs-expenses",
+        "budget-advice",
+    }
+    assert (
+        "your spending is greater than your income" in data["charts"]["budget-advice"]
+    )
+    data = get_budget(client)
+    assert 'value="400"' in data
+
+
+def test_budget_views_patch_budget_graphs_unavailable(client, delete_draft_budgets):
+    """Test patching graphs in or out of availability returns all graphs"""
+    update_budget(client, SIMPLE_BUDGET_FORM)
+    data = patch_budget(client, [["Income", "Wages", "value", None]])
+    assert data == {"graphs": "<h2>Graphs unavailable</h2>"}
+    data = patch_budget(client, [["Income", "Wages", "value", 100]])
+    assert data["graphs"].count("docs_json") == 8
+
+
+def test_budget_views_patch_budget_no_draft(client, delete_draft_budgets):
+    """Test patching without a stashed budget asks for the whole budget"""
+    data = patch_budget(client, [["Income", "Wages", "value", 1]], status_code=409)
+    assert data == {"error": "No budget to patch."}
+
+
+def test_budget_views_patch_budget_invalid(client, delete_draft_budgets):
+    """Test patching an unknown item fails, leaving the stashed budget as it was"""
+    update_budget(client, SIMPLE_BUDGET_FORM)
+    data = patch_budget(client, [["Income", "Tips", "value", 1]], status_code=400)
+    assert data == {"error": "No item 'Tips' in 'Income'."}
+    patch_budget(client, {"cells": 1}, status_code=400)
+    assert "Wages" in get_budget(client)
+
+
 def test_budget_views_save_budget_not_logged_in(client, load_3_budgets):
     """Test the save_budget view while not logged in"""
     update_budget(client, SIMPLE_BUDGET_FORM)
@@ -130,8 +130,8 @@ def test_users_edit_profile_post_happy(
             val = f"/static/images/avatars_default/{form_data[key]}"
             key = "avatar_location"
         elif key == "upload_avatar":
-            val = f"/static/images/avatars_uploaded/{logged_in_user1_mod.id}"
-            assert val in user.avatar_location
+            val = "/static/images/avatars_uploaded/"
+            assert user.avatar_location.startswith(val)
             continue
         elif key == "birth_date" and val is not None:
             val = datetime.datetime.combine(val, datetime.datetime.min.time())
@@ -0,0 +1,166 @@
+"""Tests for the blog cli commands"""
+import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+from src.routes.blog.commands import (
+    backfill_comment_counts,
+    migrate_embedded_comments,
+    rerender_posts,
+)
+from src.routes.blog.models import BlogPost, Comment
+from src.routes.blog.rendering import post_render_hash
+
+NOW = datetime.datetime.now()
+
+
+def make_post(title, comment_total, comment_count=0):
+    """Save a post with comment_total comments and a given comment_count"""
+    post = BlogPost(
+        title=title,
+        slug=title.lower(),
+        author=ObjectId(),
+        markdown_description="description",
+        markdown_content="content",
+        html_description="<p>description</p>",
+        html_content="<p>content</p>",
+        created_timestamp=NOW,
+        updated_timestamp=NOW,
+        comment_count=comment_count,
+    )
+    post.save()
+    for i in range(comment_total):
+        Comment(
+            post_id=post.id,
+            author=ObjectId(),
+            content=f"comment {i}",
+            created_timestamp=NOW,
+            updated_timestamp=NOW,
+        ).save()
+    return post
+
+
+def make_comment_dict(i):
+    """Raw comment as it was embedded in legacy blog posts"""
+    return {
+        "id": ObjectId(),
+        "author": ObjectId(),
+        "content": f"comment {i}",
+        "created_timestamp": NOW,
+        "updated_timestamp": NOW,
+        "likes": 0,
+        "replies": [],
+    }
+
+
+def test_backfill_comment_counts(client, delete_blogposts):
+    """
+    GIVEN posts whose comment_count is stale or missing
+    WHEN backfill_comment_counts runs
+    THEN every comment_count matches its number of comments
+    """
+    stale = make_post("Stale", 3)
+    correct = make_post("Correct", 2, comment_count=2)
+    empty = make_post("Empty", 0)
+    assert backfill_comment_counts(batch_size=1) == 1
+    for post, expected in ((stale, 3), (correct, 2), (empty, 0)):
+        assert BlogPost.objects(id=post.id).first().comment_count == expected
+
+
+def test_backfill_comment_counts_command(client, delete_blogposts):
+    """
+    GIVEN the backfill-comment-counts cli command
+    THEN it reports how many posts were updated
+    """
+    make_post("Stale", 1)
+    runner = client.application.test_cli_runner()
+    result = runner.invoke(args=["blog", "backfill-comment-counts"])
+    assert result.exit_code == 0
+    assert "Updated comment_count on 1 post(s)." in result.output
+
+
+def test_migrate_embedded_comments(client, delete_blogposts):
+    """
+    GIVEN a legacy post with comments embedded in the post document
+    WHEN migrate_embedded_comments runs (twice)
+    THEN the comments move to the comments collection, keeping their ids
+    """
+    post = make_post("Legacy", 0)
+    legacy_comments = [make_comment_dict(i) for i in range(3)]
+    BlogPost._get_collection().update_one(
+        {"_id": post.id}, {"$set": {"comments": legacy_comments}}
+    )
+    assert migrate_embedded_comments() == 1
+    assert migrate_embedded_comments() == 0
+    raw_post = BlogPost._get_collection().find_one({"_id": post.id})
+    assert "comments" not in raw_post
+    assert raw_post["comment_count"] == 3
+    comments = Comment.objects(post_id=post.id)
+    assert {comment.id for comment in comments} == {
+        comment["id"] for comment in legacy_comments
+    }
+
+
+def make_rendered_posts():
+    """Save a post rendered from its current markdown, and two stale ones"""
+    current = make_post("Current", 0)
+    current.update(
+        set__render_hash=post_render_hash(
+            current.markdown_content, current.markdown_description
+        )
+    )
+    stale = make_post("Stale", 0)
+    stale.update(set__render_hash="outdated")
+    unhashed = make_post("Unhashed", 0)
+    return current, stale, unhashed
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_rerender_posts(client, delete_blogposts, workers):
+    """
+    GIVEN posts with current, outdated and missing render hashes
+    WHEN rerender_posts runs
+    THEN only posts with outdated or missing hashes are rendered
+    """
+    current, stale, unhashed = make_rendered_posts()
+    scanned = []
+    assert rerender_posts(workers=workers, batch_size=2, progress=scanned.append) == (
+        2,
+        1,
+    )
+    assert sum(scanned) == 3
+    assert BlogPost.objects(id=current.id).first().html_content == "<p>content</p>"
+    for post in (stale, unhashed):
+        post = BlogPost.objects(id=post.id).first()
+        assert post.html_content.startswith('<div class="toc">')
+        assert post.html_content.endswith("<p>content</p>")
+        assert post.html_description == "<p>description</p>"
+        assert post.render_hash == post_render_hash("content", "description")
+    assert rerender_posts() == (0, 3)
+    assert rerender_posts(force=True) == (3, 0)
+
+
+def test_rerender_posts_dry_run(client, delete_blogposts):
+    """
+    GIVEN posts with outdated render hashes
+    WHEN rerender_posts runs as a dry run
+    THEN the posts are counted but not changed
+    """
+    _, stale, _ = make_rendered_posts()
+    assert rerender_posts(dry_run=True) == (2, 1)
+    assert BlogPost.objects(id=stale.id).first().render_hash == "outdated"
+
+
+def test_rerender_command(client, delete_blogposts):
+    """
+    GIVEN the rerender cli command
+    THEN it reports how many posts were rendered and skipped
+    """
+    make_rendered_posts()
+    runner = client.application.test_cli_runner()
+    result = runner.invoke(args=["blog", "rerender", "--workers", "1", "--dry-run"])
+    assert result.exit_code == 0
+    assert "Would render 2 post(s), skipped 1 unchanged post(s)." in result.output
+    result = runner.invoke(args=["blog", "rerender", "--workers", "1"])
+    assert "Rendered 2 post(s), skipped 1 unchanged post(s)." in result.output
@@ -5,7 +5,7 @@ import mongoengine
 import pytest
 from bson.objectid import ObjectId
 
-from src.routes.blog.models import BlogPost
+from src.routes.blog.models import BlogPost, Comment
 from tests.mongodb_helpers import list_indexes
 
 BLOG_COLLECTION = "blog"
@@ -13,7 +13,7 @@ BLOG_MODEL_DEFAULTS = {
     # field: [default, indexed]
     "title": [None, True],
     "slug": [None, True],
-    "author": [None, True],
+    "author": [None, False],
     "published": [False, True],
     "tags": [[], True],
     "markdown_description": [None, False],
@@ -22,23 +22,14 @@ BLOG_MODEL_DEFAULTS = {
     "html_content": [None, False],
     "created_timestamp": [None, True],
     "updated_timestamp": [None, True],
-    "likes": [0, True],
-    "views": [0, True],
-    "can_comment": [True, True],
+    "likes": [0, False],
+    "views": [0, False],
+    "can_comment": [True, False],
     "images.name": [None, False],
     "images.location": [None, False],
-    "comments.id": [ObjectId(), True],
-    "comments.author": [None, True],
-    "comments.content": [None, False],
-    "comments.created_timestamp": [None, True],
-    "comments.updated_timestamp": [None, True],
-    "comments.likes": [0, True],
-    "comments.replies.id": [ObjectId(), True],
-    "comments.replies.author": [None, True],
-    "comments.replies.content": [None, False],
-    "comments.replies.created_timestamp": [None, True],
-    "comments.replies.updated_timestamp": [None, True],
-    "comments.replies.likes": [0, True],
+    "comment_count": [0, False],
+    "render_hash": [None, False],
+    "comments_updated_timestamp": [None, False],
 }
 NOW = datetime.datetime.now()
 GOOD_BLOGPOSTS = [
@@ -61,26 +52,7 @@ GOOD_BLOGPOSTS = [
             "updated_timestamp": NOW,
             "likes": 5,
             "views": 123,
-            "comments": [
-                {
-                    "id": ObjectId(),
-                    "author": ObjectId(),
-                    "content": "I like your post",
-                    "created_timestamp": NOW,
-                    "updated_timestamp": NOW,
-                    "likes": 3,
-                    "replies": [
-                        {
-                            "id": ObjectId(),
-                            "author": ObjectId(),
-                            "content": "replying to comment",
-                            "created_timestamp": NOW,
-                            "updated_timestamp": NOW,
-                            "likes": 1,
-                        }
-                    ],
-                }
-            ],
+            "comment_count": 1,
         },
         id="everything",
     ),
@@ -98,36 +70,6 @@ GOOD_BLOGPOSTS = [
         },
         id="minimal",
     ),
-    pytest.param(
-        {
-            "title": "Minimal Title",
-            "slug": "minimal-title",
-            "author": ObjectId(),
-            "markdown_description": "# Cool blog post",
-            "markdown_content": "## some other cool stuff",
-            "html_description": "<h1>Cool blog post</h1>",
-            "html_content": "<h2>some other cool stuff</h2>",
-            "created_timestamp": NOW,
-            "updated_timestamp": NOW,
-            "comments": [
-                {
-                    "author": ObjectId(),
-                    "content": "I like your post",
-                    "created_timestamp": NOW,
-                    "updated_timestamp": NOW,
-                    "replies": [
-                        {
-                            "author": ObjectId(),
-                            "content": "replying to comment",
-                            "created_timestamp": NOW,
-                            "updated_timestamp": NOW,
-                        }
-                    ],
-                }
-            ],
-        },
-        id="minimal_comment",
-    ),
 ]
 
 
@@ -152,34 +94,13 @@ def get_vals_and_defaults(key, dictionary, post):
     if len(key_split) == 1:
         dict_val = dictionary[key] if key in dictionary else None
         post_val = post[key] if key in post else None
-    elif len(key_split) == 2:
-        if (key_split[0] == "comments" and len(dictionary.get("comments", [])) > 0) or (
-            key_split[0] == "images" and len(dictionary.get("images", [])) > 0
-        ):
+    else:
+        if len(dictionary.get(key_split[0], [])) > 0:
             dict_val = dictionary[key_split[0]][-1].get(key_split[1])
             post_val = post[key_split[0]][-1][key_split[1]]
         else:
             dict_val = "NO_CHECK"
             post_val = "NO_CHECK"
-    elif len(key_split) == 3:
-        if (
-            "comments" in dictionary
-            and len(dictionary["comments"]) > 0
-            and "replies" in dictionary["comments"][-1]
-            and len(dictionary["comments"][-1]["replies"]) > 0
-        ):
-            dict_val = dictionary[key_split[0]][-1][key_split[1]][-1].get(key_split[2])
-        else:
-            dict_val = "NO_CHECK"
-        if (
-            "comments" in post
-            and len(post["comments"]) > 0
-            and "replies" in post["comments"][-1]
-            and len(post["comments"][-1]["replies"]) > 0
-        ):
-            post_val = post[key_split[0]][-1][key_split[1]][-1][key_split[2]]
-        else:
-            post_val = "NO_CHECK"
     return key, dict_val, post_val, default, indexed
 
 
@@ -308,75 +229,122 @@ BAD_POSTS = [
         },
         id="updated_timestamp_is_str",
     ),
+]
+
+
+@pytest.mark.parametrize("bp_dict", BAD_POSTS)
+def test_new_post_bad_fails(client, delete_blogposts, bp_dict):
+    """
+    GIVEN a BlogPost model
+    WHEN a new BlogPost is created
+    THEN check post fails when fields don't match model rules
+    """
+    new_bp = BlogPost(**bp_dict)
+    with pytest.raises(mongoengine.errors.ValidationError):
+        new_bp.save()
+
+
+COMMENT_COLLECTION = "comments"
+GOOD_COMMENTS = [
     pytest.param(
         {
-            "title": "string",
-            "slug": "string",
+            "post_id": ObjectId(),
             "author": ObjectId(),
-            "markdown_description": "string",
-            "markdown_content": "string",
-            "html_description": "string",
-            "html_content": "string",
+            "content": "I like your post",
             "created_timestamp": NOW,
             "updated_timestamp": NOW,
-            "comments": [
+            "likes": 3,
+            "replies": [
                 {
+                    "id": ObjectId(),
                     "author": ObjectId(),
-                    "content": "a" * 501,
+                    "content": "replying to comment",
                     "created_timestamp": NOW,
                     "updated_timestamp": NOW,
+                    "likes": 1,
                 }
             ],
         },
-        id="long_comment",
+        id="everything",
     ),
     pytest.param(
         {
-            "title": "string",
-            "slug": "string",
+            "post_id": ObjectId(),
             "author": ObjectId(),
-            "markdown_description": "string",
-            "markdown_content": "string",
-            "html_description": "string",
-            "html_content": "string",
+            "content": "I like your post",
+            "created_timestamp": NOW,
+            "updated_timestamp": NOW,
+        },
+        id="minimal",
+    ),
+]
+
+
+@pytest.mark.parametrize("comment_dict", GOOD_COMMENTS)
+def test_new_comment_good_succeeds(client, delete_blogposts, comment_dict):
+    """
+    GIVEN a Comment model
+    WHEN a new Comment is created
+    THEN check the fields are created correctly and (post_id, created) is indexed
+    """
+    comment = Comment(**comment_dict)
+    comment.save()
+    comment = Comment.objects(id=comment.id).first()
+    assert str(comment) == (
+        f"Comment(post_id: {comment.post_id}, author: {comment.author})"
+    )
+    assert comment.post_id == comment_dict["post_id"]
+    assert comment.content == comment_dict["content"]
+    assert comment.likes == comment_dict.get("likes", 0)
+    assert len(comment.replies) == len(comment_dict.get("replies", []))
+    for reply in comment.replies:
+        assert isinstance(reply.id, ObjectId)
+    assert "post_id" in set(list_indexes(COMMENT_COLLECTION))
+
+
+BAD_COMMENTS = [
+    pytest.param(
+        {
+            "post_id": ObjectId(),
+            "author": ObjectId(),
+            "content": "a" * 501,
+            "created_timestamp": NOW,
+            "updated_timestamp": NOW,
+        },
+        id="long_comment",
+    ),
+    pytest.param(
+        {
+            "post_id": ObjectId(),
+            "author": "author_string",
+            "content": "string",
             "created_timestamp": NOW,
             "updated_timestamp": NOW,
-            "comments": [
-                {
-                    "author": "author_string",
-                    "content": "a" * 501,
-                    "created_timestamp": NOW,
-                    "updated_timestamp": NOW,
-                }
-            ],
         },
         id="comment_author_string",
     ),
     pytest.param(
         {
-            "title": "string",
-            "slug": "string",
             "author": ObjectId(),
-            "markdown_description": "string",
-            "markdown_content": "string",
-            "html_description": "string",
-            "html_content": "string",
+            "content": "string",
             "created_timestamp": NOW,
             "updated_timestamp": NOW,
-            "comments": [
+        },
+        id="no_post_id",
+    ),
+    pytest.param(
+        {
+            "post_id": ObjectId(),
+            "author": ObjectId(),
+            "content": "string",
+            "created_timestamp": NOW,
+            "updated_timestamp": NOW,
+            "replies": [
                 {
                     "author": ObjectId(),
-                    "content": "string",
+                    "content": "a" * 501,
                     "created_timestamp": NOW,
                     "updated_timestamp": NOW,
-                    "replies": [
-                        {
-                            "author": ObjectId(),
-                            "content": "a" * 501,
-                            "created_timestamp": NOW,
-                            "updated_timestamp": NOW,
-                        }
-                    ],
                 }
             ],
         },
@@ -384,29 +352,17 @@ BAD_POSTS = [
     ),
     pytest.param(
         {
-            "title": "string",
-            "slug": "string",
+            "post_id": ObjectId(),
             "author": ObjectId(),
-            "markdown_description": "string",
-            "markdown_content": "string",
-            "html_description": "string",
-            "html_content": "string",
+            "content": "string",
             "created_timestamp": NOW,
             "updated_timestamp": NOW,
-            "comments": [
+            "replies": [
                 {
-                    "author": ObjectId(),
-                    "content": "string",
+                    "author": "author_string",
+                    "content": "replying to comment",
                     "created_timestamp": NOW,
                     "updated_timestamp": NOW,
-                    "replies": [
-                        {
-                            "author": "author_string",
-                            "content": "replying to comment",
-                            "created_timestamp": NOW,
-                            "updated_timestamp": NOW,
-                        }
-                    ],
                 }
             ],
         },
@@ -415,13 +371,13 @@ BAD_POSTS = [
 ]
 
 
-@pytest.mark.parametrize("bp_dict", BAD_POSTS)
-def test_new_post_bad_fails(client, delete_blogposts, bp_dict):
+@pytest.mark.parametrize("comment_dict", BAD_COMMENTS)
+def test_new_comment_bad_fails(client, delete_blogposts, comment_dict):
     """
-    GIVEN a BlogPost model
-    WHEN a new BlogPost is created
-    THEN check post fails when fields don't match model rules
+    GIVEN a Comment model
+    WHEN a new Comment is created
+    THEN check comment fails when fields don't match model rules
     """
-    new_bp = BlogPost(**bp_dict)
+    new_comment = Comment(**comment_dict)
     with pytest.raises(mongoengine.errors.ValidationError):
-        new_bp.save()
+        new_comment.save()
@@ -0,0 +1,130 @@
+"""Tests for blog markdown rendering"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.cache import MongoCache
+from src.routes.blog import rendering
+from src.routes.blog.models import OEmbedCacheEntry
+from src.routes.blog.rendering import markdown_to_html, pooled_markdown
+
+MARKDOWN = """# Heading
+
+Some `code` and a table of contents.
+
+```python
+print("hello")
+```
+"""
+
+
+def test_markdown_to_html():
+    """
+    GIVEN markdown content
+    THEN it renders to highlighted HTML, with a table of contents if asked
+    """
+    html = markdown_to_html(MARKDOWN)
+    assert '<h1 id="heading">Heading</h1>' in html
+    assert 'class="highlight"' in html
+    assert 'class="toc"' not in html
+    assert 'class="toc"' in markdown_to_html(MARKDOWN, table=True)
+
+
+def test_markdown_to_html_cached(mocker):
+    """
+    GIVEN markdown content rendered once
+    WHEN it is rendered again with the same options
+    THEN the cached HTML is returned without rendering again
+    """
+    rendering.html_cache.clear()
+    render = mocker.spy(rendering, "render_markdown")
+    first = markdown_to_html(MARKDOWN)
+    assert markdown_to_html(MARKDOWN) == first
+    assert render.call_count == 1
+    markdown_to_html(MARKDOWN, table=True)
+    markdown_to_html(MARKDOWN + "more")
+    assert render.call_count == 3
+
+
+def test_pooled_markdown_reuses_instances():
+    """
+    GIVEN the markdown pool
+    THEN instances are returned to the pool and reset before reuse
+    """
+    with pooled_markdown() as md:
+        md.convert("# First")
+        first = md
+    with pooled_markdown() as md:
+        assert md is first
+        assert md.convert("plain") == "<p>plain</p>"
+        assert md.toc_tokens == []
+
+
+class FakeVideoProvider:
+    """oEmbed provider that counts requests instead of using the network"""
+
+    def __init__(self):
+        self.requests = 0
+
+    def request(self, url, **params):
+        self.requests += 1
+        return {
+            "type": "video",
+            "url": url,
+            "title": "Fake video",
+            "html": '<iframe src="https://video.example.com/embed"></iframe>',
+        }
+
+
+@pytest.fixture
+def fake_video_provider(client):
+    """Register a fake oEmbed provider with empty oEmbed caches"""
+    provider = FakeVideoProvider()
+    regex = r"https://video\.example\.com/\S+"
+    rendering.configure_caches()
+    rendering.oembed_cache.clear()
+    rendering.oembed_providers.register(regex, provider)
+
+    yield provider
+
+    rendering.oembed_providers.unregister(regex)
+    rendering.oembed_cache.clear()
+
+
+def test_oembed_responses_cached(fake_video_provider):
+    """
+    GIVEN markdown embedding the same video url in several posts
+    WHEN they are rendered, with the in-memory oEmbed cache lost in between
+    THEN the provider is only asked once, later renders use the shared cache
+    """
+    url = "https://video.example.com/watch/1"
+    html = markdown_to_html(f"First post\n\n{url}")
+    assert '<iframe src="https://video.example.com/embed">' in html
+    markdown_to_html(f"Second post\n\n{url}")
+    rendering.oembed_cache.memory.clear()
+    html = markdown_to_html(f"Third post\n\n{url}")
+    assert '<iframe src="https://video.example.com/embed">' in html
+    assert fake_video_provider.requests == 1
+    assert OEmbedCacheEntry.objects.count() == 1
+
+
+def test_mongo_cache(client):
+    """
+    GIVEN a MongoCache with a ttl and max_entries
+    THEN values round trip, expire after the ttl and are pruned oldest first
+    """
+    cache = MongoCache(OEmbedCacheEntry, ttl=60, max_entries=2)
+    cache.clear()
+    for i in range(4):
+        cache.set(f"key{i}", {"i": i})
+        OEmbedCacheEntry.objects(key=f"key{i}").update_one(
+            set__created_timestamp=datetime.utcnow() - timedelta(seconds=10 - i)
+        )
+    assert cache.get("key3") == {"i": 3}
+    assert cache.prune() == 2
+    assert [cache.get(f"key{i}") for i in range(4)] == [None, None, {"i": 2}, {"i": 3}]
+    OEmbedCacheEntry.objects(key="key3").update_one(
+        set__created_timestamp=datetime.utcnow() - timedelta(seconds=120)
+    )
+    assert cache.get("key3") is None
+    cache.clear()
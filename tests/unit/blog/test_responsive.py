@@ -0,0 +1,82 @@
+"""Tests for responsive blog image markup"""
+import pytest
+
+from src.routes.blog.models import Image, ImageVariant
+from src.routes.blog.responsive import SIZES, picture, responsive_images
+
+LOCATION = "/static/images/blog_uploaded/1234.jpg"
+
+
+@pytest.fixture
+def image():
+    """An uploaded image with smaller and WebP variants"""
+    return Image(
+        name="Graph",
+        location=LOCATION,
+        variants=[
+            ImageVariant(
+                location="/w/1234-320w.webp", width=320, mimetype="image/webp"
+            ),
+            ImageVariant(location="/w/1234.webp", width=800, mimetype="image/webp"),
+            ImageVariant(location="/w/1234-320w.jpg", width=320, mimetype="image/jpeg"),
+        ],
+    )
+
+
+@pytest.fixture
+def no_pending(mocker):
+    """No image is still being processed"""
+    mocker.patch("src.routes.blog.responsive.get_pending_images", return_value=set())
+
+
+def test_picture(image):
+    """
+    GIVEN an image with variants
+    THEN its picture offers the modern formats as sources and its own
+        format's widths in the img srcset
+    """
+    assert picture(image) == (
+        "<picture>"
+        f'<source type="image/webp" srcset="/w/1234-320w.webp 320w, '
+        f'/w/1234.webp 800w" sizes="{SIZES}">'
+        f'<img src="{LOCATION}" alt="Graph" srcset="/w/1234-320w.jpg 320w, '
+        f'{LOCATION} 800w" sizes="{SIZES}">'
+        "</picture>"
+    )
+
+
+def test_picture_no_variants():
+    """
+    GIVEN an image without variants, such as a gif
+    THEN it is a plain img
+    """
+    image = Image(name="Anim", location="/a.gif")
+    assert picture(image) == '<img src="/a.gif" alt="Anim">'
+
+
+def test_responsive_images(image, no_pending):
+    """
+    GIVEN post HTML with an uploaded image and an external image
+    THEN only the uploaded image is made responsive, keeping its attributes
+    """
+    html = (
+        f'<p><img alt="Graph" src="{LOCATION}" /></p>'
+        '<p><img alt="Elsewhere" src="https://example.com/a.jpg" /></p>'
+    )
+    result = responsive_images(html, [image])
+    assert result.count("<picture>") == 1
+    assert '<source type="image/webp"' in result
+    assert f'sizes="{SIZES}" alt="Graph" src="{LOCATION}" /></picture>' in result
+    assert '<img alt="Elsewhere" src="https://example.com/a.jpg" />' in result
+
+
+def test_responsive_images_pending(image, mocker):
+    """
+    GIVEN an uploaded image whose variants are still being made
+    THEN it is left as it is
+    """
+    mocker.patch(
+        "src.routes.blog.responsive.get_pending_images", return_value={LOCATION}
+    )
+    html = f'<img alt="Graph" src="{LOCATION}" />'
+    assert responsive_images(html, [image]) == html
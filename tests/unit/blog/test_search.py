@@ -0,0 +1,240 @@
+"""Tests for the blog search index"""
+import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+from src.routes.blog.models import BlogPost
+from src.routes.blog.search import SearchIndex, tokenize, within_distance
+from src.routes.users.models import User
+
+NOW = datetime.datetime.now().replace(microsecond=0)
+
+
+def make_post(title, content="content", tags=(), published=True, age=0, author=None):
+    """Save a post, `age` days old"""
+    timestamp = NOW - datetime.timedelta(days=age)
+    post = BlogPost(
+        title=title,
+        slug=title.lower().replace(" ", "-"),
+        author=author or ObjectId(),
+        tags=list(tags),
+        published=published,
+        markdown_description="description",
+        markdown_content=content,
+        html_description="<p>description</p>",
+        html_content=f"<p>{content}</p>",
+        created_timestamp=timestamp,
+        updated_timestamp=timestamp,
+    )
+    post.save()
+    return post
+
+
+@pytest.fixture
+def index(client, delete_blogposts):
+    """An empty search index"""
+    return SearchIndex()
+
+
+def test_tokenize():
+    """
+    GIVEN text with punctuation, casing and stop words
+    THEN only lowercase, non stop word terms are kept
+    """
+    assert tokenize("The Flask-Login guide, for Python 3!") == [
+        "flask",
+        "login",
+        "guide",
+        "python",
+        "3",
+    ]
+
+
+@pytest.mark.parametrize(
+    "first, second, max_distance, expected",
+    [
+        pytest.param("python", "python", 0, True, id="same"),
+        pytest.param("pyhton", "python", 1, True, id="swap"),
+        pytest.param("ypthno", "python", 1, False, id="two_swaps"),
+        pytest.param("ypthno", "python", 2, True, id="two_swaps_within_two"),
+        pytest.param("pythn", "python", 1, True, id="deletion"),
+        pytest.param("pythons", "python", 1, True, id="insertion"),
+        pytest.param("java", "python", 2, False, id="different"),
+    ],
+)
+def test_within_distance(first, second, max_distance, expected):
+    """
+    GIVEN two terms and a maximum edit distance
+    THEN return whether they are within that distance
+    """
+    assert within_distance(first, second, max_distance) is expected
+
+
+def test_search_field_weights(index):
+    """
+    GIVEN posts containing a term in different fields
+    THEN author matches rank above tags, then title, then content
+    """
+    author = User(username="mongo").save()
+    try:
+        content = make_post("In content", content="about mongo")
+        title = make_post("Mongo in title")
+        tags = make_post("In tags", tags=["mongo"])
+        by_author = make_post("By author", author=author.id)
+        assert index.search("mongo") == [by_author.id, tags.id, title.id, content.id]
+    finally:
+        author.delete()
+
+
+def test_search_term_frequency(index):
+    """
+    GIVEN posts mentioning a term more or less often
+    THEN the post mentioning it more often ranks first
+    """
+    once = make_post("Once", content="flask and some other words here")
+    often = make_post("Often", content="flask flask flask and other words")
+    assert index.search("flask") == [often.id, once.id]
+
+
+def test_search_ties_newest_first(index):
+    """
+    GIVEN posts matching equally well
+    THEN the newest post ranks first
+    """
+    older = make_post("Python one", age=2)
+    newer = make_post("Python two", age=1)
+    assert index.search("python") == [newer.id, older.id]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        pytest.param("bokeh", id="exact"),
+        pytest.param("bok", id="prefix"),
+        pytest.param("bokhe", id="typo"),
+        pytest.param("BOKEH charts", id="any_term"),
+    ],
+)
+def test_search_matches(index, query):
+    """
+    GIVEN a query that is exact, a prefix, or a typo of a post's term
+    THEN the post is found
+    """
+    post = make_post("Plotting", content="bokeh plots")
+    make_post("Unrelated")
+    assert index.search(query) == [post.id]
+
+
+def test_search_exact_before_prefix(index):
+    """
+    GIVEN one post with a query term and one with a longer term it starts
+    THEN the exact match ranks first
+    """
+    prefix = make_post("Testing things", age=0)
+    exact = make_post("Test things", age=1)
+    assert index.search("test") == [exact.id, prefix.id]
+
+
+def test_search_filters(index):
+    """
+    GIVEN published, unpublished and differently tagged posts
+    THEN search can leave out unpublished posts and filter on a tag
+    """
+    published = make_post("Docker one", tags=["ops"])
+    unpublished = make_post("Docker two", tags=["ops"], published=False, age=1)
+    other_tag = make_post("Docker three", tags=["dev"], age=2)
+    assert index.search("docker") == [published.id, other_tag.id]
+    assert index.search("docker", published_only=False) == [
+        published.id,
+        unpublished.id,
+        other_tag.id,
+    ]
+    assert index.search("docker", tag="ops") == [published.id]
+    assert index.search("docker", limit=1) == [published.id]
+
+
+def test_search_incremental_updates(index):
+    """
+    GIVEN an index in use
+    WHEN posts are added, edited and removed through the index
+    THEN search results follow without a rebuild
+    """
+    first = make_post("Async first")
+    assert index.search("async") == [first.id]
+    second = make_post("Async second", age=1)
+    index.add_post(second)
+    first.title = "Threads first"
+    first.updated_timestamp = NOW + datetime.timedelta(seconds=1)
+    first.save()
+    index.add_post(first)
+    assert index.search("async") == [second.id]
+    assert index.search("threads") == [first.id]
+    second.delete()
+    index.remove_post(second.id)
+    assert index.search("async") == []
+    assert len(index) == 1
+
+
+def test_search_syncs_external_writes(index):
+    """
+    GIVEN an index in use
+    WHEN posts are created, edited and deleted without telling the index
+    THEN search catches up with them
+    """
+    first = make_post("Regex first")
+    assert index.search("regex") == [first.id]
+    second = make_post("Regex second", age=1)
+    index.reconcile()
+    assert index.search("regex") == [first.id, second.id]
+    BlogPost.objects(id=first.id).update_one(
+        set__title="Parsing first",
+        set__updated_timestamp=NOW + datetime.timedelta(seconds=1),
+    )
+    assert index.search("regex") == [second.id]
+    BlogPost.objects(id=second.id).delete()
+    index.reconcile()
+    assert index.search("regex") == []
+    assert index.search("parsing") == [first.id]
+
+
+def test_search_reconcile_throttled(index, mocker):
+    """
+    GIVEN an index reconciled by its first search
+    WHEN searching again within RECONCILE_SECONDS
+    THEN posts are not counted again
+    """
+    make_post("Cython first")
+    reconcile = mocker.spy(index, "reconcile")
+    assert len(index.search("cython")) == 1
+    reconcile.assert_called_once_with()
+    index.search("cython")
+    reconcile.assert_called_once_with()
+
+
+def test_search_serialization(index, tmpdir):
+    """
+    GIVEN a built index
+    THEN saving and loading it gives the same results without a rebuild
+    """
+    make_post("Numpy arrays", content="vectorized numpy", tags=["numpy"])
+    make_post("Pandas frames", content="numpy under the hood", age=1)
+    index.path = str(tmpdir.join("search.idx"))
+    index.rebuild()
+    loaded = SearchIndex(path=index.path)
+    assert loaded.load()
+    for query in ["numpy", "pand", "vectorised", "hood"]:
+        assert loaded.search(query) == index.search(query)
+    assert len(loaded) == len(index) == 2
+    assert loaded.dumps() == index.dumps()
+
+
+def test_search_load_bad_file(tmpdir):
+    """
+    GIVEN a missing or corrupt index file
+    THEN loading fails without raising
+    """
+    path = tmpdir.join("search.idx")
+    assert SearchIndex(path=str(path)).load() is False
+    path.write_binary(b"not an index")
+    assert SearchIndex(path=str(path)).load() is False
@@ -0,0 +1,63 @@
+"""Tests for the blog search box suggestions"""
+import pytest
+
+from src.routes.blog.suggestions import POST, TAG, Suggester, Suggestion, build_keys
+
+SUGGESTIONS = [
+    Suggestion(POST, "Flask Login Basics", "flask-login-basics"),
+    Suggestion(POST, "Pandas  for Finance", "pandas-for-finance"),
+    Suggestion(TAG, "flask", "flask"),
+    Suggestion(TAG, "finance", "finance"),
+]
+
+
+@pytest.fixture
+def suggester():
+    """A suggester over SUGGESTIONS, without mongo"""
+    suggester = Suggester()
+    suggester._data = (SUGGESTIONS, build_keys(SUGGESTIONS))
+    suggester._built = float("inf")
+    suggester._stale = False
+    return suggester
+
+
+def test_build_keys():
+    """
+    GIVEN post and tag suggestions
+    THEN every word start of a title, the slug and the tag are sorted keys
+    """
+    assert build_keys(SUGGESTIONS[:1] + SUGGESTIONS[2:3]) == [
+        ("basics", 0),
+        ("flask", 1),
+        ("flask login basics", 0),
+        ("flask-login-basics", 0),
+        ("login basics", 0),
+    ]
+
+
+@pytest.mark.parametrize(
+    "prefix, expected",
+    [
+        pytest.param("fl", [2, 0], id="tags_first"),
+        pytest.param("  FLASK  LOG", [0], id="normalized"),
+        pytest.param("login", [0], id="title_word"),
+        pytest.param("flask-l", [0], id="slug"),
+        pytest.param("f", [3, 2, 0, 1], id="many"),
+        pytest.param("django", [], id="no_match"),
+        pytest.param("", [], id="empty"),
+    ],
+)
+def test_suggest(suggester, prefix, expected):
+    """
+    GIVEN a typed prefix
+    THEN suggest tags, then posts, with a key starting with it
+    """
+    assert suggester.suggest(prefix) == [SUGGESTIONS[i] for i in expected]
+
+
+def test_suggest_limit(suggester):
+    """
+    GIVEN a limit
+    THEN return at most that many suggestions
+    """
+    assert suggester.suggest("f", limit=2) == [SUGGESTIONS[3], SUGGESTIONS[2]]
@@ -0,0 +1,129 @@
+"""Tests for src/cache"""
+import os
+import time
+
+import pytest
+
+from src.cache import DiskCache, LRUCache, TieredCache, hash_key
+
+
+def test_hash_key():
+    """
+    GIVEN cache key parts
+    THEN equal parts give equal keys and part boundaries matter
+    """
+    assert hash_key("a", 1, True) == hash_key("a", 1, True)
+    assert hash_key("ab", "c") != hash_key("a", "bc")
+    assert len(hash_key(b"bytes")) == 64
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """
+    GIVEN a full LRUCache
+    WHEN a new value is set
+    THEN the least recently used value is evicted
+    """
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_ttl():
+    """
+    GIVEN an LRUCache with a ttl
+    THEN values expire after the ttl
+    """
+    cache = LRUCache(ttl=0.01)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.02)
+    assert cache.get("a", "expired") == "expired"
+
+
+def test_lru_cache_delete_and_clear():
+    """
+    GIVEN an LRUCache with values
+    THEN delete removes one value and clear removes all of them
+    """
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    cache.delete("missing")
+    assert "a" not in cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_disk_cache(tmpdir):
+    """
+    GIVEN a DiskCache
+    THEN values round trip through files and can be deleted and cleared
+    """
+    cache = DiskCache(str(tmpdir))
+    key = hash_key("value")
+    cache.set(key, {"html": "<p>hi</p>"})
+    assert cache.get(key) == {"html": "<p>hi</p>"}
+    assert os.path.isfile(os.path.join(str(tmpdir), key[:2], key))
+    assert DiskCache(str(tmpdir)).get(key) == {"html": "<p>hi</p>"}
+    cache.delete(key)
+    assert cache.get(key) is None
+    cache.set(key, 1)
+    cache.clear()
+    assert cache.get(key, "missing") == "missing"
+
+
+def test_disk_cache_ttl(tmpdir):
+    """
+    GIVEN a DiskCache with a ttl
+    THEN files older than the ttl are treated as missing
+    """
+    cache = DiskCache(str(tmpdir), ttl=60)
+    key = hash_key("value")
+    cache.set(key, 1)
+    assert cache.get(key) == 1
+    old = time.time() - 120
+    os.utime(os.path.join(str(tmpdir), key[:2], key), (old, old))
+    assert cache.get(key) is None
+
+
+def test_disk_cache_prune(tmpdir):
+    """
+    GIVEN a DiskCache with max_entries
+    THEN prune removes the oldest files beyond max_entries
+    """
+    cache = DiskCache(str(tmpdir), max_entries=2)
+    keys = [hash_key(i) for i in range(4)]
+    for age, key in enumerate(keys):
+        cache.set(key, key)
+        old = time.time() - 100 * age
+        os.utime(os.path.join(str(tmpdir), key[:2], key), (old, old))
+    assert cache.prune() == 2
+    assert [cache.get(key) for key in keys] == [keys[0], keys[1], None, None]
+
+
+@pytest.mark.parametrize("with_disk", [True, False])
+def test_tiered_cache(tmpdir, with_disk):
+    """
+    GIVEN a TieredCache
+    THEN values set are found in memory, and disk hits are copied to memory
+    """
+    disk = DiskCache(str(tmpdir)) if with_disk else None
+    cache = TieredCache(LRUCache(), disk)
+    key = hash_key("value")
+    cache.set(key, "html")
+    assert cache.get(key) == "html"
+    cache.memory.clear()
+    if with_disk:
+        assert cache.get(key) == "html"
+        assert cache.memory.get(key) == "html"
+    else:
+        assert cache.get(key) is None
+    cache.delete(key)
+    assert cache.get(key) is None
@@ -0,0 +1,189 @@
+"""Tests for the database and image cli commands"""
+import datetime
+import os
+import time
+
+import pytest
+from bson.objectid import ObjectId
+
+from src import commands
+from src.image_handler import StoredImage
+from src.routes.blog.models import BlogPost, Image
+from src.routes.users.models import User
+
+SINCE = datetime.datetime(2021, 4, 1)
+
+
+def test_audit_indexes(client, mocker):
+    """
+    GIVEN the declared indexes, an index no model declares and usage stats
+    THEN report which indexes are declared and which are unused
+    """
+    collection = BlogPost._get_collection()
+    collection.create_index("likes")
+    mocker.patch.object(
+        commands,
+        "get_index_usage",
+        side_effect=lambda document: {"likes_1": (0, SINCE), "_id_": (0, SINCE)}
+        if document is BlogPost
+        else {},
+    )
+    try:
+        reports = {
+            report.name: report
+            for report in commands.audit_indexes()
+            if report.collection == "blog"
+        }
+    finally:
+        collection.drop_index("likes_1")
+    assert reports["likes_1"].declared is False
+    assert reports["likes_1"].unused is True
+    assert reports["_id_"].declared is True
+    assert reports["_id_"].unused is False
+    published_index = reports["published_1_created_timestamp_-1__id_-1"]
+    assert published_index.declared is True
+    assert published_index.ops is None
+    assert published_index.keys == [
+        ("published", 1),
+        ("created_timestamp", -1),
+        ("_id", -1),
+    ]
+
+
+def test_drop_undeclared_indexes(client, mocker):
+    """
+    GIVEN an index no model declares
+    THEN only that index is dropped
+    """
+    mocker.patch.object(commands, "get_index_usage", return_value={})
+    collection = BlogPost._get_collection()
+    collection.create_index("views")
+    indexes = set(collection.index_information())
+    assert commands.drop_undeclared_indexes() == ["blog.views_1"]
+    assert set(collection.index_information()) == indexes - {"views_1"}
+
+
+def test_plan_stages():
+    """
+    GIVEN an explained winning plan
+    THEN list its stages, outermost first, with the index each one uses
+    """
+    plan = {
+        "stage": "LIMIT",
+        "inputStage": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "slug_1"},
+        },
+    }
+    assert commands.plan_stages(plan) == ["LIMIT", "FETCH", "IXSCAN(slug_1)"]
+
+
+def test_explain_main_queries(mocker):
+    """
+    GIVEN queries explained with a collection scan or an in-memory sort
+    THEN report those problems
+    """
+    plans = {
+        "bad": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}},
+        "good": {"queryPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}},
+    }
+    queries = []
+    for name, plan in plans.items():
+        query = mocker.Mock()
+        query.explain.return_value = {"queryPlanner": {"winningPlan": plan}}
+        queries.append((name, lambda query=query: query))
+    mocker.patch.object(commands, "MAIN_QUERIES", queries)
+    assert list(commands.explain_main_queries()) == [
+        ("bad", "SORT <- COLLSCAN", ["collection scan", "in-memory sort"]),
+        ("good", "FETCH <- IXSCAN", []),
+    ]
+
+
+@pytest.fixture
+def upload_folders(tmpdir, mocker):
+    """Avatar and blog upload folders with referenced and orphaned files
+
+    Every file is two hours old, except one new orphan.
+    """
+    folders = {}
+    for name in ("avatars", "blog"):
+        folder = tmpdir.mkdir(name)
+        folder.mkdir("originals")
+        folders[name] = folder
+    mocker.patch("src.image_handler.AVATAR_UPLOAD_FOLDER", str(folders["avatars"]))
+    mocker.patch("src.image_handler.BLOG_UPLOAD_FOLDER", str(folders["blog"]))
+    files = [
+        "avatars/avatar.jpg",
+        "avatars/originals/avatar.jpg",
+        "avatars/old_avatar.jpg",
+        "blog/kept.png",
+        "blog/kept-320w.webp",
+        "blog/originals/kept.png",
+        "blog/gone.png",
+        "blog/gone.webp",
+        "blog/gone-320w.png",
+        "blog/originals/gone.png",
+        "blog/originals/tmp1234.png",
+    ]
+    old = time.time() - 2 * 60 * 60
+    for name in files:
+        path = tmpdir.join(name)
+        path.write_binary(b"image")
+        os.utime(path, (old, old))
+    tmpdir.join("blog", "new.png").write_binary(b"image")
+    return tmpdir
+
+
+def test_find_orphaned_images(client, delete_blogposts, delete_users, upload_folders):
+    """
+    GIVEN uploaded files, some referenced by a post or a user
+    THEN find the old files nobody references, with their variants and
+        originals
+    """
+    BlogPost(
+        title="Images",
+        slug="images",
+        author=ObjectId(),
+        markdown_description="d",
+        markdown_content="c",
+        html_description="d",
+        html_content="c",
+        created_timestamp=SINCE,
+        updated_timestamp=SINCE,
+        images=[Image(location="/static/images/blog_uploaded/kept.png")],
+    ).save()
+    User(
+        username="imageuser",
+        avatar_location="/static/images/avatars_uploaded/avatar.jpg",
+    ).save()
+    orphans = sorted(
+        os.path.relpath(orphan.path, upload_folders)
+        for orphan in commands.find_orphaned_images()
+    )
+    assert orphans == [
+        "avatars/old_avatar.jpg",
+        "blog/gone-320w.png",
+        "blog/gone.png",
+        "blog/gone.webp",
+        "blog/originals/gone.png",
+        "blog/originals/tmp1234.png",
+    ]
+
+
+def test_remove_orphaned_images(client, delete_stored_images, upload_folders, mocker):
+    """
+    GIVEN orphaned files
+    THEN remove them at the given rate, along with their reference counts
+    """
+    StoredImage(filename="gone.png", refcount=1).save()
+    StoredImage(filename="kept.png", refcount=1).save()
+    sleep = mocker.patch("src.commands.time.sleep")
+    orphans = [
+        commands.OrphanedFile(str(upload_folders.join("blog", name)), 5)
+        for name in ("gone.png", "gone.webp", "missing.png")
+    ]
+    assert commands.remove_orphaned_images(orphans, rate=10) == 2
+    assert sleep.call_count == 2
+    sleep.assert_called_with(0.1)
+    assert not upload_folders.join("blog", "gone.png").exists()
+    assert [stored.filename for stored in StoredImage.objects] == ["kept.png"]
@@ -2,10 +2,19 @@
 import os
 
 import pytest
-from PIL import Image
+from PIL import Image, ImageFile
+from werkzeug.datastructures import FileStorage
 
-from src.image_handler import ALLOWED_EXTENSIONS, delete_image, prep_image, upload_image
-from tests.conftest import EXAMPLE_IMAGE_PATHS
+from src.image_handler import (
+    ALLOWED_EXTENSIONS,
+    ORIGINALS_FOLDER,
+    UploadError,
+    delete_image,
+    prep_image,
+    upload_image,
+)
+from src.image_jobs import DONE, image_pipeline
+from tests.conftest import EXAMPLE_IMAGE_PATHS, get_image_path
 
 
 def test_prep_image(example_image):
@@ -28,7 +37,9 @@ PARAMS = [(None, None), ("pre_", None), (None, 20), ("pre_", 20)]
 
 
 @pytest.mark.parametrize("prefix, max_pixels", PARAMS)
-def test_upload_image(example_image, tmpdir, prefix, max_pixels):
+def test_upload_image(
+    client, delete_stored_images, example_image, tmpdir, prefix, max_pixels
+):
     """
     GIVEN an image, path, prefix, max_pixels and allowed extensions
     WHEN multiple image types and sizes are passed
@@ -57,8 +68,12 @@ def test_upload_image(example_image, tmpdir, prefix, max_pixels):
     if ext_type_pre in ALLOWED_EXTENSIONS:
         assert isinstance(storage_filename, str)
         assert os.path.isfile(os.path.join(image_storage_path, storage_filename))
+        assert os.path.isfile(
+            os.path.join(image_storage_path, ORIGINALS_FOLDER, storage_filename)
+        )
         if prefix:
             assert storage_filename.startswith(prefix)
+        assert image_pipeline.wait(storage_filename) == DONE
         if max_pixels:
             filepath = os.path.join(image_storage_path, storage_filename)
             image = Image.open(filepath)
@@ -67,8 +82,44 @@ def test_upload_image(example_image, tmpdir, prefix, max_pixels):
         assert storage_filename is None
 
 
+@pytest.mark.parametrize(
+    "patch, value, message",
+    [
+        pytest.param("MAX_UPLOAD_BYTES", 1_000, "the limit is 0 MB", id="bytes"),
+        pytest.param("MAX_IMAGE_PIXELS", 1_000, "megapixels", id="pixels"),
+    ],
+)
+def test_upload_image_too_large(
+    client, delete_stored_images, mocker, tmpdir, patch, value, message
+):
+    """
+    GIVEN an upload over the byte or pixel budget
+    THEN it is rejected before it is decoded, and nothing is stored
+    """
+    mocker.patch(f"src.image_handler.{patch}", value)
+    mocker.patch("src.image_jobs.MAX_IMAGE_PIXELS", value)
+    load = mocker.spy(ImageFile.ImageFile, "load")
+    with open(get_image_path("test_png.png"), "rb") as fp:
+        with pytest.raises(UploadError, match=message):
+            upload_image(FileStorage(fp), str(tmpdir))
+    load.assert_not_called()
+    assert os.listdir(os.path.join(tmpdir, ORIGINALS_FOLDER)) == []
+
+
+def test_upload_image_not_an_image(client, delete_stored_images, tmpdir):
+    """
+    GIVEN an upload with an image extension that isn't an image
+    THEN it is rejected, and nothing is stored
+    """
+    path = tmpdir.join("fake.png")
+    path.write_binary(b"not an image")
+    with open(path, "rb") as fp:
+        with pytest.raises(UploadError, match="Invalid image file"):
+            upload_image(FileStorage(fp), str(tmpdir.mkdir("storage")))
+
+
 @pytest.mark.parametrize("get_path", EXAMPLE_IMAGE_PATHS)
-def test_delete_image(get_path, tmpdir):
+def test_delete_image(client, delete_stored_images, get_path, tmpdir):
     """
     GIVEN an image relative path and absolute directory path
     THEN delete that image from the file system
@@ -80,8 +131,12 @@ def test_delete_image(get_path, tmpdir):
     new_filename = f"my_pic.{ext}"
     put_path = os.path.join(image_storage_path, new_filename)
     fake_relpath = os.path.join("fakepath", new_filename)
+    original_path = os.path.join(image_storage_path, ORIGINALS_FOLDER, new_filename)
+    os.mkdir(os.path.dirname(original_path))
     image = Image.open(get_path)
     image.save(put_path)
+    image.save(original_path)
     assert os.path.isfile(put_path)
     delete_image(fake_relpath, image_storage_path)
     assert not os.path.isfile(put_path)
+    assert not os.path.isfile(original_path)
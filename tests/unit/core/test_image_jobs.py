@@ -0,0 +1,245 @@
+"""Tests for the background image processing jobs"""
+import os
+import time
+
+import pytest
+from PIL import Image, ImageFile, JpegImagePlugin
+
+from src import image_jobs
+from src.image_jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    PENDING,
+    PROCESSING,
+    ImagePipeline,
+    JobTable,
+    Variant,
+    fitted_size,
+    image_files,
+    plan_variants,
+    resize_image,
+)
+from tests.conftest import get_image_path
+
+
+@pytest.fixture
+def table(tmpdir):
+    """An empty job table"""
+    return JobTable(str(tmpdir.join("jobs", "jobs.sqlite3")))
+
+
+@pytest.fixture
+def pipeline(tmpdir):
+    """A pipeline with its own job table"""
+    return ImagePipeline(jobs_db=str(tmpdir.join("jobs.sqlite3")), workers=1)
+
+
+def copy_image(tmpdir, name="test_jpeg.jpg"):
+    """Copy an example image to tmpdir, returning its path"""
+    path = str(tmpdir.join(name))
+    with Image.open(get_image_path(name)) as image:
+        image.save(path)
+    return path
+
+
+def test_job_table_lifecycle(table):
+    """
+    GIVEN a job table
+    WHEN a job is added, claimed and finished
+    THEN only one claim succeeds and the job ends with its final status
+    """
+    table.add("a.png", "/originals/a.png", "/a.png", 20)
+    assert table.get("a.png").status == PENDING
+    job = table.claim("a.png")
+    assert job.source == "/originals/a.png" and job.status == PROCESSING
+    assert table.claim("a.png") is None
+    table.finish("a.png", FAILED, "OSError: broken")
+    assert table.get("a.png").error == "OSError: broken"
+    assert table.statuses(["a.png", "missing.png"]) == {"a.png": FAILED}
+    assert table.get("missing.png") is None
+
+
+def test_job_table_cancelled_stays_cancelled(table):
+    """
+    GIVEN a job cancelled while it was processing
+    WHEN it finishes
+    THEN it is still cancelled
+    """
+    table.add("a.png", "/originals/a.png", "/a.png", 20)
+    table.claim("a.png")
+    table.finish("a.png", CANCELLED)
+    table.finish("a.png", DONE)
+    assert table.get("a.png").status == CANCELLED
+
+
+def test_job_table_requeue_interrupted(table, mocker):
+    """
+    GIVEN jobs left pending, processing and finished by a previous run
+    THEN stale processing jobs are requeued with the pending ones,
+        and old finished jobs are removed
+    """
+    for name in ("pending.png", "processing.png", "done.png"):
+        table.add(name, "source", "target", 20)
+    table.claim("processing.png")
+    table.claim("done.png")
+    table.finish("done.png", DONE)
+    assert table.requeue_interrupted() == ["pending.png"]
+    later = time.time() + image_jobs.KEEP_FINISHED + 1
+    mocker.patch("src.image_jobs.time.time", return_value=later)
+    assert sorted(table.requeue_interrupted()) == ["pending.png", "processing.png"]
+    assert table.get("done.png") is None
+
+
+@pytest.mark.parametrize(
+    "size, max_pixels, expected",
+    [
+        pytest.param((2000, 1000), 1000, (1000, 500), id="landscape"),
+        pytest.param((300, 900), 600, (200, 600), id="portrait"),
+        pytest.param((300, 200), 1000, (300, 200), id="small"),
+        pytest.param((5000, 2), 1000, (1000, 1), id="sliver"),
+    ],
+)
+def test_fitted_size(size, max_pixels, expected):
+    """
+    GIVEN an image size and a square to fit it in
+    THEN scale it down to fit, keeping its aspect ratio
+    """
+    assert fitted_size(size, max_pixels) == expected
+
+
+def test_plan_variants(mocker):
+    """
+    GIVEN an image's filename and size
+    THEN plan smaller widths in its own format, and every width in modern
+        formats
+    """
+    mocker.patch("src.image_jobs.modern_formats", return_value=["webp"])
+    assert plan_variants("1234.jpg", (800, 600)) == [
+        Variant("1234-320w.webp", 320, "image/webp"),
+        Variant("1234-640w.webp", 640, "image/webp"),
+        Variant("1234.webp", 800, "image/webp"),
+        Variant("1234-320w.jpg", 320, "image/jpeg"),
+        Variant("1234-640w.jpg", 640, "image/jpeg"),
+    ]
+    assert plan_variants("1234.png", (100, 50)) == [
+        Variant("1234.webp", 100, "image/webp")
+    ]
+
+
+def test_pipeline_resizes_image(pipeline, tmpdir):
+    """
+    GIVEN an image submitted to the pipeline
+    THEN its target is replaced by a resized copy, keeping the source
+    """
+    source = copy_image(tmpdir)
+    target = str(tmpdir.join("target.jpg"))
+    pipeline.submit("target.jpg", source, target, 20)
+    assert pipeline.wait("target.jpg") == DONE
+    with Image.open(target) as image:
+        assert max(image.size) == 20
+    with Image.open(source) as image:
+        assert max(image.size) > 20
+    assert pipeline.pending(["target.jpg"]) == []
+    assert os.listdir(str(tmpdir)).count("target.jpg") == 1
+
+
+def test_pipeline_writes_variants(pipeline, tmpdir):
+    """
+    GIVEN an image submitted to the pipeline
+    THEN every planned variant is written with its planned width
+    """
+    source = copy_image(tmpdir, "test_png.png")
+    target = str(tmpdir.mkdir("images").join("target.png"))
+    pipeline.submit("target.png", source, target, 700)
+    assert pipeline.wait("target.png") == DONE
+    with Image.open(target) as image:
+        variants = plan_variants("target.png", image.size)
+    assert variants
+    for variant in variants:
+        with Image.open(
+            os.path.join(os.path.dirname(target), variant.filename)
+        ) as image:
+            assert image.width == variant.width
+            assert Image.MIME[image.format] == variant.mimetype
+    assert len(image_files(target)) == len(variants) + 1
+
+
+def test_pipeline_failed_job(pipeline, tmpdir):
+    """
+    GIVEN a submitted file that isn't an image
+    THEN the job fails with the error and the target is left alone
+    """
+    source = str(tmpdir.join("bad.png"))
+    with open(source, "w") as f:
+        f.write("not an image")
+    target = str(tmpdir.join("target.png"))
+    pipeline.submit("target.png", source, target, 20)
+    assert pipeline.wait("target.png") == FAILED
+    assert "UnidentifiedImageError" in pipeline.table.get("target.png").error
+    assert not os.path.exists(target)
+
+
+def test_pipeline_runs_unfinished_jobs_on_start(tmpdir):
+    """
+    GIVEN a job table with a job a previous run never processed
+    WHEN a pipeline starts on it
+    THEN the job is processed
+    """
+    jobs_db = str(tmpdir.join("jobs.sqlite3"))
+    source = copy_image(tmpdir)
+    target = str(tmpdir.join("target.jpg"))
+    JobTable(jobs_db).add("target.jpg", source, target, 20)
+    pipeline = ImagePipeline(jobs_db=jobs_db, workers=1)
+    assert pipeline.wait("target.jpg") == DONE
+    with Image.open(target) as image:
+        assert max(image.size) == 20
+
+
+def test_pipeline_unfinished_remembers_finished(tmpdir, mocker):
+    """
+    GIVEN a job table with a finished and a pending job
+    WHEN a pipeline looks up which of them are unfinished
+    THEN its pool isn't started, and the finished job isn't looked up again
+    """
+    jobs_db = str(tmpdir.join("jobs.sqlite3"))
+    table = JobTable(jobs_db)
+    for filename in ("done.jpg", "pending.jpg"):
+        table.add(filename, "source", "target", 20)
+    table.finish("done.jpg", DONE)
+    pipeline = ImagePipeline(jobs_db=jobs_db, workers=1)
+    start = mocker.spy(pipeline, "start")
+    names = ["done.jpg", "pending.jpg", "missing.jpg"]
+    assert pipeline.unfinished(names) == ["pending.jpg"]
+    assert pipeline.finished == {"done.jpg"}
+    connect = mocker.spy(image_jobs.sqlite3, "connect")
+    assert pipeline.unfinished(["done.jpg"]) == []
+    assert connect.call_count == 0
+    assert start.call_count == 0
+
+
+def test_resize_image_decodes_jpeg_in_draft(pipeline, tmpdir, mocker):
+    """
+    GIVEN a JPEG much larger than its resized size
+    THEN it is decoded at a reduced scale
+    """
+    source = copy_image(tmpdir)
+    target = str(tmpdir.join("target.jpg"))
+    draft = mocker.spy(JpegImagePlugin.JpegImageFile, "draft")
+    resize_image(source, target, 50)
+    draft.assert_called()
+    with Image.open(target) as image:
+        assert max(image.size) == 50
+
+
+def test_resize_image_pixel_budget(tmpdir, mocker):
+    """
+    GIVEN an image over the pixel budget
+    THEN it is refused without being decoded
+    """
+    source = copy_image(tmpdir)
+    mocker.patch("src.image_jobs.MAX_IMAGE_PIXELS", 1_000)
+    load = mocker.spy(ImageFile.ImageFile, "load")
+    with pytest.raises(ValueError, match="over 1,000 pixels"):
+        resize_image(source, str(tmpdir.join("target.jpg")), 50)
+    load.assert_not_called()
@@ -1,10 +1,19 @@
 """Tests for src/utils methods"""
 import math
+from datetime import datetime, timedelta
 
 import pytest
+from bson.objectid import ObjectId
 
 from src.globals import db
-from src.utils import get_slug, list_from_string, setup_pagination
+from src.utils import (
+    decode_cursor,
+    encode_cursor,
+    get_slug,
+    list_from_string,
+    setup_keyset_pagination,
+    setup_ranked_pagination,
+)
 from tests.mongodb_helpers import delete_all_docs
 
 TEST_STRINGS = [
@@ -89,49 +98,135 @@ def test_list_from_string(before, after, lowercase):
 
 
 PAGINATOR_SETUP = [
-    (1, 10),
-    (1, 25),
-    (0, 10),
-    (3, 10),
-    (2, 5),
-    (3, 2),
+    (10, None),
+    (25, None),
+    (7, 5),
+    (5, 100),
 ]
 
 
-@pytest.mark.parametrize("page, results_per_page", PAGINATOR_SETUP)
-def test_setup_pagination(set_up_models, page, results_per_page):
+@pytest.mark.parametrize("results_per_page, count_limit", PAGINATOR_SETUP)
+def test_setup_keyset_pagination(set_up_models, results_per_page, count_limit):
     """
-    GIVEN page, results_per_page and mongo_query
-    THEN return a valid paginator object at correct page
+    GIVEN results_per_page, mongo_query and an optional count limit
+    THEN walking the next cursors visits every model once, newest first,
+         and walking back with the previous cursors returns the same pages
     """
     objects = SimpleModel.objects()
-    paginator = setup_pagination(page, results_per_page, objects)
-    actual_results_per_page = results_per_page if results_per_page < 20 else 20
-    max_pages = math.ceil(20 / actual_results_per_page)
-    assert paginator.total == 20
-    assert paginator.pages == max_pages
-    if page <= 1:
-        assert paginator.page == 1
-        assert paginator.has_prev is False
-        assert len(paginator.items) == actual_results_per_page
-    elif page >= max_pages:
-        assert paginator.page == max_pages
-        assert paginator.has_next is False
-        assert len(paginator.items) <= actual_results_per_page
+    expected = [model.field for model in reversed(set_up_models)]
+    paginator = setup_keyset_pagination(
+        objects, results_per_page, count_limit=count_limit
+    )
+    assert paginator.has_prev is False
+    if count_limit:
+        assert paginator.total == min(20, count_limit)
+        assert paginator.total_capped is (count_limit <= 20)
     else:
-        assert paginator.page == page
+        assert paginator.total is None
+    pages = [[model.field for model in paginator.items]]
+    while paginator.has_next:
+        paginator = setup_keyset_pagination(
+            objects, results_per_page, after=paginator.next_cursor
+        )
         assert paginator.has_prev is True
-        assert paginator.has_next is True
-        assert len(paginator.items) == actual_results_per_page
+        assert len(paginator.items) <= results_per_page
+        pages.append([model.field for model in paginator.items])
+    assert [field for page in pages for field in page] == expected
+    assert len(pages) == math.ceil(20 / results_per_page)
+    for page in reversed(pages[:-1]):
+        paginator = setup_keyset_pagination(
+            objects, results_per_page, before=paginator.prev_cursor
+        )
+        assert [model.field for model in paginator.items] == page
+    assert paginator.has_prev is False
+
+
+def test_setup_keyset_pagination_bad_cursor(set_up_models):
+    """
+    GIVEN a malformed cursor
+    THEN fall back to the first page
+    """
+    paginator = setup_keyset_pagination(SimpleModel.objects(), 5, after="not-a-cursor")
+    assert [model.field for model in paginator.items] == ["19", "18", "17", "16", "15"]
+
+
+def test_setup_keyset_pagination_stale_cursor(set_up_models):
+    """
+    GIVEN a cursor past the oldest model
+    THEN restart at the first page, or return None if restart_on_stale is False
+    """
+    oldest = set_up_models[0]
+    cursor = encode_cursor(oldest.created_timestamp, oldest.id)
+    paginator = setup_keyset_pagination(SimpleModel.objects(), 5, after=cursor)
+    assert [model.field for model in paginator.items] == ["19", "18", "17", "16", "15"]
+    assert (
+        setup_keyset_pagination(
+            SimpleModel.objects(), 5, after=cursor, restart_on_stale=False
+        )
+        is None
+    )
+
+
+def test_setup_keyset_pagination_no_results(client):
+    """
+    GIVEN a query with no results
+    THEN return None
+    """
+    assert setup_keyset_pagination(SimpleModel.objects(field="nope"), 5) is None
+
+
+def test_setup_ranked_pagination(set_up_models):
+    """
+    GIVEN ids in a ranked order
+    THEN walking the cursors forward and back returns pages in that order,
+         with malformed or out of range cursors falling back to the first page
+    """
+    ranked = [model.id for model in set_up_models if int(model.field) % 2]
+    ranked.reverse()
+    objects = SimpleModel.objects()
+    paginator = setup_ranked_pagination(objects, ranked, 4, count_limit=5)
+    assert paginator.total == 5 and paginator.total_capped is True
+    pages = [[model.id for model in paginator.items]]
+    while paginator.has_next:
+        paginator = setup_ranked_pagination(
+            objects, ranked, 4, after=paginator.next_cursor
+        )
+        pages.append([model.id for model in paginator.items])
+    assert [model_id for page in pages for model_id in page] == ranked
+    assert len(pages) == 3
+    paginator = setup_ranked_pagination(
+        objects, ranked, 4, before=paginator.prev_cursor
+    )
+    assert [model.id for model in paginator.items] == pages[1]
+    for cursor in ["not-a-cursor", "500"]:
+        paginator = setup_ranked_pagination(objects, ranked, 4, after=cursor)
+        assert [model.id for model in paginator.items] == pages[0]
+    assert setup_ranked_pagination(objects, [], 4) is None
+
+
+def test_cursor_round_trip():
+    """
+    GIVEN a timestamp and object id
+    THEN encoding then decoding the cursor returns the same values
+    """
+    timestamp = datetime(2021, 4, 1, 12, 30, 15, 123000)
+    object_id = ObjectId()
+    assert decode_cursor(encode_cursor(timestamp, object_id)) == (
+        timestamp,
+        object_id,
+    )
 
 
 @pytest.fixture
 def set_up_models(client):
     """Build some models for testing paginator"""
     models = []
+    now = datetime.now()
     for i in range(20):
         model = SimpleModel(
             field=str(i),
+            # Pairs of models share a timestamp to exercise the id tie breaker
+            created_timestamp=now + timedelta(seconds=i // 2),
         )
         model.save()
         models.append(model)
@@ -143,6 +238,7 @@ class SimpleModel(db.Document):
     """Simple mongodb model for testing paginator"""
 
     field = db.StringField(index=False)
+    created_timestamp = db.DateTimeField()
     meta = {"collection": "simplemodels"}
 
     def __str__(self):
@@ -2,7 +2,7 @@
 import pytest
 from bson.objectid import ObjectId
 
-from src.routes.finance import budget_charts
+from src.routes.finance import budget_charts, budget_helpers
 from src.routes.finance.models import Budget
 
 BUDGET_VARIED = {
@@ -37,6 +37,34 @@ def test_prepare_budget_items_data():
     }
 
 
+def test_aggregate_budget():
+    """
+    GIVEN a budget with income and expenses over several periods
+    WHEN aggregate_budget is called
+    THEN every chart's data is computed at the budget's period, as ints
+    """
+    budget = prep_budget(BUDGET_VARIED)
+    chart_data = budget_charts.aggregate_budget(budget)
+    assert chart_data.categories == {"category_neg1": 1008, "category_neg2": 2166}
+    assert chart_data.income == {"item1": 100}
+    assert chart_data.income_vs_expenses == {"Income": 100, "Expenses": 3174}
+    assert chart_data.items == budget_charts.prepare_budget_items_data(budget)
+    assert all(type(value) is int for data in chart_data for value in data.values())
+
+
+def test_aggregate_budget_empty():
+    """
+    GIVEN a budget whose only item has no value
+    WHEN aggregate_budget is called
+    THEN only the income vs expenses chart has data, all zero
+    """
+    budget = prep_budget(
+        {"category": {"item": {"value": 0, "period": 12, "pos": False}}}
+    )
+    chart_data = budget_charts.aggregate_budget(budget)
+    assert chart_data == ({}, {}, {}, {"Income": 0, "Expenses": 0})
+
+
 @pytest.mark.parametrize("positive", (True, False))
 def test_inject_advice(positive, monkeypatch):
     """Test the inject_advice_function"""
@@ -46,3 +74,44 @@ def test_inject_advice(positive, monkeypatch):
         assert "It looks like your income is greater than your spending." in advice
     else:
         assert "It looks like your spending is greater than your income." in advice
+
+
+PATCHES = [
+    pytest.param(
+        [("category_neg1", "item_sm", "value", 1200)], {"income"}, id="expense"
+    ),
+    pytest.param(
+        [("category_pos", "item1", "period", 1)],
+        {"categories", "items"},
+        id="income",
+    ),
+    pytest.param(
+        [("category_neg2", "item_lg", "pos", True)], set(), id="expense to income"
+    ),
+    pytest.param(
+        [
+            ("category_neg1", "item_lg", "value", None),
+            ("category_neg1", "item_lg", "value", 5),
+        ],
+        {"income"},
+        id="same item twice",
+    ),
+]
+
+
+@pytest.mark.parametrize("cells, unchanged", PATCHES)
+def test_patch_chart_data(cells, unchanged):
+    """
+    GIVEN a budget's chart data and some changed cells
+    WHEN patch_chart_data adjusts the chart data for the changes
+    THEN it is the chart data of the changed budget, and only the charts
+        the changes affect differ
+    """
+    budget = prep_budget(BUDGET_VARIED)
+    chart_data = budget_charts.aggregate_budget(budget)
+    cells = [budget_helpers.BudgetCell(*cell) for cell in cells]
+    patched, changes = budget_helpers.apply_budget_cells(budget, cells)
+    patched_data = budget_charts.patch_chart_data(patched, chart_data, changes)
+    assert patched_data == budget_charts.aggregate_budget(patched)
+    for name in unchanged:
+        assert getattr(patched_data, name) == getattr(chart_data, name)
@@ -2,7 +2,8 @@
 import pytest
 from bson.objectid import ObjectId
 
-from src.routes.finance import budget_helpers
+from src.routes.finance import budget_helpers, drafts
+from src.routes.finance.budget_helpers import DEFAULT_BUDGET
 from src.routes.finance.models import Budget
 
 SMALL_INNER_BUDGET = '{"cat": {"item": {"value": null, "period": 12, "pos": true}}}'
@@ -56,3 +57,136 @@ def test_set_budget_object(inputs):
         assert budget.name == inputs[2]
     if inputs[3]:
         assert budget.id == ObjectId(inputs[3])
+
+
+def test_apply_budget_cells():
+    """
+    GIVEN a budget and changed cells
+    WHEN apply_budget_cells applies them
+    THEN a patched copy is returned with the changed items' fields before
+        and after, and the budget itself is left as it was
+    """
+    budget = budget_helpers.set_budget_object(SMALL_INNER_BUDGET, 52, "Some Budget")
+    cells = [
+        budget_helpers.BudgetCell("cat", "item", "value", 10),
+        budget_helpers.BudgetCell("cat", "item", "period", 1),
+    ]
+    patched, changes = budget_helpers.apply_budget_cells(budget, cells)
+    assert patched.budget["cat"]["item"] == {"value": 10, "period": 1, "pos": True}
+    assert (patched.name, patched.period) == ("Some Budget", 52)
+    assert budget.budget["cat"]["item"]["value"] is None
+    assert changes == {
+        ("cat", "item"): (
+            {"value": None, "period": 12, "pos": True},
+            {"value": 10, "period": 1, "pos": True},
+        )
+    }
+
+
+INVALID_CELLS = [
+    pytest.param(("cat", "other", "value", 1), id="unknown item"),
+    pytest.param(("other", "item", "value", 1), id="unknown category"),
+    pytest.param(("cat", "item", "name", "x"), id="unknown field"),
+    pytest.param(("cat", "item", "value", "1"), id="string value"),
+    pytest.param(("cat", "item", "value", True), id="bool value"),
+    pytest.param(("cat", "item", "period", 3), id="unknown period"),
+    pytest.param(("cat", "item", "pos", 1), id="int pos"),
+    pytest.param((["cat"], "item", "value", 1), id="list category"),
+]
+
+
+@pytest.mark.parametrize("cell", INVALID_CELLS)
+def test_apply_budget_cells_invalid(cell):
+    """
+    GIVEN a cell naming an unknown item or field, or with an invalid value
+    WHEN apply_budget_cells applies it
+    THEN a RuntimeError is raised
+    """
+    budget = budget_helpers.set_budget_object(SMALL_INNER_BUDGET)
+    with pytest.raises(RuntimeError):
+        budget_helpers.apply_budget_cells(budget, [budget_helpers.BudgetCell(*cell)])
+
+
+def default_budget_with(change=None, **attributes):
+    """A copy of the default budget, with a changed item and attributes"""
+    inner = {category: dict(items) for category, items in DEFAULT_BUDGET.items()}
+    if change:
+        category, item, field, value = change
+        inner[category][item] = {**inner[category][item], field: value}
+    return Budget(budget=inner, **attributes)
+
+
+IS_DEFAULT = [
+    pytest.param(default_budget_with(), True, id="default"),
+    pytest.param(
+        Budget(budget=dict(reversed(DEFAULT_BUDGET.items()))), True, id="reordered"
+    ),
+    pytest.param(
+        default_budget_with(("Income", "Tips", "pos", 1)), True, id="equal value"
+    ),
+    pytest.param(
+        default_budget_with(("Children", "Allowance", "value", 5)), False, id="value"
+    ),
+    pytest.param(default_budget_with(name="Mine"), False, id="name"),
+    pytest.param(default_budget_with(period=52), False, id="period"),
+    pytest.param(Budget(budget={}), False, id="empty"),
+]
+
+
+@pytest.mark.parametrize("budget, is_default", IS_DEFAULT)
+def test_budget_is_default(budget, is_default):
+    """
+    GIVEN a budget
+    WHEN budget_is_default checks it, with and without its fingerprint
+    THEN it is default only if it equals the default budget
+    """
+    fingerprint = budget_helpers.budget_fingerprint(budget.budget)
+    assert budget_helpers.budget_is_default(budget) is is_default
+    assert budget_helpers.budget_is_default(budget, fingerprint) is is_default
+
+
+def test_patch_fingerprint():
+    """
+    GIVEN a budget's fingerprint and changed cells
+    WHEN patch_fingerprint adjusts it for the changes
+    THEN it is the fingerprint of the changed budget, and changing the cells
+        back restores the default budget's fingerprint
+    """
+    budget = budget_helpers.get_default_budget()
+    cells = [
+        budget_helpers.BudgetCell("Income", "Tips", "value", 10),
+        budget_helpers.BudgetCell("Children", "Dental", "period", 52),
+    ]
+    patched, changes = budget_helpers.apply_budget_cells(budget, cells)
+    fingerprint = budget_helpers.patch_fingerprint(
+        budget_helpers.DEFAULT_BUDGET_FINGERPRINT, changes
+    )
+    assert fingerprint == budget_helpers.budget_fingerprint(patched.budget)
+    assert fingerprint != budget_helpers.DEFAULT_BUDGET_FINGERPRINT
+    cells = [
+        budget_helpers.BudgetCell("Income", "Tips", "value", None),
+        budget_helpers.BudgetCell("Children", "Dental", "period", 12),
+    ]
+    _, changes = budget_helpers.apply_budget_cells(patched, cells)
+    fingerprint = budget_helpers.patch_fingerprint(fingerprint, changes)
+    assert fingerprint == budget_helpers.DEFAULT_BUDGET_FINGERPRINT
+
+
+def test_save_budget_from_draft(
+    client, current_user_standard, delete_budgets, delete_draft_budgets
+):
+    """
+    GIVEN an unnamed, changed draft budget and no budget form posted
+    WHEN save_budget saves the draft
+    THEN a named copy is saved and the cached draft is left unchanged
+    """
+    with client.application.test_request_context("/", method="POST"):
+        budget = budget_helpers.get_default_budget()
+        budget.budget["Income"]["Tips"]["value"] = 10
+        drafts.stash_draft(budget)
+        saved = budget_helpers.save_budget()
+        assert saved is not budget
+        assert saved.name == "unnamed budget"
+        assert Budget.objects(id=saved.id).first().name == "unnamed budget"
+        assert drafts.get_draft() is budget
+        assert budget.name is None
@@ -0,0 +1,75 @@
+"""test_charts_common: test the finance.charts_common.py chart cache"""
+import re
+
+import pytest
+
+from src.cache import DiskCache
+from src.routes.finance import charts_common
+
+DATA = {"Principal": 1_000, "Interest": 250}
+ELEMENT_ID = re.compile(r'id="([^"]+)"')
+
+
+@pytest.fixture
+def chart_cache():
+    """An empty chart cache, without a disk tier"""
+    charts_common.chart_cache.clear()
+    yield charts_common.chart_cache
+    charts_common.chart_cache.shared = None
+    charts_common.chart_cache.clear()
+
+
+def test_cached_chart(chart_cache, mocker):
+    """
+    GIVEN a chart rendered once
+    WHEN the same chart is produced again
+    THEN it comes from the cache, with new ids its script embeds it by
+    """
+    components = mocker.spy(charts_common, "components")
+    script, div = charts_common.produce_pie_chart(DATA, "Loan")
+    cached_script, cached_div = charts_common.produce_pie_chart(DATA, "Loan")
+    assert components.call_count == 1
+    element_id = ELEMENT_ID.search(div)[1]
+    cached_element_id = ELEMENT_ID.search(cached_div)[1]
+    assert element_id != cached_element_id
+    assert cached_element_id in cached_script
+    assert element_id not in cached_script
+    assert charts_common.BOKEH_ID.sub("", cached_script) == (
+        charts_common.BOKEH_ID.sub("", script)
+    )
+
+
+@pytest.mark.parametrize(
+    "args, kwargs",
+    [
+        pytest.param((DATA, "Other title"), {}, id="title"),
+        pytest.param(({**DATA, "Fees": 10}, "Loan"), {}, id="data"),
+        pytest.param((DATA, "Loan"), {"colors": ["#000", "#fff"]}, id="colors"),
+    ],
+)
+def test_cached_chart_differs(chart_cache, mocker, args, kwargs):
+    """
+    GIVEN a chart rendered once
+    WHEN a chart with a different title, data or colors is produced
+    THEN it is rendered too
+    """
+    components = mocker.spy(charts_common, "components")
+    charts_common.produce_pie_chart(DATA, "Loan")
+    charts_common.produce_pie_chart(*args, **kwargs)
+    assert components.call_count == 2
+
+
+def test_cached_chart_disk(chart_cache, mocker, monkeypatch, tmp_path):
+    """
+    GIVEN CHART_CACHE_DIR is set
+    WHEN a chart is produced in one process and again after memory is lost
+    THEN the second one is read from disk
+    """
+    monkeypatch.setenv("CHART_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(charts_common, "_cache_configured", False)
+    components = mocker.spy(charts_common, "components")
+    charts_common.produce_bar_chart(DATA, "Loan")
+    assert isinstance(chart_cache.shared, DiskCache)
+    chart_cache.memory.clear()
+    charts_common.produce_bar_chart(DATA, "Loan")
+    assert components.call_count == 1
@@ -0,0 +1,60 @@
+"""test_drafts: test the finance.drafts.py server-side draft budget store"""
+from flask import session
+
+from src.routes.finance import drafts
+from src.routes.finance.models import Budget
+
+
+def make_budget(name):
+    """A small budget with a name"""
+    return Budget(
+        name=name, budget={"cat": {"item": {"value": 1, "period": 12, "pos": True}}}
+    )
+
+
+def test_stash_and_get_draft(client, delete_draft_budgets):
+    """
+    GIVEN a session without a draft budget
+    WHEN a budget is stashed
+    THEN the session only holds a token and the budget is kept in memory
+        and in mongo
+    """
+    with client.application.test_request_context("/"):
+        assert drafts.get_draft() is None
+        budget = make_budget("Draft")
+        drafts.stash_draft(budget)
+        token, revision = session[drafts.SESSION_KEY]
+        assert revision == 1
+        assert len(token) == 16
+        assert drafts.get_draft() is budget
+        drafts.memory_drafts.clear()
+        assert drafts.get_draft().name == "Draft"
+
+
+def test_get_draft_replaced_by_other_worker(client, delete_draft_budgets):
+    """
+    GIVEN a draft budget in this worker's memory
+    WHEN another worker replaces the draft
+    THEN the replacement is returned, not the stale memory copy
+    """
+    with client.application.test_request_context("/"):
+        drafts.stash_draft(make_budget("Old"))
+        token, revision = session[drafts.SESSION_KEY]
+        drafts.shared_drafts.set(token, drafts.Draft(make_budget("New")))
+        session[drafts.SESSION_KEY] = (token, revision + 1)
+        assert drafts.get_draft().name == "New"
+
+
+def test_discard_draft(client, delete_draft_budgets):
+    """
+    GIVEN a stashed draft budget
+    WHEN it is discarded
+    THEN the session and both stores forget it
+    """
+    with client.application.test_request_context("/"):
+        drafts.stash_draft(make_budget("Draft"))
+        token, _ = session[drafts.SESSION_KEY]
+        drafts.discard_draft()
+        assert drafts.SESSION_KEY not in session
+        assert drafts.get_draft() is None
+        assert drafts.shared_drafts.get(token) is None
@@ -5,7 +5,15 @@ import mongoengine
 import pytest
 from werkzeug.security import generate_password_hash
 
-from src.routes.users.models import User
+from src.routes.users.models import (
+    AuthorProfile,
+    User,
+    author_profile_cache,
+    get_author_profiles,
+    load_user,
+    session_user_cache,
+)
+from src.routes.users.views import load_full_current_user
 from tests.mongodb_helpers import list_indexes
 
 USERS_COLLECTION = "users"
@@ -13,17 +21,17 @@ USER_MODEL_DEFAULTS = {
     # field: [default, indexed]
     "username": [None, True],
     "email": [None, True],
-    "share_email": [False, True],
-    "password_hash": [None, True],
-    "full_name": [None, True],
-    "share_name": [False, True],
-    "avatar_location": [None, True],
-    "bio": [None, True],
-    "birth_date": [None, True],
-    "share_birth_date": [False, True],
-    "timezone": [None, True],
-    "share_timezone": [False, True],
-    "access_level": [2, True],
+    "share_email": [False, False],
+    "password_hash": [None, False],
+    "full_name": [None, False],
+    "share_name": [False, False],
+    "avatar_location": [None, False],
+    "bio": [None, False],
+    "birth_date": [None, False],
+    "share_birth_date": [False, False],
+    "timezone": [None, False],
+    "share_timezone": [False, False],
+    "access_level": [2, False],
     "facebook_id": [None, True],
     "google_id": [None, True],
     "github_id": [None, True],
@@ -176,6 +184,82 @@ def test_user_check_password(client, delete_users):
     assert user.check_password(password)
 
 
+def test_load_user_session_fields(client, delete_users):
+    """
+    GIVEN a saved user
+    WHEN the user is loaded for a request
+    THEN only the session fields are loaded, and the user can still be saved
+    """
+    user = User(username="testuser", bio="Long bio", access_level=1).save()
+    loaded = load_user(str(user.id))
+    assert (loaded.id, loaded.username, loaded.access_level) == (user.id, "testuser", 1)
+    assert loaded.bio is None
+    assert loaded._session_only is True
+    loaded.full_name = "Test User"
+    loaded.save()
+    user.reload()
+    assert (user.full_name, user.bio) == ("Test User", "Long bio")
+
+
+def test_load_full_current_user(client, delete_users, mocker):
+    """
+    GIVEN a logged in user loaded with only its session fields
+    WHEN load_full_current_user is called, twice
+    THEN the rest of its fields are loaded, once
+    """
+    user = User(username="testuser", bio="Long bio").save()
+    loaded = load_user(str(user.id))
+    mocker.patch("flask_login.utils._get_user", lambda: loaded)
+    reload = mocker.spy(loaded, "reload")
+    with client.application.test_request_context("/"):
+        load_full_current_user()
+        load_full_current_user()
+    assert loaded.bio == "Long bio"
+    assert loaded._session_only is False
+    assert reload.call_count == 1
+
+
+def test_load_user_cached(client, delete_users):
+    """
+    GIVEN a loaded user
+    THEN later loads come from the cache until the user is saved or deleted
+    """
+    session_user_cache.clear()
+    user = User(username="testuser").save()
+    user_id = str(user.id)
+    load_user(user_id)
+    User.objects(id=user.id).update_one(set__username="renamed")
+    assert load_user(user_id).username == "testuser"
+    user.reload()
+    user.save()
+    assert load_user(user_id).username == "renamed"
+    user.delete()
+    assert load_user(user_id) is None
+
+
+def test_get_author_profiles(client, delete_users):
+    """
+    GIVEN saved and deleted users
+    THEN their profiles are fetched once and cached until a user is saved,
+         and deleted users are left out
+    """
+    author_profile_cache.clear()
+    user1 = User(username="user1", avatar_location="/avatar1.png").save()
+    user2 = User(username="user2").save()
+    deleted = User(username="deleted").save()
+    deleted.delete()
+    ids = [user1.id, user2.id, deleted.id, user1.id]
+    assert get_author_profiles(ids) == {
+        user1.id: AuthorProfile(user1.id, "user1", "/avatar1.png"),
+        user2.id: AuthorProfile(user2.id, "user2", None),
+    }
+    User.objects(id=user2.id).update_one(set__username="renamed")
+    assert get_author_profiles(ids)[user2.id].username == "user2"
+    user2.reload()
+    user2.save()
+    assert get_author_profiles(ids)[user2.id].username == "renamed"
+
+
 def hash_user_pw(user_dict):
     """Hashes a user password and replaces password with hashed_password"""
     password = user_dict.pop("password", None)